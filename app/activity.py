@@ -0,0 +1,141 @@
+"""用户最近登录/最近活动时间的延迟批量写入
+
+登录和每次认证请求只在内存中记录时间，后台线程每隔
+ACTIVITY_FLUSH_INTERVAL_SECONDS 秒用一条 executemany 的 UPDATE 批量写入，
+认证读请求不会因此变成写请求。同一用户的最近活动时间在一个间隔内最多记录一次。
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.engine import Engine
+
+from app import sharding
+from app.config.settings import settings, subscribe
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+users = User.__table__
+
+# 参数为空时保留原值；不修改 updated_at，避免仅因活动时间变化使 ETag 失效
+_update_activity = (
+    update(users)
+    .where(users.c.id == bindparam("uid"))
+    .values(
+        last_login_at=func.coalesce(bindparam("login", type_=users.c.last_login_at.type), users.c.last_login_at),
+        last_seen_at=func.coalesce(bindparam("seen", type_=users.c.last_seen_at.type), users.c.last_seen_at),
+        updated_at=users.c.updated_at,
+    )
+)
+
+
+class ActivityTracker:
+    """在内存中合并用户活动时间，定期批量写回数据库"""
+
+    def __init__(self, interval: float, engine: Optional[Engine] = None):
+        self.interval = interval
+        self.engine = engine
+        self.flushed = 0
+        # 用户 ID -> {"login": 时间, "seen": 时间}
+        self._pending: Dict[int, Dict[str, datetime]] = {}
+        # 用户最近一次记录活动的单调时钟时间
+        self._marked: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def login(self, user_id: int) -> None:
+        """记录登录，登录同时视为一次活动"""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self._pending[user_id] = {"login": now, "seen": now}
+            self._marked[user_id] = time.monotonic()
+
+    def seen(self, user_id: int) -> None:
+        """记录一次活动，同一用户在一个刷新间隔内只记录第一次"""
+        mono = time.monotonic()
+        last = self._marked.get(user_id)
+        if last is not None and mono - last < self.interval:
+            return
+        with self._lock:
+            self._marked[user_id] = mono
+            self._pending.setdefault(user_id, {})["seen"] = datetime.now(timezone.utc)
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="activity-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台线程并写入尚未刷新的活动时间"""
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> int:
+        """将累积的活动时间写入数据库，返回更新的用户数"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            # 清理已过间隔的标记，避免长期运行时无限增长
+            cutoff = time.monotonic() - self.interval
+            self._marked = {uid: t for uid, t in self._marked.items() if t >= cutoff}
+        if not pending:
+            return 0
+
+        rows = [{"uid": uid, "login": ts.get("login"), "seen": ts.get("seen")} for uid, ts in pending.items()]
+        for engine, group in self._group_by_engine(rows).items():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(_update_activity, group)
+            except Exception as e:
+                logger.error(f"写入 {len(group)} 个用户的活动时间失败: {e}")
+                continue
+            self.flushed += len(group)
+        return len(rows)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "user_activity_pending": self.pending,
+            "user_activity_flushed_total": self.flushed,
+        }
+
+    def _group_by_engine(self, rows: List[dict]) -> Dict[Engine, List[dict]]:
+        # 启用分片时按用户所在分片分组
+        if self.engine is None and sharding.enabled():
+            router = sharding.get_router()
+            groups: Dict[Engine, List[dict]] = {}
+            for row in rows:
+                groups.setdefault(router.engines[router.shard_for(row["uid"])], []).append(row)
+            return groups
+        engine = self.engine
+        if engine is None:
+            from app.database import engine
+        return {engine: rows}
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+
+activity_tracker = ActivityTracker(settings.ACTIVITY_FLUSH_INTERVAL_SECONDS)
+
+
+@subscribe
+def _apply_settings(old, new, changed) -> None:
+    activity_tracker.interval = new.ACTIVITY_FLUSH_INTERVAL_SECONDS
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from app.audit import audit_log, request_ip
+from app.config.settings import SettingsReloadError, reload_settings
+from app.core.permissions import get_current_active_superuser
+from app.models.user import User
+from app.settings_watcher import settings_watcher
+
+router = APIRouter()
+
+@router.post("/settings/reload")
+async def reload_app_settings(request: Request, current_user: User = Depends(get_current_active_superuser)):
+    """重新读取环境变量和 .env 并立即生效（仅超级管理员）
+
+    修改了需要重启的配置或校验失败时整体拒绝，当前配置保持不变；
+    成功后广播给同一主机上的其他 worker，它们在 SETTINGS_RELOAD_POLL_INTERVAL_MS 内各自重新加载。
+    """
+    try:
+        changed = sorted(reload_settings())
+    except SettingsReloadError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    settings_watcher.publish()
+    await audit_log.arecord("settings_reload", actor_id=current_user.id, ip=request_ip(request), changed=changed)
+    return {"changed": changed}
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.crud.audit import get_audit_events
+from app.schemas.audit import AuditEventRead
+from app.database import get_session
+from app.core.permissions import has_permission
+from app.models.user import User
+
+router = APIRouter()
+
+@router.get("/", response_model=List[AuditEventRead])
+async def read_audit_events(skip: int = 0,
+                            limit: int = Query(100, le=1000),
+                            event: Optional[str] = None,
+                            actor_id: Optional[int] = None,
+                            subject_id: Optional[int] = None,
+                            db: Session = Depends(get_session),
+                            _: User = Depends(has_permission("audit:read"))):
+    """按时间倒序查询审计日志（需要 audit:read 权限）"""
+    return get_audit_events(db, skip=skip, limit=limit, event=event, actor_id=actor_id, subject_id=subject_id)
@@ -1,42 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Form, Header, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from typing import Any
+from typing import Any, Optional
 from datetime import timedelta, datetime, timezone
+import json
+import secrets
+import time
 from jose import jwt, JWTError
 
 from app.core.security import create_access_token, create_refresh_token
-from app.schemas.auth import Token, TokenPayload, LoginRequest, RefreshRequest
+from app.schemas.auth import Token, TokenPayload, LoginRequest, RefreshRequest, AuthorizeRequest, AuthorizeResponse, IntrospectionResponse
 from app.schemas.user import UserCreate, UserRead
 from app.database import get_session
-from app.crud.user import authenticate_user, create_user, get_user_by_email, get_user_by_username
+from app.crud.user import get_user_by_username, register_user
+from app.core.hashing import password_hasher
+from app.crud.token import create_refresh_token_record, rotate_refresh_token, revoke_refresh_token
+from app.core.reference_tokens import create_reference_token, is_reference_token, revoke_reference_token
 from app.config.settings import settings
+from app.core.permissions import (
+    get_current_user, authorize_user, oauth2_scheme, resolve_access_token, load_token_user,
+    get_user_permissions, get_user_denies, get_user_role_names, check_token_introspection_permission,
+)
+from app.core.http_cache import strong_etag, etag_matches, not_modified
+from app.core.responses import ORJSONResponse
+from app.models.user import User
+from app.audit import audit_log, request_ip
+from app.activity import activity_tracker
 
 router = APIRouter()
 
+def _issue_access_token(db: Session, user_id: int, token_format: Optional[str]) -> str:
+    """按客户端指定的格式签发访问令牌，未指定时使用 ACCESS_TOKEN_FORMAT"""
+    token_format = token_format or settings.ACCESS_TOKEN_FORMAT
+    expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    if token_format == "reference":
+        return create_reference_token(db, user_id, expires_delta)
+    if token_format == "jwt":
+        return create_access_token(subject=str(user_id), expires_delta=expires_delta)
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="令牌格式只能是 jwt 或 reference")
+
 @router.post("/login", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_session)) -> Any:
-    """用户登录获取JWT令牌"""
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequestForm = Depends(),
+                                 token_format: Optional[str] = Form(None),
+                                 db: Session = Depends(get_session)) -> Any:
+    """用户登录获取访问令牌和刷新令牌，token_format 指定访问令牌格式（jwt 或 reference）"""
+    # bcrypt 校验在哈希线程池中执行，不阻塞事件循环
+    user = get_user_by_username(db, form_data.username)
+    if user and not await password_hasher.verify(form_data.password, user.hashed_password):
+        user = None
     if not user:
+        await audit_log.arecord("login_failed", ip=request_ip(request), username=form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
             headers={"WWW-Authenticate": "Bearer"},
         )
     if not user.is_active:
+        await audit_log.arecord("login_failed", actor_id=user.id, ip=request_ip(request), reason="inactive")
         raise HTTPException(status_code=400, detail="用户未激活")
 
     # 创建访问令牌和刷新令牌
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     refresh_token_expires = timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
 
-    access_token = create_access_token(
-        subject=str(user.id), expires_delta=access_token_expires
-    )
+    access_token = _issue_access_token(db, user.id, token_format)
+    # 每次登录开始新的刷新令牌 family
+    jti = secrets.token_urlsafe(16)
     refresh_token = create_refresh_token(
-        subject=str(user.id), expires_delta=refresh_token_expires
+        subject=str(user.id), expires_delta=refresh_token_expires, jti=jti
     )
+    create_refresh_token_record(db, jti, user.id, datetime.now(timezone.utc) + refresh_token_expires)
+    await audit_log.arecord("login", actor_id=user.id, ip=request_ip(request))
+    activity_tracker.login(user.id)
 
     return {
         "access_token": access_token,
@@ -45,7 +79,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     }
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(refresh_req: RefreshRequest, db: Session = Depends(get_session)) -> Any:
+async def refresh_token(refresh_req: RefreshRequest, request: Request, db: Session = Depends(get_session)) -> Any:
     """使用刷新令牌获取新的访问令牌"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -78,15 +112,28 @@ async def refresh_token(refresh_req: RefreshRequest, db: Session = Depends(get_s
         raise credentials_exception
 
     # 创建新的访问令牌和刷新令牌
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     refresh_token_expires = timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
 
-    access_token = create_access_token(
-        subject=user_id, expires_delta=access_token_expires
-    )
+    # 轮换：旧令牌标记为已使用，新令牌加入同一 family；未登记的令牌（包括旧版本签发的）不可用
+    new_jti = secrets.token_urlsafe(16)
+    try:
+        record = rotate_refresh_token(
+            db, token_data.jti, new_jti, datetime.now(timezone.utc) + refresh_token_expires
+        ) if token_data.jti else None
+    except ValueError:
+        # 已使用过的令牌再次出现，说明令牌可能泄露，整个 family 已被撤销
+        await audit_log.arecord("refresh_reuse", actor_id=int(user_id) if user_id and user_id.isdigit() else None,
+                         ip=request_ip(request))
+        raise credentials_exception
+    if record is None or str(record.user_id) != user_id:
+        raise credentials_exception
+
+    access_token = _issue_access_token(db, int(user_id), refresh_req.token_format)
     refresh_token = create_refresh_token(
-        subject=user_id, expires_delta=refresh_token_expires
+        subject=user_id, expires_delta=refresh_token_expires, jti=new_jti
     )
+    await audit_log.arecord("token_refresh", actor_id=int(user_id) if user_id and user_id.isdigit() else None,
+                     ip=request_ip(request))
 
     return {
         "access_token": access_token,
@@ -95,23 +142,95 @@ async def refresh_token(refresh_req: RefreshRequest, db: Session = Depends(get_s
     }
 
 @router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
-async def register_user(user_data: UserCreate, db: Session = Depends(get_session)) -> Any:
-    """注册新用户"""
-    # 检查用户名是否已存在
-    db_user = get_user_by_username(db, user_data.username)
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="用户名已被使用"
-        )
+async def register_user_endpoint(user_data: UserCreate, request: Request, db: Session = Depends(get_session)) -> Any:
+    """注册新用户：密码在哈希线程池中计算，用户名/邮箱唯一性由唯一索引保证，只写入一次"""
+    hashed_password = await password_hasher.hash(user_data.password)
+    try:
+        user = register_user(db, user_data, hashed_password)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    await audit_log.arecord("register", actor_id=user["id"], subject_id=user["id"], ip=request_ip(request))
+    return ORJSONResponse(user, status_code=status.HTTP_201_CREATED)
+
+@router.post("/revoke")
+async def revoke_token(request: Request,
+                       token: str = Form(...),
+                       token_type_hint: Optional[str] = Form(None),
+                       db: Session = Depends(get_session)) -> Any:
+    """按 RFC 7009 撤销令牌：引用型访问令牌立即失效，刷新令牌撤销其整个 family
+
+    JWT 访问令牌无法撤销，只能等待过期；无效或未知的令牌同样返回 200。
+    """
+    if is_reference_token(token):
+        if revoke_reference_token(db, token):
+            await audit_log.arecord("token_revoke", ip=request_ip(request), token_type="access")
+        return Response(status_code=status.HTTP_200_OK)
 
-    # 检查邮箱是否已存在
-    db_user = get_user_by_email(db, user_data.email)
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="邮箱已被注册"
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return Response(status_code=status.HTTP_200_OK)
+    if payload.get("type") == "refresh" and payload.get("jti"):
+        user_id = revoke_refresh_token(db, payload["jti"])
+        if user_id is not None:
+            await audit_log.arecord("token_revoke", actor_id=user_id, ip=request_ip(request), token_type="refresh")
+    return Response(status_code=status.HTTP_200_OK)
+
+@router.post("/authorize", response_model=AuthorizeResponse)
+async def authorize(authorize_req: AuthorizeRequest, current_user: User = Depends(get_current_user)) -> Any:
+    """批量判断当前用户是否拥有指定的权限和角色"""
+    return authorize_user(current_user, authorize_req.permissions, authorize_req.roles)
+
+def _introspection_response(token: str, db: Session, if_none_match: Optional[str]) -> Response:
+    """生成令牌内省响应，缓存时间不超过令牌剩余有效期"""
+    try:
+        token_data = resolve_access_token(db, token)
+        user = load_token_user(db, token_data)
+    except HTTPException:
+        # 无效、过期或用户不可用的令牌只返回 active=false
+        return Response(
+            content=b'{"active":false}',
+            media_type="application/json",
+            headers={"Cache-Control": "no-store"},
         )
 
-    # 创建新用户
-    return create_user(db, user_data)
+    # 超级管理员拥有所有权限，以 "*" 表示，不受拒绝规则限制；
+    # 其他用户的 scope 去掉被完全拒绝的授权，部分拒绝的通配符授权由 deny 表示
+    scope = ["*"] if user.is_superuser else sorted(get_user_permissions(user))
+    deny = [] if user.is_superuser else sorted(get_user_denies(user))
+    payload = {
+        "active": True,
+        "sub": token_data.sub,
+        "exp": token_data.exp,
+        "scope": " ".join(scope),
+        "deny": " ".join(deny),
+        "roles": sorted(get_user_role_names(user)),
+        "token_type": "access",
+    }
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    etag = strong_etag(body)
+    max_age = max(0, min(token_data.exp - int(time.time()), settings.INTROSPECTION_MAX_AGE_SECONDS))
+    headers = {"ETag": etag, "Cache-Control": f"max-age={max_age}", "Vary": "Authorization"}
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/introspect", response_model=IntrospectionResponse)
+async def introspect_bearer_token(token: str = Depends(oauth2_scheme),
+                                  if_none_match: Optional[str] = Header(None),
+                                  db: Session = Depends(get_session)) -> Any:
+    """内省 Authorization 头中的访问令牌，供网关缓存"""
+    return _introspection_response(token, db, if_none_match)
+
+@router.post("/introspect", response_model=IntrospectionResponse)
+async def introspect_token(token: str = Form(...),
+                           token_type_hint: Optional[str] = Form(None),
+                           if_none_match: Optional[str] = Header(None),
+                           db: Session = Depends(get_session),
+                           _: User = Depends(check_token_introspection_permission)) -> Any:
+    """按 RFC 7662 内省表单中提交的访问令牌
+
+    调用方（网关等）须以自身的访问令牌认证并拥有 token:introspect 权限，避免任意令牌被探测。
+    """
+    return _introspection_response(token, db, if_none_match)
@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+import orjson
+
+from app import sharding
+from app.change_feed import Change, change_feed
+from app.config.settings import settings
+from app.crud.outbox import cursor_expired, cursor_size, format_cursor, oldest_cursor, parse_cursor
+from app.database import get_session
+from app.core.permissions import has_permission
+from app.models.user import User
+
+router = APIRouter()
+
+def _format_events(position: List[int], changes: List[Change]) -> bytes:
+    """按 SSE 格式输出一批事件，每个事件的 id 为处理完该事件后的游标"""
+    chunks = []
+    for index, change in changes:
+        position[index] = change["id"]
+        data = orjson.dumps({
+            "seq": change["id"],
+            "topic": change["topic"],
+            "entity_id": change["entity_id"],
+            "data": change["data"],
+            "created_at": change["created_at"],
+        })
+        chunks.append(b"id: %s\nevent: %s\ndata: %s\n\n" % (
+            format_cursor(position).encode(), change["topic"].encode(), data,
+        ))
+    return b"".join(chunks)
+
+@router.get("/stream")
+async def stream_changes(since: Optional[str] = Query(None, description="从该游标之后开始，省略时从当前位置开始"),
+                         follow: bool = Query(True, description="为 false 时只补发积压事件后关闭"),
+                         last_event_id: Optional[str] = Header(None),
+                         db: Session = Depends(get_session),
+                         _: User = Depends(has_permission("events:read"))):
+    """用户与角色变更事件流（Server-Sent Events，需要 events:read 权限）
+
+    断线重连时浏览器自动携带的 Last-Event-ID 优先于 since；游标之后的事件已被清理时返回 410。
+    """
+    start = last_event_id or since
+    if start is not None:
+        try:
+            cursor = parse_cursor(start, cursor_size())
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if cursor_expired(cursor, await run_in_threadpool(oldest_cursor, db)):
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="游标之后的部分事件已超过保留期被清理，请重新全量同步")
+    else:
+        cursor = None
+    # 结束认证时的只读事务，长连接期间不占用连接池中的连接
+    db.rollback()
+    sharding.close_shard_sessions(db)
+
+    async def events():
+        position = cursor if cursor is not None else await run_in_threadpool(change_feed.latest)
+        sub = change_feed.subscribe(position)
+        position = list(position)
+        try:
+            yield b"retry: 1000\n\n"
+            async for changes in change_feed.stream(sub, follow=follow,
+                                                    keepalive=settings.CHANGE_FEED_KEEPALIVE_SECONDS):
+                yield _format_events(position, changes) if changes else b": keepalive\n\n"
+        finally:
+            change_feed.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
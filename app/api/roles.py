@@ -1,22 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 
-from app.crud.user import get_role, get_roles, create_role, update_role, delete_role, get_role_users, assign_role_to_user, remove_role_from_user
+from app.crud.user import get_role, get_role_version, get_roles, get_roles_version, get_role_rows, create_role, update_role, delete_role, get_role_users, get_role_user_rows, get_counters, role_members_counter, assign_role_to_user, remove_role_from_user, add_role_parent, remove_role_parent
 from app.schemas.user import RoleRead, UserRead, RoleUpdate, RoleWithUsers
 from app.database import get_session
 from app.core.permissions import check_role_management_permission
 from app.models.user import User
+from app.core.responses import ORJSONResponse
+from app.core.http_cache import weak_etag, etag_matches, not_modified
+from app.audit import audit_log, request_ip
 
 router = APIRouter()
 
 @router.get("/", response_model=List[RoleRead])
 async def read_roles(skip: int = 0, 
                     limit: int = 100, 
+                    if_none_match: Optional[str] = Header(None),
                     db: Session = Depends(get_session),
                     _: User = Depends(check_role_management_permission)):
-    """获取角色列表（需要角色管理权限）"""
-    return get_roles(db, skip=skip, limit=limit)
+    """获取角色列表（需要角色管理权限），总数通过响应头返回"""
+    total, last_updated = get_roles_version(db)
+    etag = weak_etag("roles", skip, limit, total, last_updated)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    headers = {"ETag": etag, "X-Total-Count": str(total)}
+    return ORJSONResponse(get_role_rows(db, skip=skip, limit=limit), headers=headers)
 
 @router.post("/", response_model=RoleRead, status_code=status.HTTP_201_CREATED)
 async def create_role_endpoint(name: str, 
@@ -29,12 +38,22 @@ async def create_role_endpoint(name: str,
 
 @router.get("/{role_id}", response_model=RoleRead)
 async def read_role(role_id: int, 
+                   response: Response,
+                   if_none_match: Optional[str] = Header(None),
                    db: Session = Depends(get_session),
                    _: User = Depends(check_role_management_permission)):
     """获取特定角色信息（需要角色管理权限）"""
+    updated_at = get_role_version(db, role_id)
+    if updated_at is None:
+        raise HTTPException(status_code=404, detail="角色不存在")
+    etag = weak_etag("role", role_id, updated_at)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
     db_role = get_role(db, role_id)
     if db_role is None:
         raise HTTPException(status_code=404, detail="角色不存在")
+    response.headers["ETag"] = etag
     return db_role
 
 @router.put("/{role_id}", response_model=RoleRead)
@@ -62,28 +81,56 @@ async def delete_role_endpoint(role_id: int,
 async def read_role_users(role_id: int, 
                         db: Session = Depends(get_session),
                         _: User = Depends(check_role_management_permission)):
-    """获取具有特定角色的用户列表（需要角色管理权限）"""
-    return get_role_users(db, role_id)
+    """获取具有特定角色的用户列表（需要角色管理权限），总数通过响应头返回"""
+    name = role_members_counter(role_id)
+    total = get_counters(db, [name])[name]
+    return ORJSONResponse(get_role_user_rows(db, role_id), headers={"X-Total-Count": str(total)})
 
 @router.post("/{role_id}/users/{user_id}", status_code=status.HTTP_200_OK)
 async def assign_role(role_id: int, 
                     user_id: int, 
+                    request: Request,
                     db: Session = Depends(get_session),
-                    _: User = Depends(check_role_management_permission)):
+                    current_user: User = Depends(check_role_management_permission)):
     """为用户分配角色（需要角色管理权限）"""
     if not assign_role_to_user(db, user_id, role_id):
         raise HTTPException(status_code=404, detail="用户或角色不存在")
+    await audit_log.arecord("role_grant", actor_id=current_user.id, subject_id=user_id, ip=request_ip(request), role_id=role_id)
     return {"message": "角色分配成功"}
 
 @router.delete("/{role_id}/users/{user_id}", status_code=status.HTTP_200_OK)
 async def remove_role(role_id: int, 
                     user_id: int, 
+                    request: Request,
                     db: Session = Depends(get_session),
-                    _: User = Depends(check_role_management_permission)):
+                    current_user: User = Depends(check_role_management_permission)):
     """从用户移除角色（需要角色管理权限）"""
     if not remove_role_from_user(db, user_id, role_id):
         raise HTTPException(status_code=404, detail="用户、角色或关联不存在")
+    await audit_log.arecord("role_revoke", actor_id=current_user.id, subject_id=user_id, ip=request_ip(request), role_id=role_id)
     return {"message": "角色移除成功"}
+@router.post("/{role_id}/parents/{parent_id}", status_code=status.HTTP_200_OK)
+async def add_parent_role(role_id: int, 
+                        parent_id: int, 
+                        db: Session = Depends(get_session),
+                        _: User = Depends(check_role_management_permission)):
+    """为角色添加父角色，子角色继承父角色的全部权限（需要角色管理权限）"""
+    try:
+        if not add_role_parent(db, role_id, parent_id):
+            raise HTTPException(status_code=404, detail="角色不存在")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "角色继承关系添加成功"}
+
+@router.delete("/{role_id}/parents/{parent_id}", status_code=status.HTTP_200_OK)
+async def remove_parent_role(role_id: int, 
+                        parent_id: int, 
+                        db: Session = Depends(get_session),
+                        _: User = Depends(check_role_management_permission)):
+    """移除角色的父角色（需要角色管理权限）"""
+    if not remove_role_parent(db, role_id, parent_id):
+        raise HTTPException(status_code=404, detail="角色继承关系不存在")
+    return {"message": "角色继承关系移除成功"}
 @router.get("/{role_id}", response_model=RoleRead)
 async def read_role(role_id: int,
                     db: Session = Depends(get_session),
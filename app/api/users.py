@@ -1,18 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Request, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
+from datetime import datetime, timedelta, timezone
 
-from app.crud.user import get_user, get_users, update_user, delete_user, assign_role_to_user, remove_role_from_user
-from app.schemas.user import UserRead, UserDetailRead, UserUpdate
+from app.crud.user import get_user, get_user_version, get_user_rows, get_user_rows_by_ids, search_user_rows, get_counters, update_user, delete_user, assign_role_to_user, remove_role_from_user
+from app.crud.user import get_user_changes, change_cursor, format_change_cursor, parse_change_cursor
+from app.schemas.user import USER_BATCH_MAX_IDS, UserRead, UserDetailRead, UserUpdate, UserSearchPage, UserBatchGet, UserBatchRead, UserChangesPage
+from app.config.settings import settings
 from app.database import get_session
 from app.core.permissions import get_current_user, get_current_active_superuser, check_user_management_permission
 from app.models.user import User
+from app.core.responses import ORJSONResponse
+from app.core.http_cache import weak_etag, user_detail_etag, etag_matches, not_modified
+from app.audit import audit_log, request_ip
 
 router = APIRouter()
 
 @router.get("/me", response_model=UserDetailRead)
-async def read_user_me(current_user: User = Depends(get_current_user)):
+async def read_user_me(response: Response,
+                       if_none_match: Optional[str] = Header(None),
+                       current_user: User = Depends(get_current_user)):
     """获取当前登录用户信息"""
+    # ETag 由认证阶段已加载的用户计算，命中时不加载角色、不序列化
+    etag = user_detail_etag(current_user)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return current_user
 
 @router.put("/me", response_model=UserRead)
@@ -20,18 +33,109 @@ async def update_user_me(user_update: UserUpdate,
                         current_user: User = Depends(get_current_user),
                         db: Session = Depends(get_session)):
     """更新当前登录用户信息"""
-    return update_user(db, current_user.id, user_update)
+    try:
+        return update_user(db, current_user.id, user_update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/", response_model=List[UserRead])
+def _batch_response(db: Session, ids: List[int], include_roles: bool) -> ORJSONResponse:
+    """一次查询获取全部用户，按请求顺序返回并列出不存在的 ID"""
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > USER_BATCH_MAX_IDS:
+        raise HTTPException(status_code=422, detail=f"一次最多获取 {USER_BATCH_MAX_IDS} 个用户")
+    rows = get_user_rows_by_ids(db, ids, with_roles=include_roles)
+    return ORJSONResponse({
+        "items": [rows[user_id] for user_id in ids if user_id in rows],
+        "missing": [user_id for user_id in ids if user_id not in rows],
+    })
+
+@router.get("/", response_model=Union[List[UserRead], UserBatchRead])
 async def read_users(skip: int = 0, 
                     limit: int = 100, 
+                    ids: Optional[str] = Query(None, description="逗号分隔的用户 ID，指定时按 ID 批量获取"),
+                    include_roles: bool = False,
                     db: Session = Depends(get_session),
                     _: User = Depends(check_user_management_permission)):
-    """获取用户列表（需要管理权限）"""
-    return get_users(db, skip=skip, limit=limit)
+    """获取用户列表（需要管理权限），总数和激活用户数通过响应头返回
+
+    指定 ids 时改为按 ID 批量获取，返回 UserBatchRead。
+    """
+    if ids is not None:
+        try:
+            user_ids = [int(part) for part in ids.split(",") if part.strip()]
+        except ValueError:
+            raise HTTPException(status_code=422, detail="ids 必须是逗号分隔的整数")
+        if not user_ids:
+            raise HTTPException(status_code=422, detail="ids 不能为空")
+        return _batch_response(db, user_ids, include_roles)
+
+    totals = get_counters(db, ["users", "users_active"])
+    headers = {"X-Total-Count": str(totals["users"]), "X-Active-Count": str(totals["users_active"])}
+    return ORJSONResponse(get_user_rows(db, skip=skip, limit=limit), headers=headers)
+
+@router.post("/batch-get", response_model=UserBatchRead)
+async def batch_get_users(batch: UserBatchGet,
+                          db: Session = Depends(get_session),
+                          _: User = Depends(check_user_management_permission)):
+    """按 ID 批量获取用户（需要管理权限），结果按请求顺序排列，不存在的 ID 在 missing 中列出"""
+    return _batch_response(db, batch.ids, batch.include_roles)
+
+@router.get("/search", response_model=UserSearchPage)
+async def search_users(q: str = Query(..., min_length=1, max_length=100),
+                       match: str = Query("substring", pattern="^(prefix|substring)$"),
+                       is_active: Optional[bool] = None,
+                       is_superuser: Optional[bool] = None,
+                       role_id: Optional[int] = None,
+                       cursor: Optional[int] = None,
+                       limit: int = Query(50, ge=1, le=200),
+                       db: Session = Depends(get_session),
+                       _: User = Depends(check_user_management_permission)):
+    """按用户名或邮箱的前缀/子串搜索用户，按游标分页（需要管理权限）"""
+    # 多取一条判断是否还有下一页
+    rows = search_user_rows(db, q, prefix=match == "prefix", is_active=is_active, is_superuser=is_superuser,
+                            role_id=role_id, cursor=cursor, limit=limit + 1)
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return ORJSONResponse({"items": rows[:limit], "next_cursor": next_cursor})
+
+@router.get("/changes", response_model=UserChangesPage)
+async def read_user_changes(since: Optional[str] = Query(None, description="上次返回的 next_cursor，省略时从头同步"),
+                            limit: int = Query(500, ge=1),
+                            db: Session = Depends(get_session),
+                            _: User = Depends(check_user_management_permission)):
+    """增量同步：返回游标之后新建、修改和删除的用户（需要管理权限）
+
+    按 (变更时间, 用户 ID) 排序分页，has_more 为假表示已追上，此时游标推进到本次同步的截止时间；
+    客户端超过删除记录保留期未同步时游标返回 410，需重新全量同步。
+    """
+    now = datetime.now(timezone.utc)
+    cursor = None
+    if since is not None:
+        try:
+            cursor = parse_change_cursor(since)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        horizon = now - timedelta(days=settings.USER_TOMBSTONE_RETENTION_DAYS)
+        if cursor[0] < horizon.replace(tzinfo=None):
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="游标已超过删除记录保留期，请重新全量同步")
+
+    limit = min(limit, settings.USER_CHANGES_MAX_LIMIT)
+    # 只读取早于安全延迟的变更：更新时间较早的事务可能晚于较新的事务提交
+    until = now - timedelta(milliseconds=settings.USER_CHANGES_SAFETY_LAG_MS)
+    # 多取一条判断是否还有下一页
+    changes = get_user_changes(db, cursor, until, limit + 1)
+    items = changes[:limit]
+    has_more = len(changes) > limit
+    if has_more:
+        position = change_cursor(items[-1])
+    else:
+        # 已追上：until 之前的变更都已返回，游标推进到 until，目录长期无变更时游标也不会过期
+        position = max(filter(None, [cursor, (until.replace(tzinfo=None), 0)]))
+    return ORJSONResponse({"items": items, "next_cursor": format_change_cursor(position), "has_more": has_more})
 
 @router.get("/{user_id}", response_model=UserDetailRead)
 async def read_user(user_id: int, 
+                    response: Response,
+                    if_none_match: Optional[str] = Header(None),
                     db: Session = Depends(get_session),
                     current_user: User = Depends(get_current_user)):
     """获取特定用户信息"""
@@ -42,9 +146,21 @@ async def read_user(user_id: int,
             detail="没有足够的权限访问此用户信息"
         )
 
+    # 先只查询版本字段计算 ETag，访问本人时直接使用已加载的用户
+    if current_user.id == user_id:
+        etag = user_detail_etag(current_user)
+    else:
+        version = get_user_version(db, user_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="用户不存在")
+        etag = weak_etag("user", user_id, *version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
     db_user = get_user(db, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="用户不存在")
+    response.headers["ETag"] = etag
     return db_user
 
 @router.put("/{user_id}", response_model=UserRead)
@@ -53,36 +169,45 @@ async def update_user_endpoint(user_id: int,
                         db: Session = Depends(get_session),
                         _: User = Depends(check_user_management_permission)):
     """更新用户信息（需要管理权限）"""
-    db_user = update_user(db, user_id, user_update)
+    try:
+        db_user = update_user(db, user_id, user_update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if db_user is None:
         raise HTTPException(status_code=404, detail="用户不存在")
     return db_user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user_endpoint(user_id: int, 
+                        request: Request,
                         db: Session = Depends(get_session),
-                        _: User = Depends(check_user_management_permission)):
+                        current_user: User = Depends(check_user_management_permission)):
     """删除用户（需要管理权限）"""
     if not delete_user(db, user_id):
         raise HTTPException(status_code=404, detail="用户不存在")
+    await audit_log.arecord("user_delete", actor_id=current_user.id, subject_id=user_id, ip=request_ip(request))
 @router.post("/{user_id}/roles/{role_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def assign_user_role(user_id: int, 
                         role_id: int,
+                        request: Request,
                         db: Session = Depends(get_session),
-                        _: User = Depends(check_user_management_permission)):
+                        current_user: User = Depends(check_user_management_permission)):
     """为用户分配角色（需要用户管理权限）"""
     success = assign_role_to_user(db, user_id, role_id)
     if not success:
         raise HTTPException(status_code=404, detail="用户或角色不存在")
+    await audit_log.arecord("role_grant", actor_id=current_user.id, subject_id=user_id, ip=request_ip(request), role_id=role_id)
     return {"detail": "角色分配成功"}
 
 @router.delete("/{user_id}/roles/{role_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def remove_user_role(user_id: int, 
                         role_id: int,
+                        request: Request,
                         db: Session = Depends(get_session),
-                        _: User = Depends(check_user_management_permission)):
+                        current_user: User = Depends(check_user_management_permission)):
     """移除用户的角色（需要用户管理权限）"""
     success = remove_role_from_user(db, user_id, role_id)
     if not success:
         raise HTTPException(status_code=404, detail="用户或角色不存在，或用户未分配该角色")
+    await audit_log.arecord("role_revoke", actor_id=current_user.id, subject_id=user_id, ip=request_ip(request), role_id=role_id)
     return {"detail": "角色移除成功"}
@@ -0,0 +1,214 @@
+"""非阻塞的批量审计日志
+
+请求处理中调用 ``audit_log.record`` 只把事件放入内存中的有界队列；
+后台线程每隔 AUDIT_FLUSH_INTERVAL_MS 毫秒或攒满 AUDIT_BATCH_SIZE 条时，
+用一条批量 INSERT 写入 audit_events 表，热点路径不会因审计多一次提交。
+
+队列满时按 AUDIT_OVERFLOW_POLICY 处理：
+- drop：丢弃新事件并计数（默认）；
+- block：调用方最多等待 AUDIT_BLOCK_TIMEOUT_MS 毫秒，超时仍丢弃。
+
+异步处理函数应调用 ``await audit_log.arecord(...)``：队列满时的等待放到线程池中进行，
+不会阻塞事件循环；``record`` 在调用线程中等待，只适合同步代码。
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+
+from app.config.settings import settings, subscribe
+from app.models.audit import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop", "block")
+
+
+class AuditLog:
+    """有界队列加后台批量写入的审计日志"""
+
+    def __init__(self, engine: Optional[Engine] = None, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 0.2, overflow_policy: str = "drop", block_timeout: float = 0.1):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的审计队列溢出策略: {overflow_policy}")
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # 保证同一时刻只有一个线程在写入
+        self._write_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def resize(self, max_queue: int) -> None:
+        """调整队列容量；已在队列中的事件保留，缩小后等新事件排出再接收"""
+        with self._queue.mutex:
+            self._queue.maxsize = max_queue
+            self._queue.not_full.notify_all()
+
+    def record(self, event: str, actor_id: Optional[int] = None, subject_id: Optional[int] = None,
+               ip: Optional[str] = None, **detail: Any) -> bool:
+        """记录一条审计事件，返回是否成功入队；block 策略下在调用线程中等待"""
+        item = self._item(event, actor_id, subject_id, ip, detail)
+        return self._put(item, self.overflow_policy == "block")
+
+    async def arecord(self, event: str, actor_id: Optional[int] = None, subject_id: Optional[int] = None,
+                      ip: Optional[str] = None, **detail: Any) -> bool:
+        """异步版本的 record：先尝试直接入队，队列满且为 block 策略时在线程池中等待"""
+        item = self._item(event, actor_id, subject_id, ip, detail)
+        if self._put(item, False, count_drop=False):
+            return True
+        if self.overflow_policy == "block":
+            return await run_in_threadpool(self._put, item, True)
+        self.dropped += 1
+        return False
+
+    def _item(self, event: str, actor_id: Optional[int], subject_id: Optional[int], ip: Optional[str],
+              detail: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "event": event,
+            "actor_id": actor_id,
+            "subject_id": subject_id,
+            "ip": ip,
+            "detail": detail,
+            "created_at": datetime.now(timezone.utc),
+        }
+
+    def _put(self, item: Dict[str, Any], block: bool, count_drop: bool = True) -> bool:
+        try:
+            if block:
+                self._queue.put(item, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            if count_drop:
+                self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def start(self) -> None:
+        """启动后台写入线程"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台线程，并写入队列中剩余的事件"""
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> int:
+        """立即写入队列中的全部事件，返回写入条数"""
+        total = 0
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return total
+            total += self._write(batch)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "audit_events_enqueued_total": self.enqueued,
+            "audit_events_written_total": self.written,
+            "audit_events_dropped_total": self.dropped,
+            "audit_events_failed_total": self.failed,
+            "audit_queue_depth": self.queue_depth,
+        }
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        # 等待第一条事件，之后在刷新间隔内尽量攒满一批
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> int:
+        engine = self.engine
+        if engine is None:
+            from app.database import engine
+        with self._write_lock:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(AuditEvent.__table__), batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"写入 {len(batch)} 条审计事件失败: {e}")
+                return 0
+        self.written += len(batch)
+        return len(batch)
+
+
+def request_ip(request: Request) -> Optional[str]:
+    return request.client.host if request.client else None
+
+
+# 默认写入主库
+audit_log = AuditLog(
+    max_queue=settings.AUDIT_QUEUE_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL_MS / 1000,
+    overflow_policy=settings.AUDIT_OVERFLOW_POLICY,
+    block_timeout=settings.AUDIT_BLOCK_TIMEOUT_MS / 1000,
+)
+
+
+@subscribe
+def _apply_settings(old, new, changed) -> None:
+    if "AUDIT_QUEUE_SIZE" in changed:
+        audit_log.resize(new.AUDIT_QUEUE_SIZE)
+    audit_log.batch_size = new.AUDIT_BATCH_SIZE
+    audit_log.flush_interval = new.AUDIT_FLUSH_INTERVAL_MS / 1000
+    audit_log.overflow_policy = new.AUDIT_OVERFLOW_POLICY
+    audit_log.block_timeout = new.AUDIT_BLOCK_TIMEOUT_MS / 1000
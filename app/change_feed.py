@@ -0,0 +1,247 @@
+"""用户/角色变更事件流
+
+CRUD 在变更的同一事务中写入 outbox_events；每个进程一个轮询任务每隔
+CHANGE_FEED_POLL_INTERVAL_MS 毫秒（本进程提交事件后立即）读取新事件，分发给全部订阅者。
+所有订阅者共用一次查询，订阅者数量不增加数据库负载。
+
+订阅者从指定游标开始：先从数据库补发积压事件，追上后改为接收轮询任务分发的事件；
+每个订阅者的缓冲区最多 CHANGE_FEED_BUFFER_SIZE 个事件，消费过慢导致缓冲区满时
+不再向其分发，改为按自己的游标从数据库补读，追上后恢复，不丢事件也不断开连接。
+
+后台任务同时按 USER_TOMBSTONE_RETENTION_DAYS 清理增量同步使用的用户删除记录。
+
+序号按提交顺序递增依赖 SQLite 的串行写入；换用允许并发写事务的数据库时，
+需要改为只读取提交时间早于一个宽限期的事件，避免跳过晚提交的小序号事件。
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import sharding
+from app.config.settings import settings, subscribe
+from app.crud.outbox import get_outbox_events, latest_cursor, on_outbox_commit, prune_outbox
+from app.crud.user import prune_user_tombstones
+
+logger = logging.getLogger(__name__)
+
+Change = Tuple[int, Dict]
+
+
+class Subscription:
+    """单个订阅者的游标和有界缓冲区"""
+
+    def __init__(self, cursor: List[int], buffer_size: int):
+        self.cursor = list(cursor)
+        self.queue: "asyncio.Queue[Change]" = asyncio.Queue(maxsize=buffer_size)
+        # 缓冲区满后置位，订阅者改为从数据库补读
+        self.overflowed = False
+
+    def advance(self, changes: List[Change]) -> List[Change]:
+        """过滤已发送过的事件并推进游标，返回需要发送的事件"""
+        fresh = []
+        for index, change in changes:
+            if change["id"] > self.cursor[index]:
+                self.cursor[index] = change["id"]
+                fresh.append((index, change))
+        return fresh
+
+
+class ChangeFeed:
+    """轮询发件箱并分发给订阅者"""
+
+    def __init__(self, poll_interval: float, batch_size: int, buffer_size: int, retention: float,
+                 prune_interval: float = 300, session_factory: Optional[Callable[[], Session]] = None,
+                 tombstone_retention: Optional[float] = None):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        self.retention = retention
+        # 用户删除记录的保留时长（秒），None 表示不清理
+        self.tombstone_retention = tombstone_retention
+        self.prune_interval = prune_interval
+        self.session_factory = session_factory
+        # 轮询任务已读取到的位置
+        self.cursor: Optional[List[int]] = None
+        self.subscribers: Set[Subscription] = set()
+        self.published = 0
+        self.overflows = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        on_outbox_commit(self.notify)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def _with_session(self, fn):
+        factory = self.session_factory
+        if factory is None:
+            from app.database import SessionLocal as factory
+        db = factory()
+        try:
+            return fn(db)
+        finally:
+            sharding.close_shard_sessions(db)
+            db.close()
+
+    def read(self, cursor: List[int]) -> List[Change]:
+        """同步读取游标之后的一批事件"""
+        return self._with_session(lambda db: get_outbox_events(db, cursor, self.batch_size))
+
+    def latest(self) -> List[int]:
+        return self._with_session(latest_cursor)
+
+    def start(self) -> None:
+        """在事件循环中调用"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._loop = None
+
+    def notify(self) -> None:
+        """本进程提交了新事件，立即唤醒轮询任务（可在任意线程调用）"""
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    async def _run(self) -> None:
+        self.cursor = await run_in_threadpool(self.latest)
+        last_prune = time.monotonic()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.poll()
+                if time.monotonic() - last_prune >= self.prune_interval:
+                    last_prune = time.monotonic()
+                    await run_in_threadpool(self.prune)
+            except Exception as e:
+                logger.error(f"读取变更事件失败: {e}")
+
+    async def poll(self) -> int:
+        """读取并分发全部新事件，返回事件数"""
+        total = 0
+        while True:
+            changes = await run_in_threadpool(self.read, self.cursor)
+            if not changes:
+                return total
+            for index, change in changes:
+                self.cursor[index] = change["id"]
+                self._publish((index, change))
+            total += len(changes)
+
+    def _publish(self, change: Change) -> None:
+        self.published += 1
+        for sub in self.subscribers:
+            if sub.overflowed:
+                continue
+            try:
+                sub.queue.put_nowait(change)
+            except asyncio.QueueFull:
+                sub.overflowed = True
+                self.overflows += 1
+
+    def prune(self) -> int:
+        """删除超过保留期的事件和用户删除记录，返回删除数"""
+        now = datetime.now(timezone.utc)
+
+        def run(db: Session) -> int:
+            total = prune_outbox(db, now - timedelta(seconds=self.retention))
+            if self.tombstone_retention is not None:
+                total += prune_user_tombstones(db, now - timedelta(seconds=self.tombstone_retention))
+            return total
+
+        return self._with_session(run)
+
+    def subscribe(self, cursor: List[int]) -> Subscription:
+        sub = Subscription(cursor, self.buffer_size)
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self.subscribers.discard(sub)
+
+    async def _catch_up(self, sub: Subscription) -> AsyncIterator[List[Change]]:
+        while True:
+            changes = sub.advance(await run_in_threadpool(self.read, sub.cursor))
+            if not changes:
+                return
+            yield changes
+
+    async def stream(self, sub: Subscription, follow: bool = True,
+                     keepalive: Optional[float] = None) -> AsyncIterator[List[Change]]:
+        """按批产出订阅者的事件；follow 为假时补发完积压事件即结束
+
+        等待超过 keepalive 秒没有事件时产出空批次，供调用方发送心跳。
+        """
+        while True:
+            # 先登记订阅（在调用方完成）再补读，补读期间分发的事件在缓冲区中，按游标去重
+            async for changes in self._catch_up(sub):
+                yield changes
+            if not follow:
+                return
+
+            while not sub.overflowed:
+                try:
+                    first = await asyncio.wait_for(sub.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield []
+                    continue
+                batch = [first]
+                while len(batch) < self.batch_size and not sub.queue.empty():
+                    batch.append(sub.queue.get_nowait())
+                changes = sub.advance(batch)
+                if changes:
+                    yield changes
+
+            # 缓冲区溢出：清空后恢复分发，再从数据库补读缺失的部分
+            while not sub.queue.empty():
+                sub.queue.get_nowait()
+            sub.overflowed = False
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "change_feed_subscribers": len(self.subscribers),
+            "change_feed_published_total": self.published,
+            "change_feed_overflows_total": self.overflows,
+        }
+
+
+change_feed = ChangeFeed(
+    poll_interval=settings.CHANGE_FEED_POLL_INTERVAL_MS / 1000,
+    batch_size=settings.CHANGE_FEED_BATCH_SIZE,
+    buffer_size=settings.CHANGE_FEED_BUFFER_SIZE,
+    retention=settings.OUTBOX_RETENTION_HOURS * 3600,
+    tombstone_retention=settings.USER_TOMBSTONE_RETENTION_DAYS * 86400,
+)
+
+
+@subscribe
+def _apply_settings(old, new, changed) -> None:
+    # 缓冲区大小对之后的订阅者生效
+    change_feed.poll_interval = new.CHANGE_FEED_POLL_INTERVAL_MS / 1000
+    change_feed.batch_size = new.CHANGE_FEED_BATCH_SIZE
+    change_feed.buffer_size = new.CHANGE_FEED_BUFFER_SIZE
+    change_feed.retention = new.OUTBOX_RETENTION_HOURS * 3600
+    change_feed.tombstone_retention = new.USER_TOMBSTONE_RETENTION_DAYS * 86400
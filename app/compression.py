@@ -0,0 +1,217 @@
+"""按 Accept-Encoding 协商的响应压缩中间件（纯 ASGI）
+
+支持 gzip；安装 brotli / zstandard 后额外支持 br / zstd。
+- 一次性发送的响应体小于 COMPRESSION_MINIMUM_SIZE 时不压缩；
+- 分块发送的响应（StreamingResponse）逐块压缩并立即刷新，不缓冲整个响应体；
+- 路由函数用 ``@no_compression`` 标记后不压缩；text/event-stream 等不在
+  COMPRESSIBLE_TYPES 中的类型也不压缩；
+- 压缩后强 ETag 改为弱 ETag，If-None-Match 的弱比较仍可命中。
+"""
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+from app.config.settings import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 可选依赖
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 可选依赖
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain", "text/csv", "text/css",
+                      "application/javascript", "application/xml", "text/xml")
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._c = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self._c = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+class _Zstd:
+    def __init__(self, level: int):
+        self._c = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data) + self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+def available_encodings() -> List[str]:
+    """按服务端偏好排列的可用编码"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def make_compressor(encoding: str):
+    if encoding == "zstd":
+        return _Zstd(settings.COMPRESSION_ZSTD_LEVEL)
+    if encoding == "br":
+        return _Brotli(settings.COMPRESSION_BROTLI_QUALITY)
+    return _Gzip(settings.COMPRESSION_GZIP_LEVEL)
+
+
+def negotiate(accept_encoding: str, encodings: List[str]) -> Optional[str]:
+    """选出客户端可接受、q 值最高的编码，q 值相同时按服务端偏好"""
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def no_compression(endpoint: Callable) -> Callable:
+    """标记路由函数的响应不压缩"""
+    endpoint.no_compression = True
+    return endpoint
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    """按 Accept-Encoding 压缩响应体"""
+
+    def __init__(self, app, minimum_size: Optional[int] = None, encodings: Optional[List[str]] = None):
+        self.app = app
+        self._minimum_size = minimum_size
+        self.encodings = encodings or available_encodings()
+
+    @property
+    def minimum_size(self) -> int:
+        # 未显式指定时读取当前配置，重新加载后立即生效
+        return settings.COMPRESSION_MINIMUM_SIZE if self._minimum_size is None else self._minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = _header(scope["headers"], b"accept-encoding")
+        encoding = negotiate(accept.decode("latin-1"), self.encodings) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                if self._eligible(scope, message):
+                    # 推迟到第一块响应体，才能判断大小和是否分块
+                    start_message = message
+                    return
+                await send(message)
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            if start_message is not None:
+                start, start_message = start_message, None
+                body = message.get("body", b"")
+                if not message.get("more_body", False):
+                    # 一次性发送的响应体：整体压缩并给出新的 Content-Length
+                    if len(body) < self.minimum_size:
+                        await send(start)
+                        await send(message)
+                        return
+                    compressor = make_compressor(encoding)
+                    data = compressor.compress(body) + compressor.finish()
+                    await send(self._compressed_start(start, encoding, len(data)))
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                compressor = make_compressor(encoding)
+                await send(self._compressed_start(start, encoding))
+
+            if compressor is None:
+                await send(message)
+                return
+
+            # 分块响应：每块压缩后立即刷新，客户端能及时收到
+            more_body = message.get("more_body", False)
+            data = compressor.compress(message.get("body", b""))
+            if not more_body:
+                data += compressor.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _eligible(self, scope, message) -> bool:
+        if message["status"] < 200 or message["status"] in (204, 304):
+            return False
+        endpoint = getattr(scope.get("route"), "endpoint", None)
+        if getattr(endpoint, "no_compression", False):
+            return False
+        headers = message.get("headers", [])
+        if _header(headers, b"content-encoding") is not None:
+            return False
+        content_type = (_header(headers, b"content-type") or b"").decode("latin-1").split(";")[0].strip()
+        return content_type in COMPRESSIBLE_TYPES
+
+    def _compressed_start(self, message, encoding: str, content_length: Optional[int] = None):
+        headers = []
+        vary = None
+        for key, value in message.get("headers", []):
+            name = key.lower()
+            if name == b"content-length":
+                continue
+            if name == b"vary":
+                vary = value
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                # 压缩后的表示与原响应体字节不同，只能作为弱 ETag
+                value = b"W/" + value
+            headers.append((key, value))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode("latin-1")))
+        headers.append((b"content-encoding", encoding.encode("latin-1")))
+        headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        return {**message, "headers": headers}
@@ -1,10 +1,10 @@
+from pydantic import field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
-import os
-from dotenv import load_dotenv
+from typing import Callable, List, Optional, Set
+import logging
+import threading
 
-# 加载.env文件中的环境变量
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 class Settings(BaseSettings):
     # 应用配置
@@ -13,19 +13,223 @@ class Settings(BaseSettings):
     DEBUG: bool = True
 
     # 安全配置
-    SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
-    ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
-    REFRESH_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_MINUTES", "10080"))  # 7天
+    SECRET_KEY: str = "your-secret-key-here"
+    ALGORITHM: str = "HS256"
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_MINUTES: int = 10080  # 7天
+
+    # 令牌内省响应的最长缓存时间（秒），实际值不超过令牌剩余有效期
+    INTROSPECTION_MAX_AGE_SECONDS: int = 60
+
+    # 是否在响应头中返回每个请求使用的数据库会话数和连接检出次数（调试用，默认关闭）
+    DB_STATS_HEADERS: bool = False
+
+    # 事件循环延迟监控：默认关闭；心跳间隔和单次阻塞的报告阈值（毫秒）
+    LOOP_MONITOR_ENABLED: bool = False
+    LOOP_MONITOR_INTERVAL_MS: int = 50
+    LOOP_BLOCK_THRESHOLD_MS: int = 100
+
+    # 审计日志：队列容量、每批最多条数、刷新间隔（毫秒）和队列满时的策略（drop/block）
+    AUDIT_QUEUE_SIZE: int = 10000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL_MS: int = 200
+    AUDIT_OVERFLOW_POLICY: str = "drop"
+    # block 策略下调用方等待队列空位的最长时间（毫秒）
+    AUDIT_BLOCK_TIMEOUT_MS: int = 100
+
+    # 用户最近登录/活动时间的批量写入间隔（秒），也是最近活动时间的记录粒度
+    ACTIVITY_FLUSH_INTERVAL_SECONDS: int = 60
+
+    # 后台按实际数据重算列表总数计数器的间隔（秒）
+    COUNTER_RECONCILE_INTERVAL_SECONDS: int = 600
+
+    # 响应压缩：小于该字节数的响应不压缩；各编码的压缩级别
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+
+    # 过期刷新令牌的清理间隔（秒）和每批删除的行数
+    REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS: int = 300
+    REFRESH_TOKEN_SWEEP_BATCH_SIZE: int = 1000
+
+    # 密码哈希线程池大小
+    PASSWORD_HASH_WORKERS: int = 4
+
+    # 就绪检查阈值：数据库探测超时和延迟（毫秒）、连接池使用率、事件循环延迟（毫秒）、哈希排队数
+    READINESS_DB_TIMEOUT_MS: int = 1000
+    READINESS_MAX_DB_LATENCY_MS: int = 250
+    READINESS_MAX_POOL_UTILIZATION: float = 0.9
+    READINESS_MAX_LOOP_LAG_MS: int = 200
+    READINESS_MAX_HASH_QUEUE: int = 32
 
     # 兼容性别名
-    JWT_SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
-    JWT_ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
+    JWT_SECRET_KEY: str = "your-secret-key-here"
+    JWT_ALGORITHM: str = "HS256"
 
     # 数据库配置
-    DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+    DATABASE_URL: str = "sqlite:///./sql_app.db"
+    # 用户分片库地址，逗号分隔；为空时不分片
+    SHARD_DATABASE_URLS: str = ""
+
+    # 权限规则编译结果缓存的最大角色版本数
+    MATCHER_CACHE_SIZE: int = 1024
+
+    # 用户有效角色与权限规则缓存：memory 为进程内 LRU，mmap 为同一主机上各 worker 共享的内存映射文件
+    PERMISSION_CACHE_BACKEND: str = "memory"
+    # LRU 的最大条目数，或共享文件的槽位数
+    PERMISSION_CACHE_SIZE: int = 10000
+    # 共享文件的槽位大小（字节），超出的条目不缓存
+    PERMISSION_CACHE_SLOT_SIZE: int = 1024
+    # 共享文件路径，默认在临时目录下当前用户专用的子目录中按数据库地址和槽位参数生成
+    PERMISSION_CACHE_PATH: str = ""
 
+    # 变更事件流：轮询发件箱的间隔、每批事件数、每个订阅者的缓冲事件数、心跳间隔
+    CHANGE_FEED_POLL_INTERVAL_MS: int = 200
+    CHANGE_FEED_BATCH_SIZE: int = 500
+    CHANGE_FEED_BUFFER_SIZE: int = 1000
+    CHANGE_FEED_KEEPALIVE_SECONDS: int = 15
+    # 发件箱事件保留时长（小时），超过后由事件流的后台任务删除
+    OUTBOX_RETENTION_HOURS: int = 168
+    # 用户增量同步：删除记录保留天数（游标早于保留期时需全量同步）、每页条数上限，
+    # 以及只返回早于当前时间该毫秒数的变更（等待更新时间较早但提交较晚的事务）
+    USER_TOMBSTONE_RETENTION_DAYS: int = 30
+    USER_CHANGES_MAX_LIMIT: int = 1000
+    USER_CHANGES_SAFETY_LAG_MS: int = 2000
+    # 访问令牌格式：jwt（自包含）或 reference（随机句柄，按会话表解析，可立即撤销），
+    # 登录和刷新时客户端可通过 token_format 单独指定
+    ACCESS_TOKEN_FORMAT: str = "jwt"
+    # 引用型令牌会话缓存的条目数，缓存后端与 PERMISSION_CACHE_BACKEND 相同
+    ACCESS_SESSION_CACHE_SIZE: int = 10000
+    # memory 后端的会话缓存条目超过该毫秒数后重新核对会话表，
+    # 多个 worker 时其他 worker 上的撤销最迟在此时间后生效；0 表示每次都核对
+    ACCESS_SESSION_CACHE_TTL_MS: int = 1000
+    # 多 worker 时各 worker 检查共享配置代数的间隔（毫秒），其他 worker 的重新加载最迟在此时间后生效
+    SETTINGS_RELOAD_POLL_INTERVAL_MS: int = 1000
+
+    # 每次实例化时重新读取环境变量和 .env（环境变量优先），字段的默认值是字面量，
+    # 从 .env 删除的配置在重新加载后恢复为默认值
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=True)
 
+    @model_validator(mode="after")
+    def fill_jwt_aliases(self):
+        if self.JWT_SECRET_KEY is None:
+            self.JWT_SECRET_KEY = self.SECRET_KEY
+        if self.JWT_ALGORITHM is None:
+            self.JWT_ALGORITHM = self.ALGORITHM
+        return self
+
+    @field_validator("AUDIT_OVERFLOW_POLICY")
+    def overflow_policy_supported(cls, v):
+        if v not in ("drop", "block"):
+            raise ValueError("AUDIT_OVERFLOW_POLICY 只能是 drop 或 block")
+        return v
+
+    @field_validator("ACCESS_TOKEN_FORMAT")
+    def token_format_supported(cls, v):
+        if v not in ("jwt", "reference"):
+            raise ValueError("ACCESS_TOKEN_FORMAT 只能是 jwt 或 reference")
+        return v
+
+    @field_validator("PERMISSION_CACHE_BACKEND")
+    def cache_backend_supported(cls, v):
+        if v not in ("memory", "mmap"):
+            raise ValueError("PERMISSION_CACHE_BACKEND 只能是 memory 或 mmap")
+        return v
+
+    @field_validator(
+        "AUDIT_QUEUE_SIZE", "AUDIT_BATCH_SIZE", "AUDIT_FLUSH_INTERVAL_MS", "ACTIVITY_FLUSH_INTERVAL_SECONDS",
+        "COUNTER_RECONCILE_INTERVAL_SECONDS", "REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS",
+        "REFRESH_TOKEN_SWEEP_BATCH_SIZE", "PASSWORD_HASH_WORKERS", "MATCHER_CACHE_SIZE", "PERMISSION_CACHE_SIZE",
+        "CHANGE_FEED_POLL_INTERVAL_MS", "CHANGE_FEED_BATCH_SIZE", "CHANGE_FEED_BUFFER_SIZE",
+        "CHANGE_FEED_KEEPALIVE_SECONDS", "OUTBOX_RETENTION_HOURS",
+        "USER_TOMBSTONE_RETENTION_DAYS", "USER_CHANGES_MAX_LIMIT", "ACCESS_SESSION_CACHE_SIZE",
+        "LOOP_MONITOR_INTERVAL_MS", "LOOP_BLOCK_THRESHOLD_MS", "SETTINGS_RELOAD_POLL_INTERVAL_MS",
+    )
+    def must_be_positive(cls, v, info):
+        if v <= 0:
+            raise ValueError(f"{info.field_name} 必须大于 0")
+        return v
+
+    @field_validator("USER_CHANGES_SAFETY_LAG_MS", "ACCESS_SESSION_CACHE_TTL_MS")
+    def must_not_be_negative(cls, v, info):
+        if v < 0:
+            raise ValueError(f"{info.field_name} 不能小于 0")
+        return v
+
+
+# 只在启动时读取的配置：数据库连接、路由前缀、签名密钥等，修改后需要重启
+RESTART_REQUIRED = {
+    "APP_NAME", "API_PREFIX", "DEBUG", "SECRET_KEY", "ALGORITHM", "JWT_SECRET_KEY", "JWT_ALGORITHM",
+    "DATABASE_URL", "SHARD_DATABASE_URLS", "LOOP_MONITOR_ENABLED",
+    "PERMISSION_CACHE_BACKEND", "PERMISSION_CACHE_SLOT_SIZE", "PERMISSION_CACHE_PATH",
+}
+
+# mmap 缓存后端的槽位数决定共享文件的布局，不能在运行中调整
+MMAP_RESTART_REQUIRED = {"PERMISSION_CACHE_SIZE", "ACCESS_SESSION_CACHE_SIZE"}
+
+def restart_required(current: "Settings") -> Set[str]:
+    """当前配置下修改后需要重启的配置名"""
+    if current.PERMISSION_CACHE_BACKEND == "mmap":
+        return RESTART_REQUIRED | MMAP_RESTART_REQUIRED
+    return RESTART_REQUIRED
+
+class SettingsReloadError(ValueError):
+    """配置重新加载被拒绝，当前配置保持不变"""
+
+
+SettingsListener = Callable[["Settings", "Settings", Set[str]], None]
+
+_current = Settings()
+_listeners: List[SettingsListener] = []
+_reload_lock = threading.Lock()
+
+def current_settings() -> Settings:
+    """当前配置快照；需要多项配置保持一致时先取快照再读取"""
+    return _current
+
+def subscribe(listener: SettingsListener) -> SettingsListener:
+    """注册配置变更回调 listener(旧配置, 新配置, 变更的配置名)"""
+    _listeners.append(listener)
+    return listener
+
+def reload_settings() -> Set[str]:
+    """重新读取环境变量和 .env，校验后原子替换配置并通知订阅者，返回变更的配置名
+
+    校验失败或修改了需要重启的配置时抛出 SettingsReloadError。
+    """
+    global _current
+    with _reload_lock:
+        try:
+            new = Settings()
+        except ValueError as e:
+            raise SettingsReloadError(f"配置校验失败: {e}") from e
+
+        old = _current
+        changed = {name for name in Settings.model_fields if getattr(old, name) != getattr(new, name)}
+        restart = sorted(changed & restart_required(old))
+        if restart:
+            raise SettingsReloadError(f"以下配置需要重启才能生效: {', '.join(restart)}")
+        if not changed:
+            return changed
+
+        _current = new
+        for listener in _listeners:
+            try:
+                listener(old, new, changed)
+            except Exception as e:
+                logger.error(f"应用配置变更失败 {listener}: {e}")
+        logger.info(f"配置已重新加载: {', '.join(sorted(changed))}")
+        return changed
+
+class _SettingsProxy:
+    """始终指向当前配置快照，已导入的 settings 对象在重新加载后读取到新值"""
+
+    def __getattr__(self, name):
+        return getattr(_current, name)
+
+    def __setattr__(self, name, value):
+        setattr(_current, name, value)
+
 # 创建全局设置对象
-settings = Settings()
+settings = _SettingsProxy()
@@ -0,0 +1,319 @@
+"""带版本号的缓存后端
+
+条目以 (键, 版本号) 存取：读取时版本号不一致视为过期，写入时不覆盖版本号更高的条目，
+数据源递增版本号即可让所有进程中的旧条目失效，无需广播删除。
+
+- MemoryCache：进程内 LRU，值按引用保存，调用方不得修改取出的值；
+- MmapCache：基于内存映射文件的定长槽位哈希表，同一主机上的多个 worker 进程共享，
+  读取直接访问共享内存，不经过网络或额外的进程间通信。每个槽位用序号实现无锁读取，
+  写入时加进程内锁和槽位范围的文件锁。值以 JSON 保存，超过槽位容量的值不缓存。
+"""
+import hashlib
+import os
+import stat
+import struct
+import tempfile
+import threading
+import mmap
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+
+from app.config.settings import settings, subscribe
+
+try:
+    import fcntl
+except ImportError:  # Windows 等平台没有 fcntl，只能依赖单进程内的锁
+    fcntl = None
+
+class CacheBackend:
+    """缓存后端接口，统计计数为当前进程内的累计值"""
+
+    name = ""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        # 键存在但版本号不一致
+        self.stale = 0
+        self.sets = 0
+        self.evictions = 0
+
+    def get(self, key: str, version: int) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, version: int, value: Any) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def resize(self, size: int) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "sets": self.sets,
+            "evictions": self.evictions,
+        }
+
+    def metrics(self, prefix: str = "cache") -> Dict[str, int]:
+        return {f"{prefix}_{self.name}_{key}": value for key, value in self.stats().items()}
+
+
+class MemoryCache(CacheBackend):
+    """进程内 LRU 缓存"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int):
+        super().__init__()
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != version:
+                self.stale += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, version: int, value: Any) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > version:
+                return
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            self.sets += 1
+            self._trim()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def resize(self, size: int) -> None:
+        with self._lock:
+            self.max_entries = size
+            self._trim()
+
+    def _trim(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {**super().stats(), "entries": len(self._entries)}
+
+
+class MmapCache(CacheBackend):
+    """多进程共享的内存映射定长槽位缓存
+
+    文件头记录槽位数和槽位大小。文件可能正被其他 worker 映射，截短会使它们访问时收到 SIGBUS，
+    因此只初始化空文件，已有文件的布局与参数不一致时拒绝打开。文件必须属于当前用户且其他用户不可访问。键经哈希直接映射到一个槽位，
+    冲突时新条目覆盖旧条目（计为淘汰）。槽位布局：序号、值长度、版本号、键长度，随后是键和值。
+    序号为奇数表示正在写入，读取前后序号不一致时重读一次，仍不一致按未命中处理。
+    """
+
+    name = "mmap"
+
+    MAGIC = b"PCACHE01"
+    FILE_HEADER = struct.Struct("<8sII")
+    DATA_OFFSET = 64
+    SLOT_HEADER = struct.Struct("<IIqH6x")
+    SEQ = struct.Struct("<I")
+
+    def __init__(self, path: str, slots: int, slot_size: int):
+        super().__init__()
+        if slot_size <= self.SLOT_HEADER.size:
+            raise ValueError(f"槽位大小至少需要 {self.SLOT_HEADER.size + 1} 字节")
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        # 不缓存的超大值
+        self.oversize = 0
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600)
+        try:
+            _check_private(os.fstat(self._fd), path)
+            size = self.DATA_OFFSET + slots * slot_size
+            header = self.FILE_HEADER.pack(self.MAGIC, slots, slot_size)
+            with self._file_lock(0, self.DATA_OFFSET):
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                existing = os.read(self._fd, self.FILE_HEADER.size)
+                current = os.fstat(self._fd).st_size
+                # 新文件，或上次初始化在写入文件头之前中断
+                if current == 0 or (current == size and existing == bytes(self.FILE_HEADER.size)):
+                    os.ftruncate(self._fd, size)
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    os.write(self._fd, header)
+                elif current != size or existing != header:
+                    raise ValueError(f"缓存文件 {path} 的布局与当前参数（{slots} 个槽位，每个 {slot_size} 字节）不一致")
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._map = mmap.mmap(self._fd, size)
+
+    @contextmanager
+    def _file_lock(self, offset: int, length: int):
+        if fcntl is None:
+            yield
+            return
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, length, offset, os.SEEK_SET)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset, os.SEEK_SET)
+
+    def _offset(self, key: bytes) -> int:
+        digest = hashlib.blake2b(key, digest_size=8).digest()
+        return self.DATA_OFFSET + int.from_bytes(digest, "big") % self.slots * self.slot_size
+
+    def _read(self, offset: int) -> Optional[Tuple[int, int, bytes]]:
+        """一致地读取槽位，返回 (版本号, 键长度, 键和值)，空槽位或读取冲突时返回 None"""
+        for _ in range(2):
+            seq = self.SEQ.unpack_from(self._map, offset)[0]
+            if seq & 1:
+                continue
+            _, length, version, key_length = self.SLOT_HEADER.unpack_from(self._map, offset)
+            start = offset + self.SLOT_HEADER.size
+            data = self._map[start:start + length]
+            if self.SEQ.unpack_from(self._map, offset)[0] == seq:
+                return (version, key_length, data) if length else None
+        return None
+
+    def get(self, key: str, version: int) -> Optional[Any]:
+        raw_key = key.encode("utf-8")
+        entry = self._read(self._offset(raw_key))
+        if entry is None or entry[2][:entry[1]] != raw_key:
+            self.misses += 1
+            return None
+        if entry[0] != version:
+            self.stale += 1
+            return None
+        self.hits += 1
+        return orjson.loads(entry[2][entry[1]:])
+
+    def _write(self, offset: int, version: int, key_length: int, data: bytes) -> None:
+        # 调用方持有锁
+        seq = (self.SEQ.unpack_from(self._map, offset)[0] + 1) & 0xFFFFFFFF
+        self.SEQ.pack_into(self._map, offset, seq)
+        start = offset + self.SLOT_HEADER.size
+        self._map[start:start + len(data)] = data
+        self.SLOT_HEADER.pack_into(self._map, offset, seq, len(data), version, key_length)
+        self.SEQ.pack_into(self._map, offset, (seq + 1) & 0xFFFFFFFF)
+
+    def set(self, key: str, version: int, value: Any) -> None:
+        raw_key = key.encode("utf-8")
+        data = raw_key + orjson.dumps(value)
+        if len(data) > self.slot_size - self.SLOT_HEADER.size:
+            self.oversize += 1
+            return
+        offset = self._offset(raw_key)
+        with self._lock, self._file_lock(offset, self.slot_size):
+            existing = self._read(offset)
+            if existing is not None:
+                if existing[2][:existing[1]] != raw_key:
+                    self.evictions += 1
+                elif existing[0] > version:
+                    return
+            self._write(offset, version, len(raw_key), data)
+            self.sets += 1
+
+    def delete(self, key: str) -> None:
+        raw_key = key.encode("utf-8")
+        offset = self._offset(raw_key)
+        with self._lock, self._file_lock(offset, self.slot_size):
+            existing = self._read(offset)
+            if existing is not None and existing[2][:existing[1]] == raw_key:
+                self._write(offset, 0, 0, b"")
+
+    def clear(self) -> None:
+        with self._lock, self._file_lock(self.DATA_OFFSET, self.slots * self.slot_size):
+            for index in range(self.slots):
+                offset = self.DATA_OFFSET + index * self.slot_size
+                if self.SLOT_HEADER.unpack_from(self._map, offset)[1]:
+                    self._write(offset, 0, 0, b"")
+
+    def resize(self, size: int) -> None:
+        # 共享文件的槽位数由所有 worker 共同使用，只能在重启时调整
+        raise ValueError("共享缓存的槽位数需要重启后生效")
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+    def stats(self) -> Dict[str, int]:
+        return {**super().stats(), "oversize": self.oversize}
+
+
+def _check_private(st: os.stat_result, path: str) -> None:
+    """共享文件和目录必须属于当前用户且其他用户不可访问，否则其他用户可以读取或篡改缓存"""
+    if not hasattr(os, "geteuid"):
+        return
+    if st.st_uid != os.geteuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path} 不属于当前用户或允许其他用户访问")
+
+
+def _private_dir() -> str:
+    """临时目录下当前用户专用的子目录"""
+    uid = os.geteuid() if hasattr(os, "geteuid") else 0
+    path = os.path.join(tempfile.gettempdir(), f"fastapi-auth-{uid}")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise PermissionError(f"{path} 不是目录")
+    _check_private(st, path)
+    return path
+
+
+def default_cache_path(name: str = "permissions", slots: int = 0, slot_size: int = 0) -> str:
+    """按数据库地址区分的缓存文件，同一主机上连接同一数据库的 worker 共享
+
+    给出槽位参数时文件名包含布局，调整参数后重启使用新文件，不会与仍映射旧文件的 worker 冲突。
+    """
+    digest = hashlib.blake2b(settings.DATABASE_URL.encode("utf-8"), digest_size=8).hexdigest()
+    layout = f"-{slots}x{slot_size}" if slots else ""
+    return os.path.join(_private_dir(), f"{name}-{digest}{layout}.cache")
+
+
+def create_cache(backend: str, size: int, path: str = "", slot_size: int = 1024) -> CacheBackend:
+    if backend == "mmap":
+        return MmapCache(path or default_cache_path("permissions", size, slot_size), size, slot_size)
+    if backend == "memory":
+        return MemoryCache(size)
+    raise ValueError(f"未知的缓存后端: {backend}")
+
+
+# 用户有效角色与权限规则的缓存，由 app.core.permissions 使用
+permission_cache = create_cache(
+    settings.PERMISSION_CACHE_BACKEND,
+    settings.PERMISSION_CACHE_SIZE,
+    settings.PERMISSION_CACHE_PATH,
+    settings.PERMISSION_CACHE_SLOT_SIZE,
+)
+
+
+@subscribe
+def _apply_settings(old, new, changed) -> None:
+    if "PERMISSION_CACHE_SIZE" in changed:
+        permission_cache.resize(new.PERMISSION_CACHE_SIZE)
@@ -0,0 +1,83 @@
+"""在线程池中执行密码哈希和校验
+
+bcrypt 每次耗时数百毫秒且会释放 GIL，放到专用线程池中执行不会阻塞事件循环；
+排队中的任务数（queue_depth）作为就绪检查的指标。
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config.settings import settings, subscribe
+from app.core.security import get_password_hash, verify_password
+
+
+class PasswordHasher:
+    """固定大小的哈希线程池，记录执行中和排队中的任务数"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = self._new_executor(workers)
+        self._running = True
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """等待空闲线程的任务数"""
+        return max(0, self._in_flight - self.workers)
+
+    @staticmethod
+    def _new_executor(workers: int) -> ThreadPoolExecutor:
+        # 线程按需创建，空闲的线程池不占用线程
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    async def _run(self, fn, *args):
+        # 关闭后仍有调用（如同一进程中再次启动应用）时重新创建线程池
+        self.start()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def resize(self, workers: int) -> None:
+        """换用新大小的线程池；旧线程池执行完已提交的任务后退出"""
+        old = self._executor
+        self._executor = self._new_executor(workers)
+        self.workers = workers
+        self._running = True
+        old.shutdown(wait=False)
+
+    def start(self) -> None:
+        """shutdown 之后重新创建线程池，已在运行时不做任何事"""
+        with self._lock:
+            if not self._running:
+                self._executor = self._new_executor(self.workers)
+                self._running = True
+
+    def shutdown(self) -> None:
+        """等待已提交的任务完成后关闭线程池，之后可用 start 重新启动"""
+        with self._lock:
+            self._running = False
+        self._executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS)
+
+
+@subscribe
+def _apply_settings(old, new, changed) -> None:
+    if "PASSWORD_HASH_WORKERS" in changed:
+        password_hasher.resize(new.PASSWORD_HASH_WORKERS)
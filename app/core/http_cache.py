@@ -0,0 +1,35 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Response, status
+
+def strong_etag(body: bytes) -> str:
+    """根据响应体生成强 ETag"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def weak_etag(*parts: Any) -> str:
+    """根据版本字段（如 updated_at）生成弱 ETag，无需序列化响应体"""
+    digest = hashlib.blake2b("|".join(str(p) for p in parts).encode("utf-8"), digest_size=12)
+    return 'W/"' + digest.hexdigest() + '"'
+
+def user_detail_etag(user: Any) -> str:
+    """UserDetailRead 的 ETag，只依赖用户自身字段
+
+    可以直接从认证阶段已加载的用户对象计算，不访问 roles 关系，也不查询数据库。
+    活动时间的写回不修改 updated_at，因此单独计入。
+    """
+    return weak_etag("user", user.id, user.updated_at, user.roles_version, user.last_login_at, user.last_seen_at)
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """按弱比较规则判断 If-None-Match 请求头是否命中给定的 ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or _opaque(etag) in {_opaque(tag) for tag in candidates}
+
+def not_modified(etag: str, headers: Optional[dict] = None) -> Response:
+    """返回 304 响应"""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**(headers or {}), "ETag": etag})
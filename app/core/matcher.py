@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config.settings import settings, subscribe
+
+class _Node:
+    __slots__ = ("children", "terminal", "tail")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # 规则在此结束
+        self.terminal = False
+        # 规则以 "*" 结尾：匹配剩余的一个或多个段
+        self.tail = False
+
+def _build(patterns: Iterable[str]) -> _Node:
+    root = _Node()
+    for pattern in patterns:
+        node = root
+        segments = pattern.split(":")
+        for segment in segments[:-1]:
+            node = node.children.setdefault(segment, _Node())
+        if segments[-1] == "*":
+            node.tail = True
+        else:
+            node.children.setdefault(segments[-1], _Node()).terminal = True
+    return root
+
+def _match(node: _Node, segments: List[str], index: int) -> bool:
+    if index == len(segments):
+        return node.terminal
+    if node.tail:
+        return True
+    child = node.children.get(segments[index])
+    if child is not None and _match(child, segments, index + 1):
+        return True
+    wildcard = node.children.get("*")
+    return wildcard is not None and _match(wildcard, segments, index + 1)
+
+class PermissionMatcher:
+    """将 resource:action 形式的授权/拒绝规则编译为按段查找的前缀树
+
+    "*" 段匹配任意一个段，位于末尾时匹配剩余的一个或多个段（单独的 "*" 匹配所有权限）。
+    检查耗时与权限的段数成正比，与规则数量无关。
+    """
+
+    def __init__(self, grants: Iterable[str] = (), denies: Iterable[str] = ()):
+        self._grants = _build(grants)
+        self._denies = _build(denies)
+
+    def grants(self, permission: str) -> bool:
+        return _match(self._grants, permission.split(":"), 0)
+
+    def denies(self, permission: str) -> bool:
+        return _match(self._denies, permission.split(":"), 0)
+
+    def allows(self, permission: str) -> bool:
+        """显式拒绝优先于授权"""
+        segments = permission.split(":")
+        return not _match(self._denies, segments, 0) and _match(self._grants, segments, 0)
+
+# 按主体缓存编译结果：键为主体缓存键，值为 (角色版本号, 匹配器)，版本号变化后重新编译并覆盖
+_compiled: "OrderedDict[str, Tuple[int, PermissionMatcher]]" = OrderedDict()
+
+def get_compiled(key: str, version: int) -> Optional[PermissionMatcher]:
+    """获取主体当前角色版本的编译结果，版本不一致时视为未命中"""
+    entry = _compiled.get(key)
+    if entry is None or entry[0] != version:
+        return None
+    _compiled.move_to_end(key)
+    return entry[1]
+
+def set_compiled(key: str, version: int, matcher: PermissionMatcher) -> None:
+    _compiled[key] = (version, matcher)
+    _compiled.move_to_end(key)
+    _trim(settings.MATCHER_CACHE_SIZE)
+
+def _trim(size: int) -> None:
+    while len(_compiled) > size:
+        _compiled.popitem(last=False)
+
+def clear_compiled() -> None:
+    _compiled.clear()
+
+@subscribe
+def _apply_settings(old, new, changed) -> None:
+    if "MATCHER_CACHE_SIZE" in changed:
+        _trim(new.MATCHER_CACHE_SIZE)
@@ -4,22 +4,31 @@ from jose import jwt, JWTError
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Set
 
 from app.config.settings import settings
 from app.database import get_session
 from app.models.user import User, Role
 from app.schemas.auth import TokenPayload
+from app.core.cache import permission_cache
+from app.core.matcher import PermissionMatcher, get_compiled, set_compiled
+from app.core.reference_tokens import is_reference_token, resolve_reference_token
+from app.crud.user import get_user
+from app.activity import activity_tracker
 
 # OAuth2 密码流依赖
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_PREFIX}/auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_session)):
-    """获取当前用户"""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无效的身份验证凭据",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_access_token(token: str) -> TokenPayload:
+    """解码并校验访问令牌，失败时抛出 401"""
+    credentials_exception = _credentials_exception()
     try:
         # 解码JWT令牌
         payload = jwt.decode(
@@ -44,19 +53,37 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             )
 
         # 获取用户ID
-        user_id = token_data.sub
-        if user_id is None:
+        if token_data.sub is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    # 从数据库中获取用户信息
-    stmt = select(User).where(User.id == int(user_id))
-    result = db.execute(stmt)
-    user = result.scalar_one_or_none()
+    return token_data
+
+def resolve_access_token(db: Session, token: str) -> TokenPayload:
+    """校验访问令牌，同时接受 JWT 和引用型令牌，失败时抛出 401"""
+    if not is_reference_token(token):
+        return decode_access_token(token)
+    token_data = resolve_reference_token(db, token)
+    if token_data is None:
+        raise _credentials_exception()
+    return token_data
+
+def load_token_user(db: Session, token_data: TokenPayload) -> User:
+    """根据已校验的令牌加载用户，用户不存在或未激活时抛出异常"""
+    # 从数据库中获取用户信息（启用分片时直接路由到所在分片）
+    user = get_user(db, int(token_data.sub))
 
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+
+    # 签发后用户被删除、ID 又被新用户复用
+    created = user.created_at
+    if token_data.iat is not None and created is not None:
+        if created.tzinfo is None:
+            created = created.replace(tzinfo=timezone.utc)
+        if created.timestamp() > token_data.iat:
+            raise _credentials_exception()
 
     if not user.is_active:
         raise HTTPException(
@@ -65,6 +92,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
 
     return user
 
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_session)):
+    """获取当前用户，访问令牌可以是 JWT 或引用型令牌"""
+    token_data = resolve_access_token(db, token)
+    user = load_token_user(db, token_data)
+    activity_tracker.seen(user.id)
+    return user
+
 async def get_current_active_superuser(current_user: User = Depends(get_current_user)):
     """获取当前超级管理员用户"""
     if not current_user.is_superuser:
@@ -74,6 +108,81 @@ async def get_current_active_superuser(current_user: User = Depends(get_current_
         )
     return current_user
 
+def _principal_key(user: User) -> str:
+    # 包含创建时间：删除用户后 ID 可能被复用，新用户的角色版本号又从 0 开始
+    created = user.created_at.timestamp() if user.created_at else 0
+    return f"principal:{user.id}:{created}"
+
+def get_principal(user: User) -> Dict[str, Any]:
+    """用户有效角色名称及合并后的授权/拒绝规则
+
+    按用户的角色版本号缓存，角色分配、角色内容或继承关系变化时版本号递增，旧条目自然失效；
+    命中时不再查询有效角色。
+    """
+    key = _principal_key(user)
+    principal = permission_cache.get(key, user.roles_version)
+    if principal is not None:
+        return principal
+
+    roles = {role.id: role for role in user.effective_roles}.values()
+    grants, denies = set(), set()
+    for role in roles:
+        rules = role.permissions or {}
+        grants.update(rules.get("permissions", []))
+        denies.update(rules.get("deny", []))
+    principal = {
+        "roles": sorted(role.name for role in roles),
+        "permissions": sorted(grants),
+        "deny": sorted(denies),
+    }
+    permission_cache.set(key, user.roles_version, principal)
+    return principal
+
+def get_user_permissions(user: User) -> Set[str]:
+    """用户有效角色（含继承的祖先角色）中的授权规则，去掉被拒绝规则完全覆盖的部分
+
+    通配符授权只被部分拒绝时（如 user:* 与 user:delete）仍保留，需结合 get_user_denies 判断。
+    """
+    checker = get_permission_checker(user)
+    return {p for p in get_principal(user)["permissions"] if not checker.denies(p)}
+
+def get_user_denies(user: User) -> Set[str]:
+    """用户有效角色中的拒绝规则，优先于授权"""
+    return set(get_principal(user)["deny"])
+
+def get_permission_checker(user: User) -> PermissionMatcher:
+    """用户有效角色合并后的已编译规则：任一角色拒绝即拒绝，否则任一角色授权即允许
+
+    与主体使用同一个键和角色版本号缓存，命中时不再读取主体或重建规则。
+    """
+    key = _principal_key(user)
+    checker = get_compiled(key, user.roles_version)
+    if checker is None:
+        principal = get_principal(user)
+        checker = PermissionMatcher(principal["permissions"], principal["deny"])
+        set_compiled(key, user.roles_version, checker)
+    return checker
+
+def get_user_role_names(user: User) -> Set[str]:
+    """获取用户拥有的角色名称，包含继承得到的祖先角色"""
+    return set(get_principal(user)["roles"])
+
+def authorize_user(user: User, permissions: Iterable[str] = (), roles: Iterable[str] = ()) -> Dict[str, Dict[str, bool]]:
+    """批量判断用户的权限与角色，权限集合只解析一次"""
+    if user.is_superuser:
+        # 超级管理员拥有所有权限
+        return {
+            "permissions": {p: True for p in permissions},
+            "roles": {r: True for r in roles},
+        }
+
+    checker = get_permission_checker(user)
+    user_roles = get_user_role_names(user)
+    return {
+        "permissions": {p: checker.allows(p) for p in permissions},
+        "roles": {r: r in user_roles for r in roles},
+    }
+
 def has_role(role_name: str):
     """检查用户是否拥有特定角色"""
     async def _has_role(current_user: User = Depends(get_current_user), db: Session = Depends(get_session)):
@@ -93,8 +202,7 @@ def has_role(role_name: str):
             )
 
         # 检查用户是否拥有该角色
-        user_roles = [r.name for r in current_user.roles]
-        if role_name not in user_roles:
+        if role_name not in get_user_role_names(current_user):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="没有足够的权限执行此操作"
@@ -111,11 +219,9 @@ def has_permission(permission: str):
         if current_user.is_superuser:
             return current_user
 
-        # 检查用户角色中的权限
-        for role in current_user.roles:
-            role_permissions = role.permissions.get("permissions", [])
-            if permission in role_permissions:
-                return current_user
+        # 检查用户角色中的权限（支持通配符，显式拒绝优先）
+        if get_permission_checker(current_user).allows(permission):
+            return current_user
 
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -131,5 +237,8 @@ def check_user_management_permission(current_user: User = Depends(has_permission
 def check_role_management_permission(current_user: User = Depends(has_permission("role:manage"))):
     return current_user
 
+def check_token_introspection_permission(current_user: User = Depends(has_permission("token:introspect"))):
+    return current_user
+
 def check_self_profile_permission(current_user: User = Depends(get_current_user)):
     return current_user
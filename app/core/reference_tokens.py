@@ -0,0 +1,109 @@
+"""引用型访问令牌
+
+令牌是随机句柄（约 40 字节，JWT 约 200 字节），服务端只保存其摘要。解析时先查会话缓存，
+未命中再按主键查询会话表，O(1) 且无需验签；撤销时删除会话记录和缓存条目，立即生效。
+未命中回填缓存后会再核对一次会话表，避免与之并发的撤销被回填覆盖。
+
+会话缓存与权限缓存使用同一种后端（PERMISSION_CACHE_BACKEND）：mmap 后端由同一主机上的
+worker 共享，撤销对所有 worker 立即生效；memory 后端是每个进程各自的缓存，撤销只能清除
+当前进程中的条目，因此缓存条目超过 ACCESS_SESSION_CACHE_TTL_MS 后重新核对会话表，
+其他 worker 上的撤销最迟在此时间后生效（设为 0 时每次都核对，立即生效）。
+"""
+import time
+
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings, subscribe
+from app.core.cache import MmapCache, create_cache, default_cache_path
+from app.crud.token import create_access_session, delete_access_session, get_access_session, hash_jti
+from app.schemas.auth import TokenPayload
+
+# JWT 总是包含 "."，句柄不含，据此区分两种格式
+REFERENCE_TOKEN_PREFIX = "sess_"
+
+# 缓存值只有用户 ID 和三个时间戳
+SESSION_CACHE_SLOT_SIZE = 128
+
+# 缓存条目不会在原处更新，版本号固定
+_VERSION = 0
+
+session_cache = create_cache(
+    settings.PERMISSION_CACHE_BACKEND,
+    settings.ACCESS_SESSION_CACHE_SIZE,
+    default_cache_path("sessions", settings.ACCESS_SESSION_CACHE_SIZE, SESSION_CACHE_SLOT_SIZE),
+    SESSION_CACHE_SLOT_SIZE,
+)
+
+def is_reference_token(token: str) -> bool:
+    return token.startswith(REFERENCE_TOKEN_PREFIX)
+
+def _cache_key(token_hash: bytes) -> str:
+    return f"session:{token_hash.hex()}"
+
+def _timestamp(value: datetime) -> float:
+    # SQLite 读出的时间不带时区，按 UTC 处理
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def _needs_recheck(checked_at: float) -> bool:
+    # 共享缓存的撤销对所有 worker 立即可见，无需重新核对
+    if isinstance(session_cache, MmapCache):
+        return False
+    return (time.time() - checked_at) * 1000 >= settings.ACCESS_SESSION_CACHE_TTL_MS
+
+def create_reference_token(db: Session, user_id: int, expires_delta: Optional[timedelta] = None) -> str:
+    """签发引用型访问令牌并登记会话"""
+    if expires_delta is None:
+        expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    token = REFERENCE_TOKEN_PREFIX + secrets.token_urlsafe(24)
+    now = datetime.now(timezone.utc)
+    create_access_session(db, token, user_id, now + expires_delta)
+    # 直接写入缓存，签发后的首次请求不再查询会话表
+    session_cache.set(_cache_key(hash_jti(token)), _VERSION,
+                      [user_id, (now + expires_delta).timestamp(), now.timestamp(), time.time()])
+    return token
+
+def resolve_reference_token(db: Session, token: str) -> Optional[TokenPayload]:
+    """解析引用型访问令牌，令牌不存在、已撤销或已过期时返回 None"""
+    token_hash = hash_jti(token)
+    key = _cache_key(token_hash)
+    entry = session_cache.get(key, _VERSION)
+    if entry is None or _needs_recheck(entry[3]):
+        record = get_access_session(db, token_hash)
+        if record is None:
+            session_cache.delete(key)
+            return None
+        entry = [record.user_id, _timestamp(record.expires_at), _timestamp(record.created_at), time.time()]
+        session_cache.set(key, _VERSION, entry)
+        # 并发撤销可能落在读取会话与写入缓存之间，其清除缓存先于这里的写入；
+        # 写入后再核对一次，已被删除时撤回缓存条目（撤销晚于此次核对时由撤销自己清除缓存）
+        if get_access_session(db, token_hash) is None:
+            session_cache.delete(key)
+            return None
+    user_id, expires_at, created_at, _ = entry
+    if expires_at <= datetime.now(timezone.utc).timestamp():
+        session_cache.delete(key)
+        return None
+    return TokenPayload(sub=str(user_id), exp=int(expires_at), type="access", iat=created_at)
+
+def revoke_reference_token(db: Session, token: str) -> bool:
+    """撤销引用型访问令牌，令牌不存在时返回 False"""
+    token_hash = hash_jti(token)
+    revoked = delete_access_session(db, token_hash)
+    # 先删除记录再清除缓存，之后的未命中不会再读到该会话
+    session_cache.delete(_cache_key(token_hash))
+    return revoked
+
+def metrics() -> Dict[str, int]:
+    return session_cache.metrics("session_cache")
+
+
+@subscribe
+def _apply_settings(old, new, changed) -> None:
+    if "ACCESS_SESSION_CACHE_SIZE" in changed:
+        session_cache.resize(new.ACCESS_SESSION_CACHE_SIZE)
@@ -0,0 +1,15 @@
+from typing import Any
+
+import orjson
+from fastapi import Response
+
+class ORJSONResponse(Response):
+    """直接用 orjson 将行数据序列化为字节的 JSON 响应
+
+    列表接口从 CRUD 层拿到列投影后的字典行，跳过 ORM 实体构建和
+    response_model 的逐行校验，字段须与对应的响应模式保持一致。
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
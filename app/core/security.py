@@ -20,14 +20,17 @@ def create_access_token(subject: Union[str, Any], expires_delta: Optional[timede
     )
     return encoded_jwt
 
-def create_refresh_token(subject: Union[str, Any], expires_delta: Optional[timedelta] = None) -> str:
-    """创建JWT刷新令牌"""
+def create_refresh_token(subject: Union[str, Any], expires_delta: Optional[timedelta] = None,
+                         jti: Optional[str] = None) -> str:
+    """创建JWT刷新令牌，jti 用于在服务端登记和轮换"""
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
 
     to_encode = {"exp": expire, "sub": str(subject), "type": "refresh"}
+    if jti is not None:
+        to_encode["jti"] = jti
     encoded_jwt = jwt.encode(
         to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
     )
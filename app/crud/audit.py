@@ -0,0 +1,20 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from typing import List, Optional
+
+from app.models.audit import AuditEvent
+
+# 审计事件只读查询；写入由 app.audit 的后台线程批量完成
+def get_audit_events(db: Session, skip: int = 0, limit: int = 100,
+                     event: Optional[str] = None, actor_id: Optional[int] = None,
+                     subject_id: Optional[int] = None) -> List[AuditEvent]:
+    """按时间倒序分页查询审计事件"""
+    stmt = select(AuditEvent)
+    if event is not None:
+        stmt = stmt.where(AuditEvent.event == event)
+    if actor_id is not None:
+        stmt = stmt.where(AuditEvent.actor_id == actor_id)
+    if subject_id is not None:
+        stmt = stmt.where(AuditEvent.subject_id == subject_id)
+    stmt = stmt.order_by(AuditEvent.id.desc()).offset(skip).limit(limit)
+    return db.execute(stmt).scalars().all()
@@ -0,0 +1,118 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, event, func, insert, select, text
+from typing import Any, Callable, Dict, List, Tuple
+from datetime import datetime, timezone
+
+from app.models.outbox import OutboxEvent
+from app import sharding
+
+outbox_events = OutboxEvent.__table__
+
+# 事件提交后的回调（同一进程内的变更事件流据此立即读取，无需等待下一次轮询）
+_commit_listeners: List[Callable[[], None]] = []
+
+def on_outbox_commit(listener: Callable[[], None]) -> None:
+    if listener not in _commit_listeners:
+        _commit_listeners.append(listener)
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session: Session) -> None:
+    if session.info.pop("outbox_pending", False):
+        for listener in _commit_listeners:
+            listener()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop("outbox_pending", None)
+
+def emit_change(session: Session, topic: str, entity_id: int, data: Dict[str, Any]) -> None:
+    """在当前事务中写入变更事件（不提交），session 须是被变更数据所在的会话"""
+    session.execute(insert(outbox_events).values(
+        topic=topic, entity_id=entity_id, data=data, created_at=datetime.now(timezone.utc),
+    ))
+    session.info["outbox_pending"] = True
+
+# 事件序号游标：每个库一个序号，启用分片时依次为主库和各分片，以 "." 连接
+def outbox_sessions(db: Session) -> List[Session]:
+    """保存变更事件的全部会话：主库，启用分片时加上各分片"""
+    if not sharding.enabled():
+        return [db]
+    return [db] + sharding.user_sessions(db)
+
+def cursor_size() -> int:
+    return 1 + len(sharding.get_router().engines) if sharding.enabled() else 1
+
+def format_cursor(cursor: List[int]) -> str:
+    return ".".join(str(seq) for seq in cursor)
+
+def parse_cursor(value: str, size: int) -> List[int]:
+    """解析游标，格式不正确或与当前库数量不一致时抛出 ValueError"""
+    try:
+        cursor = [int(part) for part in value.split(".")]
+    except ValueError:
+        raise ValueError("游标格式不正确")
+    if len(cursor) != size or any(seq < 0 for seq in cursor):
+        raise ValueError("游标格式不正确")
+    return cursor
+
+def _last_issued_id(session: Session) -> int:
+    """已分配过的最大事件序号，事件全部被清理后仍然有效
+
+    序号不复用：SQLite 记录在 sqlite_sequence，PostgreSQL 记录在自增序列中；
+    其他数据库退化为当前最大序号。
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        stmt = text("SELECT seq FROM sqlite_sequence WHERE name = :name").bindparams(name=outbox_events.name)
+    elif dialect == "postgresql":
+        stmt = text(f"SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {outbox_events.name}_id_seq")
+    else:
+        stmt = select(func.max(outbox_events.c.id))
+    return session.execute(stmt).scalar() or 0
+
+def latest_cursor(db: Session) -> List[int]:
+    """各库当前最大的事件序号"""
+    return [_last_issued_id(session) for session in outbox_sessions(db)]
+
+def oldest_cursor(db: Session) -> List[int]:
+    """各库保留的最小事件序号；没有事件的库为下一个将分配的序号"""
+    oldest = []
+    for session in outbox_sessions(db):
+        first = session.execute(select(func.min(outbox_events.c.id))).scalar()
+        oldest.append(first if first is not None else _last_issued_id(session) + 1)
+    return oldest
+
+def cursor_expired(cursor: List[int], oldest: List[int]) -> bool:
+    """游标之后的事件是否已有被清理的：序号不复用，游标与最小保留序号之间有空缺即说明有事件被删除"""
+    return any(seq + 1 < first for seq, first in zip(cursor, oldest))
+
+def get_outbox_events(db: Session, cursor: List[int], limit: int = 500) -> List[Tuple[int, Dict[str, Any]]]:
+    """读取游标之后的事件，返回 (库序号, 事件)，每个库按序号升序、至多 limit 条"""
+    events = []
+    for index, session in enumerate(outbox_sessions(db)):
+        stmt = (
+            select(outbox_events)
+            .where(outbox_events.c.id > cursor[index])
+            .order_by(outbox_events.c.id)
+            .limit(limit)
+        )
+        events.extend((index, dict(row)) for row in session.execute(stmt).mappings())
+    return events
+
+def prune_outbox(db: Session, before: datetime, batch_size: int = 1000) -> int:
+    """分批删除早于 before 的事件并提交，返回删除数"""
+    total = 0
+    for session in outbox_sessions(db):
+        while True:
+            batch = (
+                select(outbox_events.c.id)
+                .where(outbox_events.c.created_at < before)
+                .order_by(outbox_events.c.id)
+                .limit(batch_size)
+            )
+            deleted = session.execute(delete(outbox_events).where(outbox_events.c.id.in_(batch))).rowcount
+            session.commit()
+            total += deleted
+            if deleted < batch_size:
+                break
+    return total
@@ -0,0 +1,114 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, delete
+from typing import Optional
+from datetime import datetime, timezone
+import hashlib
+import secrets
+
+from app.models.token import AccessSession, RefreshToken
+
+# 刷新令牌相关CRUD操作
+def hash_jti(jti: str) -> bytes:
+    """jti 的定长摘要，作为存储主键"""
+    return hashlib.blake2b(jti.encode("utf-8"), digest_size=16).digest()
+
+def new_family_id() -> bytes:
+    return secrets.token_bytes(16)
+
+def create_refresh_token_record(db: Session, jti: str, user_id: int, expires_at: datetime,
+                                family_id: Optional[bytes] = None) -> RefreshToken:
+    """登记新签发的刷新令牌，未指定 family 时开始新的 family"""
+    record = RefreshToken(
+        jti_hash=hash_jti(jti),
+        family_id=family_id or new_family_id(),
+        user_id=user_id,
+        expires_at=expires_at,
+    )
+    db.add(record)
+    db.commit()
+    return record
+
+def rotate_refresh_token(db: Session, jti: str, new_jti: str, expires_at: datetime) -> Optional[RefreshToken]:
+    """使用刷新令牌并登记同一 family 的新令牌
+
+    令牌未登记或已过期时返回 None；令牌已被使用过（重放）时撤销整个 family 并抛出 ValueError。
+    """
+    now = datetime.now(timezone.utc)
+    key = hash_jti(jti)
+    # 条件更新保证同一令牌并发使用时只有一个请求成功
+    result = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.jti_hash == key, RefreshToken.used_at.is_(None), RefreshToken.expires_at > now)
+        .values(used_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    current = db.execute(select(RefreshToken.user_id, RefreshToken.family_id, RefreshToken.used_at)
+                         .where(RefreshToken.jti_hash == key)).first()
+    if result.rowcount == 1:
+        return create_refresh_token_record(db, new_jti, current.user_id, expires_at, current.family_id)
+
+    if current is not None and current.used_at is not None:
+        revoke_refresh_token_family(db, current.family_id)
+        raise ValueError("刷新令牌已被使用")
+    db.rollback()
+    return None
+
+def revoke_refresh_token_family(db: Session, family_id: bytes) -> int:
+    """删除同一 family 的全部刷新令牌，返回删除数"""
+    result = db.execute(delete(RefreshToken).where(RefreshToken.family_id == family_id))
+    db.commit()
+    return result.rowcount
+
+def revoke_refresh_token(db: Session, jti: str) -> Optional[int]:
+    """撤销刷新令牌所在的整个 family，返回令牌所属用户 ID，令牌未登记时返回 None"""
+    record = db.execute(select(RefreshToken.user_id, RefreshToken.family_id)
+                        .where(RefreshToken.jti_hash == hash_jti(jti))).first()
+    if record is None:
+        return None
+    revoke_refresh_token_family(db, record.family_id)
+    return record.user_id
+
+def sweep_expired_refresh_tokens(db: Session, batch_size: int = 1000) -> int:
+    """删除至多 batch_size 条已过期的刷新令牌并提交，返回删除数
+
+    每批单独提交，写锁只持有一批的时间。
+    """
+    now = datetime.now(timezone.utc)
+    expired = select(RefreshToken.jti_hash).where(RefreshToken.expires_at <= now).limit(batch_size)
+    result = db.execute(delete(RefreshToken).where(RefreshToken.jti_hash.in_(expired)))
+    db.commit()
+    return result.rowcount
+
+# 引用型访问令牌的会话，令牌摘要方式与 jti 相同
+def create_access_session(db: Session, token: str, user_id: int, expires_at: datetime) -> AccessSession:
+    """登记新签发的引用型访问令牌"""
+    record = AccessSession(
+        token_hash=hash_jti(token),
+        user_id=user_id,
+        expires_at=expires_at,
+        created_at=datetime.now(timezone.utc),
+    )
+    db.add(record)
+    db.commit()
+    return record
+
+def get_access_session(db: Session, token_hash: bytes) -> Optional[AccessSession]:
+    """获取未过期的会话，不存在或已过期时返回 None"""
+    return db.execute(
+        select(AccessSession)
+        .where(AccessSession.token_hash == token_hash, AccessSession.expires_at > datetime.now(timezone.utc))
+    ).scalars().first()
+
+def delete_access_session(db: Session, token_hash: bytes) -> bool:
+    """删除会话（撤销令牌），不存在时返回 False"""
+    result = db.execute(delete(AccessSession).where(AccessSession.token_hash == token_hash))
+    db.commit()
+    return result.rowcount > 0
+
+def sweep_expired_access_sessions(db: Session, batch_size: int = 1000) -> int:
+    """删除至多 batch_size 条已过期的会话并提交，返回删除数"""
+    now = datetime.now(timezone.utc)
+    expired = select(AccessSession.token_hash).where(AccessSession.expires_at <= now).limit(batch_size)
+    result = db.execute(delete(AccessSession).where(AccessSession.token_hash.in_(expired)))
+    db.commit()
+    return result.rowcount
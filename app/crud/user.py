@@ -1,65 +1,371 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import select
-from typing import List, Optional, Dict, Any, Union
-
-from app.models.user import User, Role, UserRoleLink
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import select, update, delete, insert, func, or_, inspect, table, column, literal, literal_column, cast, tuple_, Integer, String
+from typing import List, Optional, Dict, Any, Iterable, Union, Tuple
+from datetime import datetime, timezone
+import base64
+import heapq
+import itertools
+
+from app.models.user import User, Role, UserTombstone
+from app.models.base import user_role_link, role_hierarchy, role_closure, counters
 from app.schemas.user import UserCreate, UserUpdate
 from app.core.security import get_password_hash, verify_password
+from app.crud.outbox import emit_change
+from app import sharding
+
+# 用户名/邮箱的三元组全文索引（外部内容表，由触发器与 users 同步，见迁移 7）
+users_fts = table("users_fts", column("rowid", Integer))
+
+# 三元组索引要求查询串至少 3 个字符，更短的查询退化为按 ID 顺序扫描
+SEARCH_MIN_INDEXED_LENGTH = 3
+
+# 列表接口使用的列投影，字段与 UserRead / RoleRead 一致
+USER_READ_COLUMNS = (User.id, User.username, User.email, User.is_active,
+                     User.is_superuser, User.created_at, User.updated_at)
+ROLE_READ_COLUMNS = (Role.id, Role.name, Role.description, Role.permissions,
+                     Role.created_at, Role.updated_at)
+
+def _change_data(obj, columns) -> Dict[str, Any]:
+    """变更事件中的实体快照，字段与读取接口一致"""
+    data = {}
+    for column in columns:
+        value = obj[column.key] if isinstance(obj, dict) else getattr(obj, column.key)
+        data[column.key] = value.isoformat() if isinstance(value, datetime) else value
+    return data
 
 # 用户相关CRUD操作
+# 启用分片时，用户数据按 ID 路由到所在分片，列表在各分片查询后归并
 def get_user(db: Session, user_id: int) -> Optional[User]:
     """根据ID获取用户"""
-    result = db.execute(select(User).where(User.id == user_id))
+    session = sharding.session_for_user(db, user_id)
+    result = session.execute(select(User).where(User.id == user_id))
     return result.scalars().first()
 
+def get_user_version(db: Session, user_id: int) -> Optional[Tuple[datetime, int, Optional[datetime], Optional[datetime]]]:
+    """获取用户的 (updated_at, roles_version, last_login_at, last_seen_at)，用于计算 ETag 而不加载实体"""
+    session = sharding.session_for_user(db, user_id)
+    result = session.execute(
+        select(User.updated_at, User.roles_version, User.last_login_at, User.last_seen_at).where(User.id == user_id)
+    )
+    return result.first()
+
+def get_users_by_ids(db: Session, user_ids: Iterable[int], with_roles: bool = False) -> Dict[int, User]:
+    """按 ID 批量获取用户，每个库一次 IN 查询；with_roles 时用一次 selectin 查询加载角色
+
+    返回 ID 到用户的映射，不存在的 ID 不出现在结果中。
+    """
+    users: Dict[int, User] = {}
+    for session, ids in sharding.sessions_for_users(db, dict.fromkeys(user_ids)):
+        stmt = select(User).where(User.id.in_(ids))
+        if with_roles:
+            stmt = stmt.options(selectinload(User.roles))
+        users.update((user.id, user) for user in session.execute(stmt).scalars())
+    return users
+
+def get_user_rows_by_ids(db: Session, user_ids: Iterable[int], with_roles: bool = False) -> Dict[int, Dict[str, Any]]:
+    """get_users_by_ids 的列投影版本，不构建 ORM 实体；with_roles 时每行附带 roles 列表"""
+    rows: Dict[int, Dict[str, Any]] = {}
+    for session, ids in sharding.sessions_for_users(db, dict.fromkeys(user_ids)):
+        found = {row["id"]: dict(row) for row in session.execute(
+            select(*USER_READ_COLUMNS).where(User.id.in_(ids))
+        ).mappings()}
+        if with_roles and found:
+            for row in found.values():
+                row["roles"] = []
+            role_rows = session.execute(
+                select(user_role_link.c.user_id, *ROLE_READ_COLUMNS)
+                .join(Role, Role.id == user_role_link.c.role_id)
+                .where(user_role_link.c.user_id.in_(list(found)))
+                .order_by(user_role_link.c.user_id, Role.id)
+            ).mappings()
+            for role in role_rows:
+                role = dict(role)
+                found[role.pop("user_id")]["roles"].append(role)
+        rows.update(found)
+    return rows
+
+class UserLoader:
+    """请求内的用户批量加载器
+
+    内部调用方先用 ``prime`` 登记将要用到的用户 ID，首次 ``get``/``get_many`` 时
+    把所有未加载的 ID 合并为一次批量查询；同一请求内重复读取同一用户不再查询。
+    通过 ``get_user_loader`` 获取，与数据库会话同生命周期。
+    """
+
+    def __init__(self, db: Session, with_roles: bool = False):
+        self.db = db
+        self.with_roles = with_roles
+        self._loaded: Dict[int, Optional[User]] = {}
+        self._pending: Dict[int, None] = {}
+
+    def prime(self, user_ids: Iterable[int]) -> "UserLoader":
+        for user_id in user_ids:
+            if user_id not in self._loaded:
+                self._pending[user_id] = None
+        return self
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        ids = list(self._pending)
+        self._pending.clear()
+        found = get_users_by_ids(self.db, ids, with_roles=self.with_roles)
+        for user_id in ids:
+            self._loaded[user_id] = found.get(user_id)
+
+    def get(self, user_id: int) -> Optional[User]:
+        return self.get_many([user_id])[0]
+
+    def get_many(self, user_ids: Iterable[int]) -> List[Optional[User]]:
+        """按传入顺序返回用户，不存在的位置为 None"""
+        user_ids = list(user_ids)
+        self.prime(user_ids)
+        self._flush()
+        return [self._loaded[user_id] for user_id in user_ids]
+
+def get_user_loader(db: Session, with_roles: bool = False) -> UserLoader:
+    """获取会话上的用户加载器，同一请求内共享"""
+    loaders: Dict[bool, UserLoader] = db.info.setdefault("user_loaders", {})
+    if with_roles not in loaders:
+        loaders[with_roles] = UserLoader(db, with_roles=with_roles)
+    return loaders[with_roles]
+
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     """根据邮箱获取用户"""
+    if sharding.enabled():
+        user_id = sharding.lookup_user_id(db, email=email)
+        return get_user(db, user_id) if user_id is not None else None
     result = db.execute(select(User).where(User.email == email))
     return result.scalars().first()
 
 def get_user_by_username(db: Session, username: str) -> Optional[User]:
     """根据用户名获取用户"""
+    if sharding.enabled():
+        user_id = sharding.lookup_user_id(db, username=username)
+        return get_user(db, user_id) if user_id is not None else None
     result = db.execute(select(User).where(User.username == username))
     return result.scalars().first()
 
 def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
     """获取用户列表"""
-    result = db.execute(select(User).offset(skip).limit(limit))
+    stmt = select(User).order_by(User.created_at, User.id)
+    if sharding.enabled():
+        return sharding.gather(
+            db, lambda session: session.execute(stmt.limit(skip + limit)).scalars().all(),
+            key=lambda u: (u.created_at, u.id), skip=skip, limit=limit,
+        )
+    result = db.execute(stmt.offset(skip).limit(limit))
     return result.scalars().all()
 
-def create_user(db: Session, user_create: UserCreate) -> User:
+def get_user_rows(db: Session, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+    """获取用户列表的列投影，不构建 ORM 实体"""
+    stmt = select(*USER_READ_COLUMNS).order_by(User.created_at, User.id)
+    if sharding.enabled():
+        return sharding.gather(
+            db, lambda session: [dict(row) for row in session.execute(stmt.limit(skip + limit)).mappings()],
+            key=lambda row: (row["created_at"], row["id"]), skip=skip, limit=limit,
+        )
+    return [dict(row) for row in db.execute(stmt.offset(skip).limit(limit)).mappings()]
+
+def _has_search_index(session: Session) -> bool:
+    """当前数据库是否已建立 users_fts，结果缓存在连接上"""
+    info = session.connection().info
+    if "users_fts" not in info:
+        info["users_fts"] = inspect(session.connection()).has_table("users_fts")
+    return info["users_fts"]
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_user_rows(db: Session, q: str, prefix: bool = False, is_active: Optional[bool] = None,
+                     is_superuser: Optional[bool] = None, role_id: Optional[int] = None,
+                     cursor: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """按用户名或邮箱的前缀/子串搜索用户，按 ID 升序返回 ID 大于 cursor 的至多 limit 条
+
+    查询串不少于 3 个字符且存在 users_fts 时，由三元组索引按 rowid 顺序给出候选，
+    再用 LIKE 精确过滤（三元组匹配是子串匹配，前缀需要额外判断）；
+    role_id 按角色继承计算，包括拥有其子角色的用户。
+    """
+    pattern = _like_escape(q) + "%"
+    if not prefix:
+        pattern = "%" + pattern
+    conditions = [or_(User.username.like(pattern, escape="\\"), User.email.like(pattern, escape="\\"))]
+    if is_active is not None:
+        conditions.append(User.is_active == is_active)
+    if is_superuser is not None:
+        conditions.append(User.is_superuser == is_superuser)
+    if role_id is not None:
+        conditions.append(User.id.in_(inheriting_user_ids(role_id)))
+
+    def fetch(session: Session) -> List[Dict[str, Any]]:
+        stmt = select(*USER_READ_COLUMNS)
+        if len(q) >= SEARCH_MIN_INDEXED_LENGTH and _has_search_index(session):
+            # FTS5 短语查询：双引号内的双引号需要写两次
+            phrase = '"' + q.replace('"', '""') + '"'
+            key = users_fts.c.rowid
+            stmt = stmt.join(users_fts, key == User.id).where(literal_column("users_fts").op("MATCH")(phrase))
+        else:
+            key = User.id
+        if cursor is not None:
+            stmt = stmt.where(key > cursor)
+        stmt = stmt.where(*conditions).order_by(key).limit(limit)
+        return [dict(row) for row in session.execute(stmt).mappings()]
+
+    if sharding.enabled():
+        return sharding.gather(db, fetch, key=lambda row: row["id"], limit=limit)
+    return fetch(db)
+
+def create_user(db: Session, user_create: UserCreate, is_superuser: bool = False) -> User:
     """创建新用户"""
     # 创建用户对象
     db_user = User(
         username=user_create.username,
         email=user_create.email,
         hashed_password=get_password_hash(user_create.password),
-        is_active=user_create.is_active
+        is_active=user_create.is_active,
+        is_superuser=is_superuser
     )
 
-    # 添加到数据库
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    if not sharding.enabled():
+        # 添加到数据库
+        db.add(db_user)
+        db.flush()
+        emit_change(db, "user.created", db_user.id, _change_data(db_user, USER_READ_COLUMNS))
+        _count_new_user(db, db_user.is_active)
+        db.commit()
+        db.refresh(db_user)
+        return db_user
+
+    # 先在全局目录中分配 ID（同时保证用户名和邮箱全局唯一），再写入所在分片
+    db_user.id = sharding.allocate_user_id(db, user_create.username, user_create.email)
+    session = sharding.session_for_user(db, db_user.id)
+    try:
+        session.add(db_user)
+        session.flush()
+        emit_change(session, "user.created", db_user.id, _change_data(db_user, USER_READ_COLUMNS))
+        _count_new_user(session, db_user.is_active)
+        session.commit()
+    except Exception:
+        session.rollback()
+        sharding.remove_from_directory(db, db_user.id)
+        raise
+    session.refresh(db_user)
 
     return db_user
 
+# 用户名和邮箱唯一约束对应的提示：PostgreSQL 报告约束（索引）名，SQLite 只报告 "表.列"
+_DUPLICATE_USER_MESSAGES = {
+    "ix_users_username": "用户名已被使用",
+    "ix_users_email": "邮箱已被注册",
+    "user_directory_username_key": "用户名已被使用",
+    "user_directory_email_key": "邮箱已被注册",
+    "users.username": "用户名已被使用",
+    "users.email": "邮箱已被注册",
+    "user_directory.username": "用户名已被使用",
+    "user_directory.email": "邮箱已被注册",
+}
+
+_SQLITE_UNIQUE_PREFIX = "UNIQUE constraint failed: "
+
+def _violated_unique_constraint(error: IntegrityError) -> Optional[str]:
+    """唯一约束冲突时返回约束名（SQLite 为 "表.列"），其他完整性错误返回 None"""
+    diag = getattr(error.orig, "diag", None)
+    constraint = getattr(diag, "constraint_name", None)
+    if constraint:
+        return constraint
+    message = str(error.orig)
+    if message.startswith(_SQLITE_UNIQUE_PREFIX):
+        return message[len(_SQLITE_UNIQUE_PREFIX):].strip()
+    return None
+
+def _duplicate_user_message(error: IntegrityError) -> Optional[str]:
+    """用户名或邮箱唯一约束冲突对应的提示，其他完整性错误返回 None"""
+    return _DUPLICATE_USER_MESSAGES.get(_violated_unique_constraint(error))
+
+def _insert_user_row(session: Session, values: Dict[str, Any]) -> Dict[str, Any]:
+    row = dict(session.execute(insert(User).values(**values).returning(*USER_READ_COLUMNS)).mappings().one())
+    emit_change(session, "user.created", row["id"], _change_data(row, USER_READ_COLUMNS))
+    _count_new_user(session, row["is_active"])
+    session.commit()
+    return row
+
+def register_user(db: Session, user_create: UserCreate, hashed_password: str) -> Dict[str, Any]:
+    """注册普通用户，返回 UserRead 字段；用户名或邮箱已存在时抛出 ValueError
+
+    不预先查询用户名和邮箱：一条 INSERT ... RETURNING 写入并取回用户，由唯一索引保证
+    并发重复提交时只有一个成功；变更事件和计数器在同一事务中写入，提交后不再重新读取。
+    密码哈希由调用方在哈希线程池中计算。
+    """
+    values = {
+        "username": user_create.username,
+        "email": user_create.email,
+        "hashed_password": hashed_password,
+        "is_active": user_create.is_active,
+        "is_superuser": False,
+    }
+    try:
+        if not sharding.enabled():
+            return _insert_user_row(db, values)
+        # 启用分片时由全局目录的唯一索引保证用户名和邮箱跨分片唯一
+        user_id = sharding.allocate_user_id(db, user_create.username, user_create.email)
+    except IntegrityError as e:
+        db.rollback()
+        message = _duplicate_user_message(e)
+        if message is None:
+            raise
+        raise ValueError(message) from e
+
+    session = sharding.session_for_user(db, user_id)
+    try:
+        return _insert_user_row(session, {**values, "id": user_id})
+    except Exception:
+        session.rollback()
+        sharding.remove_from_directory(db, user_id)
+        raise
+
 def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[User]:
-    """更新用户信息"""
+    """更新用户信息，用户名或邮箱已被其他用户使用时抛出 ValueError"""
     # 获取用户
     db_user = get_user(db, user_id)
     if not db_user:
         return None
 
     # 更新字段
+    was_active = db_user.is_active
+    previous = {"username": db_user.username, "email": db_user.email}
     user_data = user_update.model_dump(exclude_unset=True)
     for key, value in user_data.items():
         setattr(db_user, key, value)
 
-    # 保存更改
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    session = sharding.session_for_user(db, user_id)
+    directory_updated = False
+    try:
+        # 启用分片时先在全局目录中占用新的用户名和邮箱（跨分片唯一），再提交分片
+        if sharding.enabled():
+            sharding.update_directory(db, user_id, user_data.get("username"), user_data.get("email"))
+            directory_updated = True
+
+        # 保存更改
+        session.add(db_user)
+        session.flush()
+        emit_change(session, "user.updated", user_id, _change_data(db_user, USER_READ_COLUMNS))
+        if bool(db_user.is_active) != bool(was_active):
+            _adjust_counter(session, "users_active", 1 if db_user.is_active else -1)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        db.rollback()
+        if directory_updated:
+            # 分片提交失败，把目录恢复为原用户名和邮箱
+            sharding.update_directory(db, user_id, previous["username"], previous["email"])
+        message = _duplicate_user_message(e) if isinstance(e, IntegrityError) else None
+        if message is None:
+            raise
+        raise ValueError(message) from e
+    session.refresh(db_user)
 
     return db_user
 
@@ -70,12 +376,91 @@ def delete_user(db: Session, user_id: int) -> bool:
     if not db_user:
         return False
 
-    # 删除用户
-    db.delete(db_user)
-    db.commit()
+    # 删除用户（角色关联随之删除）
+    session = sharding.session_for_user(db, user_id)
+    role_ids = session.execute(select(user_role_link.c.role_id).where(user_role_link.c.user_id == user_id)).scalars().all()
+    session.delete(db_user)
+    _adjust_counter(session, "users", -1)
+    if db_user.is_active:
+        _adjust_counter(session, "users_active", -1)
+    for role_id in role_ids:
+        _adjust_counter(session, role_members_counter(role_id), -1)
+    emit_change(session, "user.deleted", user_id, {"id": user_id})
+    session.add(UserTombstone(user_id=user_id, deleted_at=datetime.now(timezone.utc)))
+    session.commit()
+
+    if sharding.enabled():
+        sharding.remove_from_directory(db, user_id)
 
     return True
 
+# 增量同步：按 (变更时间, 用户 ID) 排序，新建和修改取自 users.updated_at，删除取自 user_tombstones
+ChangeCursor = Tuple[datetime, int]
+
+def format_change_cursor(cursor: ChangeCursor) -> str:
+    raw = f"{cursor[0].replace(tzinfo=None).isoformat()}|{cursor[1]}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def parse_change_cursor(value: str) -> ChangeCursor:
+    """解析增量同步游标，格式不正确时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+        changed_at, user_id = raw.split("|")
+        return datetime.fromisoformat(changed_at).replace(tzinfo=None), int(user_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("游标格式不正确")
+
+def change_cursor(change: Dict[str, Any]) -> ChangeCursor:
+    """变更项对应的游标位置"""
+    return change["changed_at"], change["id"]
+
+def get_user_changes(db: Session, since: Optional[ChangeCursor], until: datetime, limit: int) -> List[Dict[str, Any]]:
+    """获取游标之后、until 之前的用户变更，按 (变更时间, 用户 ID) 排序
+
+    新建和修改返回 {"id", "deleted": False, "changed_at", "user"}，删除项的 user 为 None。
+    同一用户多次修改只返回当前状态一次；只修改最近活动时间和角色版本号不算变更。
+    """
+    until = until.replace(tzinfo=None)
+    users = select(*USER_READ_COLUMNS).where(User.updated_at < until).order_by(User.updated_at, User.id).limit(limit)
+    tombstones = (
+        select(UserTombstone.user_id, UserTombstone.deleted_at)
+        .where(UserTombstone.deleted_at < until)
+        .order_by(UserTombstone.deleted_at, UserTombstone.user_id)
+        .limit(limit)
+    )
+    if since is not None:
+        users = users.where(tuple_(User.updated_at, User.id) > tuple_(*since))
+        tombstones = tombstones.where(tuple_(UserTombstone.deleted_at, UserTombstone.user_id) > tuple_(*since))
+
+    def fetch(session: Session) -> List[Dict[str, Any]]:
+        upserts = [{"id": row["id"], "deleted": False, "changed_at": row["updated_at"], "user": dict(row)}
+                   for row in session.execute(users).mappings()]
+        deletes = [{"id": row.user_id, "deleted": True, "changed_at": row.deleted_at, "user": None}
+                   for row in session.execute(tombstones)]
+        return list(itertools.islice(heapq.merge(upserts, deletes, key=change_cursor), limit))
+
+    if sharding.enabled():
+        return sharding.gather(db, fetch, key=change_cursor, limit=limit)
+    return fetch(db)
+
+def prune_user_tombstones(db: Session, before: datetime, batch_size: int = 1000) -> int:
+    """分批删除早于 before 的删除记录并提交，返回删除数"""
+    total = 0
+    for session in sharding.user_sessions(db) if sharding.enabled() else [db]:
+        while True:
+            batch = (
+                select(UserTombstone.id)
+                .where(UserTombstone.deleted_at < before)
+                .order_by(UserTombstone.id)
+                .limit(batch_size)
+            )
+            deleted = session.execute(delete(UserTombstone).where(UserTombstone.id.in_(batch))).rowcount
+            session.commit()
+            total += deleted
+            if deleted < batch_size:
+                break
+    return total
+
 def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
     """验证用户身份"""
     user = get_user_by_username(db, username)
@@ -91,6 +476,16 @@ def get_role(db: Session, role_id: int) -> Optional[Role]:
     result = db.execute(select(Role).where(Role.id == role_id))
     return result.scalars().first()
 
+def get_role_version(db: Session, role_id: int) -> Optional[datetime]:
+    """获取角色的 updated_at，不存在时返回 None"""
+    result = db.execute(select(Role.updated_at).where(Role.id == role_id))
+    return result.scalar_one_or_none()
+
+def get_roles_version(db: Session) -> Tuple[int, Optional[datetime]]:
+    """获取角色表的 (数量, 最大 updated_at)，任一角色增删改都会改变该值"""
+    result = db.execute(select(func.count(Role.id), func.max(Role.updated_at)))
+    return tuple(result.one())
+
 def get_role_by_name(db: Session, name: str) -> Optional[Role]:
     """根据名称获取角色"""
     result = db.execute(select(Role).where(Role.name == name))
@@ -101,6 +496,11 @@ def get_roles(db: Session, skip: int = 0, limit: int = 100) -> List[Role]:
     result = db.execute(select(Role).offset(skip).limit(limit))
     return result.scalars().all()
 
+def get_role_rows(db: Session, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+    """获取角色列表的列投影，不构建 ORM 实体"""
+    stmt = select(*ROLE_READ_COLUMNS).offset(skip).limit(limit)
+    return [dict(row) for row in db.execute(stmt).mappings()]
+
 def create_role(db: Session, name: str, description: Optional[str] = None, permissions: Dict[str, Any] = {}) -> Role:
     """创建新角色"""
     # 创建角色对象
@@ -112,8 +512,11 @@ def create_role(db: Session, name: str, description: Optional[str] = None, permi
 
     # 添加到数据库
     db.add(db_role)
+    db.flush()
+    emit_change(db, "role.created", db_role.id, _change_data(db_role, ROLE_READ_COLUMNS))
     db.commit()
     db.refresh(db_role)
+    _sync_roles_to_shards(db, [db_role.id])
 
     return db_role
 
@@ -133,10 +536,16 @@ def update_role(db: Session, role_id: int, name: Optional[str] = None,
     if permissions is not None:
         db_role.permissions = permissions
 
+    # 角色内容变化时，拥有该角色或其子角色的用户详情随之变化
+    _bump_inheriting_users(db, role_id)
+
     # 保存更改
     db.add(db_role)
+    db.flush()
+    emit_change(db, "role.updated", role_id, _change_data(db_role, ROLE_READ_COLUMNS))
     db.commit()
     db.refresh(db_role)
+    _sync_roles_to_shards(db, [role_id])
 
     return db_role
 
@@ -147,13 +556,188 @@ def delete_role(db: Session, role_id: int) -> bool:
     if not db_role:
         return False
 
-    # 删除角色
+    # 先拆除继承关系以维护闭包表，再删除角色；后代角色的闭包行随之变化
+    affected = _role_and_descendant_ids(db, role_id)
+    _bump_inheriting_users(db, role_id)
+    edges = db.execute(
+        select(role_hierarchy.c.parent_id, role_hierarchy.c.child_id).where(
+            (role_hierarchy.c.parent_id == role_id) | (role_hierarchy.c.child_id == role_id)
+        )
+    ).all()
+    for parent_id, child_id in edges:
+        _unlink_role_parent(db, child_id, parent_id)
+    db.execute(role_closure.delete().where(role_closure.c.descendant_id == role_id))
+    db.execute(counters.delete().where(counters.c.name == role_members_counter(role_id)))
     db.delete(db_role)
+    emit_change(db, "role.deleted", role_id, {"id": role_id})
+    db.commit()
+    _sync_roles_to_shards(db, affected, deleted_role_id=role_id)
+
+    return True
+
+# 角色继承操作
+def inheriting_user_ids(role_id: int):
+    """拥有该角色或其任一子角色的用户 ID 子查询"""
+    descendants = select(role_closure.c.descendant_id).where(role_closure.c.ancestor_id == role_id)
+    return select(user_role_link.c.user_id).where(user_role_link.c.role_id.in_(descendants))
+
+def _bump_inheriting_users(db: Session, role_id: int) -> None:
+    """递增拥有该角色或其子角色的用户的角色版本号
+
+    未分片时在主库会话中执行、随调用方一起提交；分片时在各分片执行并立即提交，
+    此时分片中的闭包表仍是变更前的副本，正好对应受影响的用户。
+    """
+    if not sharding.enabled():
+        bump_roles_version(db, inheriting_user_ids(role_id))
+        return
+    for session in sharding.user_sessions(db):
+        bump_roles_version(session, inheriting_user_ids(role_id))
+        session.commit()
+
+def _role_and_descendant_ids(db: Session, role_id: int) -> List[int]:
+    """角色本身及其全部后代角色：继承关系变化时闭包行发生变化的范围"""
+    descendants = db.execute(select(role_closure.c.descendant_id).where(role_closure.c.ancestor_id == role_id))
+    return [role_id, *descendants.scalars()]
+
+def _sync_roles_to_shards(db: Session, role_ids: Iterable[int], deleted_role_id: Optional[int] = None) -> None:
+    """分片模式下把主库中涉及 role_ids 的角色数据复制到各分片"""
+    if not sharding.enabled():
+        return
+    if deleted_role_id is not None:
+        # 角色分配及其成员数计数器保存在用户所在分片
+        for session in sharding.user_sessions(db):
+            session.execute(user_role_link.delete().where(user_role_link.c.role_id == deleted_role_id))
+            session.execute(counters.delete().where(counters.c.name == role_members_counter(deleted_role_id)))
+            session.commit()
+    sharding.replicate_roles(db, role_ids)
+
+def _closure_pairs(db: Session, parent_id: int, child_id: int) -> List[Tuple[int, int, int]]:
+    """边 parent -> child 连通的 (祖先, 后代, 路径数) 组合"""
+    ancestors = db.execute(
+        select(role_closure.c.ancestor_id, role_closure.c.path_count).where(role_closure.c.descendant_id == parent_id)
+    ).all()
+    descendants = db.execute(
+        select(role_closure.c.descendant_id, role_closure.c.path_count).where(role_closure.c.ancestor_id == child_id)
+    ).all()
+    return [(a, d, pa * pd) for a, pa in ancestors for d, pd in descendants]
+
+def _existing_closure(db: Session, pairs: List[Tuple[int, int, int]]) -> Dict[Tuple[int, int], int]:
+    ancestor_ids = {a for a, _, _ in pairs}
+    descendant_ids = {d for _, d, _ in pairs}
+    result = db.execute(
+        select(role_closure.c.ancestor_id, role_closure.c.descendant_id, role_closure.c.path_count).where(
+            role_closure.c.ancestor_id.in_(ancestor_ids),
+            role_closure.c.descendant_id.in_(descendant_ids),
+        )
+    )
+    return {(a, d): count for a, d, count in result}
+
+def _unlink_role_parent(db: Session, child_id: int, parent_id: int) -> None:
+    """删除继承边并扣减闭包表中的路径数（不提交）"""
+    pairs = _closure_pairs(db, parent_id, child_id)
+    existing = _existing_closure(db, pairs)
+    for ancestor_id, descendant_id, paths in pairs:
+        remaining = existing.get((ancestor_id, descendant_id), 0) - paths
+        where = (role_closure.c.ancestor_id == ancestor_id) & (role_closure.c.descendant_id == descendant_id)
+        if remaining > 0:
+            db.execute(role_closure.update().where(where).values(path_count=remaining))
+        else:
+            db.execute(role_closure.delete().where(where))
+    db.execute(role_hierarchy.delete().where(
+        role_hierarchy.c.parent_id == parent_id,
+        role_hierarchy.c.child_id == child_id,
+    ))
+
+def add_role_parent(db: Session, role_id: int, parent_id: int) -> bool:
+    """为角色添加父角色，子角色继承父角色的全部权限
+
+    角色不存在时返回 False；会形成环时抛出 ValueError。
+    """
+    if not get_role(db, role_id) or not get_role(db, parent_id):
+        return False
+
+    # 父角色已是该角色的后代（或就是它本身）时会形成环
+    cycle = db.execute(
+        select(role_closure.c.path_count).where(
+            role_closure.c.ancestor_id == role_id,
+            role_closure.c.descendant_id == parent_id,
+        )
+    ).first()
+    if role_id == parent_id or cycle:
+        raise ValueError("角色继承关系不能形成环")
+
+    exists = db.execute(
+        select(role_hierarchy.c.parent_id).where(
+            role_hierarchy.c.parent_id == parent_id,
+            role_hierarchy.c.child_id == role_id,
+        )
+    ).first()
+    if exists:
+        return True  # 已经存在，视为成功
+
+    # 父角色的每个祖先与子角色的每个后代之间新增路径
+    pairs = _closure_pairs(db, parent_id, role_id)
+    existing = _existing_closure(db, pairs)
+    for ancestor_id, descendant_id, paths in pairs:
+        if (ancestor_id, descendant_id) in existing:
+            db.execute(
+                role_closure.update()
+                .where(role_closure.c.ancestor_id == ancestor_id, role_closure.c.descendant_id == descendant_id)
+                .values(path_count=existing[(ancestor_id, descendant_id)] + paths)
+            )
+        else:
+            db.execute(role_closure.insert().values(
+                ancestor_id=ancestor_id, descendant_id=descendant_id, path_count=paths
+            ))
+    db.execute(role_hierarchy.insert().values(parent_id=parent_id, child_id=role_id))
+    _bump_inheriting_users(db, role_id)
+    db.commit()
+    _sync_roles_to_shards(db, [parent_id, *_role_and_descendant_ids(db, role_id)])
+
+    return True
+
+def remove_role_parent(db: Session, role_id: int, parent_id: int) -> bool:
+    """移除角色的父角色，继承关系不存在时返回 False"""
+    exists = db.execute(
+        select(role_hierarchy.c.parent_id).where(
+            role_hierarchy.c.parent_id == parent_id,
+            role_hierarchy.c.child_id == role_id,
+        )
+    ).first()
+    if not exists:
+        return False
+
+    # 先按删除前的闭包找出受影响的用户
+    _bump_inheriting_users(db, role_id)
+    _unlink_role_parent(db, role_id, parent_id)
     db.commit()
+    _sync_roles_to_shards(db, [parent_id, *_role_and_descendant_ids(db, role_id)])
 
     return True
 
+def get_role_ancestor_ids(db: Session, role_id: int) -> List[int]:
+    """获取角色的全部祖先角色 ID（不含自身）"""
+    result = db.execute(
+        select(role_closure.c.ancestor_id).where(
+            role_closure.c.descendant_id == role_id,
+            role_closure.c.ancestor_id != role_id,
+        )
+    )
+    return result.scalars().all()
+
 # 用户角色关联操作
+def bump_roles_version(db: Session, user_ids) -> None:
+    """递增用户的角色版本号（不提交），用于角色相关 ETag 失效
+
+    db 须是用户数据所在的会话；user_ids 可以是 ID 列表或返回 user_id 的子查询；不修改 updated_at。
+    """
+    db.execute(
+        update(User)
+        .where(User.id.in_(user_ids))
+        .values(roles_version=User.roles_version + 1, updated_at=User.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
 def assign_role_to_user(db: Session, user_id: int, role_id: int) -> bool:
     """为用户分配角色"""
     # 检查用户和角色是否存在
@@ -162,22 +746,27 @@ def assign_role_to_user(db: Session, user_id: int, role_id: int) -> bool:
     if not user or not role:
         return False
 
+    # 关联与用户存放在同一个库中
+    session = sharding.session_for_user(db, user_id)
+
     # 检查是否已分配
-    result = db.execute(
-        select(UserRoleLink).where(
-            UserRoleLink.user_id == user_id,
-            UserRoleLink.role_id == role_id
+    result = session.execute(
+        select(user_role_link.c.user_id).where(
+            user_role_link.c.user_id == user_id,
+            user_role_link.c.role_id == role_id
         )
     )
-    existing_link = result.scalars().first()
+    existing_link = result.first()
 
     if existing_link:
         return True  # 已经分配过，视为成功
 
     # 创建新的关联
-    link = UserRoleLink()
-    db.add(link)
-    db.commit()
+    session.execute(user_role_link.insert().values(user_id=user_id, role_id=role_id))
+    bump_roles_version(session, [user_id])
+    _adjust_counter(session, role_members_counter(role_id), 1)
+    emit_change(session, "user.role_assigned", user_id, {"user_id": user_id, "role_id": role_id})
+    session.commit()
 
     return True
 
@@ -189,21 +778,21 @@ def remove_role_from_user(db: Session, user_id: int, role_id: int) -> bool:
     if not user or not role:
         return False
 
-    # 查找关联
-    result = db.execute(
-        select(UserRoleLink).where(
-            UserRoleLink.user_id == user_id,
-            UserRoleLink.role_id == role_id
+    # 删除关联
+    session = sharding.session_for_user(db, user_id)
+    result = session.execute(
+        user_role_link.delete().where(
+            user_role_link.c.user_id == user_id,
+            user_role_link.c.role_id == role_id
         )
     )
-    link = result.scalars().first()
-
-    if not link:
+    if result.rowcount == 0:
         return False  # 未找到关联
 
-    # 删除关联
-    db.delete(link)
-    db.commit()
+    bump_roles_version(session, [user_id])
+    _adjust_counter(session, role_members_counter(role_id), -1)
+    emit_change(session, "user.role_removed", user_id, {"user_id": user_id, "role_id": role_id})
+    session.commit()
 
     return True
 
@@ -221,4 +810,74 @@ def get_role_users(db: Session, role_id: int) -> List[User]:
     if not role:
         return []
 
+    if sharding.enabled():
+        stmt = (
+            select(User)
+            .join(user_role_link, user_role_link.c.user_id == User.id)
+            .where(user_role_link.c.role_id == role_id)
+            .order_by(User.id)
+        )
+        return sharding.gather(db, lambda session: session.execute(stmt).scalars().all(), key=lambda u: u.id)
+
     return role.users
+
+def get_role_user_rows(db: Session, role_id: int) -> List[Dict[str, Any]]:
+    """获取拥有特定角色的用户的列投影，不构建 ORM 实体"""
+    stmt = (
+        select(*USER_READ_COLUMNS)
+        .join(user_role_link, user_role_link.c.user_id == User.id)
+        .where(user_role_link.c.role_id == role_id)
+        .order_by(User.id)
+    )
+    return sharding.gather(
+        db, lambda session: [dict(row) for row in session.execute(stmt).mappings()], key=lambda row: row["id"],
+    )
+
+# 列表总数计数器
+# 计数器与被计数的数据在同一个库中：启用分片时每个分片各有一份，读取时求和
+def role_members_counter(role_id: int) -> str:
+    return f"role_members:{role_id}"
+
+def _upsert(db: Session):
+    # SQLite 和 PostgreSQL 都支持 INSERT ... ON CONFLICT DO UPDATE，按当前连接的方言选用
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql_insert
+    return sqlite_insert
+
+def _adjust_counter(db: Session, name: str, delta: int) -> None:
+    """在调用方的事务中增减计数器（不提交）
+
+    单条 INSERT ... ON CONFLICT DO UPDATE：并发事务首次写入同一计数器时不会因主键冲突失败。
+    """
+    stmt = _upsert(db)(counters).values(name=name, value=delta)
+    db.execute(stmt.on_conflict_do_update(index_elements=[counters.c.name],
+                                          set_={"value": counters.c.value + stmt.excluded.value}))
+
+def _count_new_user(db: Session, is_active: bool) -> None:
+    _adjust_counter(db, "users", 1)
+    if is_active:
+        _adjust_counter(db, "users_active", 1)
+
+def get_counters(db: Session, names: List[str]) -> Dict[str, int]:
+    """读取计数器，不存在的计数器为 0"""
+    values = dict.fromkeys(names, 0)
+    stmt = select(counters.c.name, counters.c.value).where(counters.c.name.in_(names))
+    for session in sharding.user_sessions(db):
+        for name, value in session.execute(stmt):
+            values[name] += value
+    return values
+
+def reconcile_counters(db: Session) -> None:
+    """按实际数据重算全部计数器并提交，用于修正并发或直接写库造成的偏差"""
+    role_members = (
+        select(literal("role_members:") + cast(user_role_link.c.role_id, String), func.count())
+        .group_by(user_role_link.c.role_id)
+    )
+    for session in sharding.user_sessions(db):
+        session.execute(delete(counters))
+        session.execute(insert(counters).from_select(["name", "value"], select(literal("users"), func.count(User.id))))
+        session.execute(insert(counters).from_select(
+            ["name", "value"], select(literal("users_active"), func.count(User.id)).where(User.is_active == True)
+        ))
+        session.execute(insert(counters).from_select(["name", "value"], role_members))
+        session.commit()
@@ -3,6 +3,8 @@ from sqlalchemy.orm import sessionmaker, Session
 from app.config.settings import settings
 import logging
 from app.models.base import Base
+from app import sharding
+from app.db_stats import track_pool, track_sessions
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -15,19 +17,36 @@ engine = create_engine(
     connect_args={"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
 )
 
+track_pool(engine)
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+track_sessions(SessionLocal)
+
 # 创建所有表
 def create_db_and_tables():
     logger.info("创建数据库表...")
     try:
         # 导入所有模型以确保元数据被注册
         import app.models.user
+        import app.models.audit
+        import app.models.token
+        import app.models.outbox
 
         # 创建所有表
         Base.metadata.create_all(bind=engine)
         logger.info("数据库表创建成功!")
+
+        # 将已有数据库原地升级到最新版本
+        from app.migrations import run_migrations
+        version = run_migrations(engine)
+        logger.info(f"数据库迁移版本: {version}")
+
+        # 启用分片时同步创建各分片库
+        if sharding.enabled():
+            sharding.create_shard_tables(engine)
+            logger.info(f"已初始化 {len(sharding.get_router().engines)} 个用户分片")
     except Exception as e:
         logger.error(f"创建数据库表时出错: {e}")
         raise
@@ -38,4 +57,5 @@ def get_session():
     try:
         yield session
     finally:
+        sharding.close_shard_sessions(session)
         session.close()
@@ -0,0 +1,74 @@
+import logging
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class DBRequestStats:
+    """单个请求实际访问数据库的会话数和连接检出次数"""
+    __slots__ = ("sessions", "checkouts")
+
+    def __init__(self):
+        self.sessions = 0
+        self.checkouts = 0
+
+# 由中间件为每个请求设置；线程池中执行的依赖拿到的是同一个对象
+_request_stats: ContextVar[Optional[DBRequestStats]] = ContextVar("db_request_stats", default=None)
+
+def current_stats() -> Optional[DBRequestStats]:
+    return _request_stats.get()
+
+def record_session() -> None:
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.sessions += 1
+
+def track_sessions(factory: sessionmaker) -> None:
+    """统计实际访问数据库的会话：会话首次开始事务时计数，创建后未使用的会话不计入"""
+    @event.listens_for(factory, "after_begin")
+    def _on_begin(session, transaction, connection):
+        if not session.info.get("db_stats_recorded"):
+            session.info["db_stats_recorded"] = True
+            record_session()
+
+def track_pool(engine: Engine) -> None:
+    """统计引擎连接池的检出次数"""
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.checkouts += 1
+
+class DBStatsMiddleware:
+    """为每个请求记录数据库会话和连接使用量，并通过响应头返回"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = DBRequestStats()
+        token = _request_stats.set(stats)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start" and settings.DB_STATS_HEADERS:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-sessions", str(stats.sessions).encode()))
+                headers.append((b"x-db-checkouts", str(stats.checkouts).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _request_stats.reset(token)
+            logger.debug(f"{scope['path']} 使用数据库会话 {stats.sessions} 个，连接检出 {stats.checkouts} 次")
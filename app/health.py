@@ -0,0 +1,111 @@
+"""存活与就绪检查
+
+存活检查只说明进程在响应；就绪检查在超过阈值时返回 503，
+让负载均衡在延迟恶化之前把流量从该实例移走：
+- 通过引擎执行带超时的 SELECT 1（启用分片时包括各分片库）；
+- 连接池已检出连接数占上限的比例；
+- 事件循环延迟（需开启 LOOP_MONITOR_ENABLED）；
+- 密码哈希线程池的排队任务数。
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app import sharding
+from app.config.settings import settings
+from app.core.hashing import PasswordHasher, password_hasher
+from app.loop_monitor import LoopMonitor, loop_monitor
+
+# 数据库探测使用独立线程，连接池耗尽时不会占用默认线程池
+_probe_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="health-probe")
+
+
+def pool_stats(engine: Engine) -> Dict[str, Any]:
+    """连接池状态；不支持统计的连接池（如内存 SQLite 使用的）只返回类型"""
+    pool = engine.pool
+    stats: Dict[str, Any] = {"type": type(pool).__name__}
+    if hasattr(pool, "checkedout") and hasattr(pool, "size"):
+        size, overflow = pool.size(), pool.overflow()
+        # overflow() 为负数表示尚未创建满 size 个连接
+        capacity = size + max(0, getattr(pool, "_max_overflow", 0))
+        stats.update({
+            "size": size,
+            "checked_out": pool.checkedout(),
+            "overflow": max(0, overflow),
+            "utilization": round(pool.checkedout() / capacity, 3) if capacity > 0 else 0.0,
+        })
+    return stats
+
+
+def _ping(engine: Engine) -> None:
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+class HealthChecker:
+    def __init__(self, engines: List[Engine], hasher: PasswordHasher = password_hasher,
+                 monitor: LoopMonitor = loop_monitor):
+        self.engines = engines
+        self.hasher = hasher
+        self.monitor = monitor
+
+    async def _probe(self, engine: Engine) -> Dict[str, Any]:
+        timeout = settings.READINESS_DB_TIMEOUT_MS / 1000
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(_probe_executor, _ping, engine), timeout
+            )
+            error: Optional[str] = None
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except Exception as e:
+            error = str(e)
+        result = {"latency_ms": round((time.perf_counter() - start) * 1000, 2), "pool": pool_stats(engine)}
+        if error is not None:
+            result["error"] = error
+        return result
+
+    async def readiness(self) -> Dict[str, Any]:
+        """执行全部检查，返回各项结果和未通过的项"""
+        failures: List[str] = []
+        databases = await asyncio.gather(*(self._probe(engine) for engine in self.engines))
+        for i, db in enumerate(databases):
+            name = "primary" if i == 0 else f"shard{i - 1}"
+            db["name"] = name
+            if "error" in db:
+                failures.append(f"{name}: {db['error']}")
+            elif db["latency_ms"] > settings.READINESS_MAX_DB_LATENCY_MS:
+                failures.append(f"{name}: 查询延迟 {db['latency_ms']}ms")
+            utilization = db["pool"].get("utilization", 0.0)
+            if utilization >= settings.READINESS_MAX_POOL_UTILIZATION:
+                failures.append(f"{name}: 连接池使用率 {utilization}")
+
+        loop_lag_ms = round(self.monitor.lag * 1000, 2) if self.monitor.running else None
+        if loop_lag_ms is not None and loop_lag_ms > settings.READINESS_MAX_LOOP_LAG_MS:
+            failures.append(f"事件循环延迟 {loop_lag_ms}ms")
+
+        queue_depth = self.hasher.queue_depth
+        if queue_depth > settings.READINESS_MAX_HASH_QUEUE:
+            failures.append(f"密码哈希排队 {queue_depth}")
+
+        return {
+            "status": "not_ready" if failures else "ready",
+            "databases": databases,
+            "loop_lag_ms": loop_lag_ms,
+            "hash_queue_depth": queue_depth,
+            "failures": failures,
+        }
+
+
+def get_health_checker() -> HealthChecker:
+    """就绪检查依赖，检查主库和各分片库"""
+    from app.database import engine
+    engines = [engine]
+    if sharding.enabled():
+        engines.extend(sharding.get_router().engines)
+    return HealthChecker(engines)
@@ -0,0 +1,156 @@
+"""事件循环延迟监控（可选）
+
+心跳任务按固定间隔休眠并测量实际唤醒延迟，作为事件循环延迟指标；
+辅助线程检查心跳是否停滞，单次阻塞超过阈值时采样事件循环线程的调用栈，
+连同当前请求的路由写入日志，用于定位阻塞事件循环的同步调用。
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+from app.config.settings import settings, subscribe
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """测量事件循环延迟，并在阻塞超过阈值时记录调用栈"""
+
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        # 最近一次心跳的延迟、运行以来的最大延迟（秒）和阻塞次数
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.blocked_count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_beat = time.monotonic()
+        self._reported_beat: Optional[float] = None
+        # 正在处理的请求：任务 -> ASGI scope
+        self._scopes: Dict[asyncio.Task, dict] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """在事件循环中启动心跳任务和监控线程"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._thread.join()
+        self._task = None
+        self._thread = None
+        self._scopes.clear()
+
+    def track(self, scope: dict) -> Optional[asyncio.Task]:
+        """登记当前任务正在处理的请求"""
+        if not self.running:
+            return None
+        task = asyncio.current_task()
+        self._scopes[task] = scope
+        return task
+
+    def untrack(self, task: Optional[asyncio.Task]) -> None:
+        if task is not None:
+            self._scopes.pop(task, None)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "event_loop_lag_seconds": self.lag,
+            "event_loop_lag_max_seconds": self.max_lag,
+            "event_loop_blocked_total": self.blocked_count,
+        }
+
+    async def _heartbeat(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lag = max(0.0, now - start - self.interval)
+            self.max_lag = max(self.max_lag, self.lag)
+            self._last_beat = now
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval
+            # 同一次阻塞只报告一次
+            if stalled >= self.threshold and beat != self._reported_beat:
+                self._reported_beat = beat
+                self.blocked_count += 1
+                self._report(stalled)
+
+    def _current_route(self) -> str:
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        scope = self._scopes.get(task) if task is not None else None
+        if scope is None:
+            return "<无请求>"
+        # 路由匹配后 scope 中带有 route，可得到路由模板而不是具体路径
+        route = scope.get("route")
+        path = getattr(route, "path", None) or scope.get("path", "")
+        return f"{scope.get('method', '')} {path}"
+
+    def _report(self, stalled: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "<无法获取调用栈>\n"
+        logger.warning(
+            f"事件循环已阻塞 {stalled * 1000:.0f}ms，路由 {self._current_route()}，调用栈：\n{stack}"
+        )
+
+
+loop_monitor = LoopMonitor(
+    settings.LOOP_MONITOR_INTERVAL_MS / 1000,
+    settings.LOOP_BLOCK_THRESHOLD_MS / 1000,
+)
+
+
+@subscribe
+def _apply_settings(old, new, changed) -> None:
+    loop_monitor.interval = new.LOOP_MONITOR_INTERVAL_MS / 1000
+    loop_monitor.threshold = new.LOOP_BLOCK_THRESHOLD_MS / 1000
+
+
+class LoopMonitorMiddleware:
+    """记录每个请求所在的任务，以便阻塞报告中带上路由"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        task = loop_monitor.track(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            loop_monitor.untrack(task)
@@ -1,20 +1,45 @@
 from fastapi import FastAPI, Depends
+from fastapi.responses import PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
+import signal
 
-from app.config.settings import settings
+from app.config.settings import SettingsReloadError, reload_settings, settings
 from app.database import create_db_and_tables
-from app.api import auth, users, roles
+from app.db_stats import DBStatsMiddleware
+from app.loop_monitor import LoopMonitorMiddleware, loop_monitor
+from app.compression import CompressionMiddleware
+from app.api import auth, users, roles, audit, admin, events
+from app.audit import audit_log
+from app.activity import activity_tracker
+from app.change_feed import change_feed
+from app.reconciler import counter_reconciler
+from app.token_sweeper import token_sweeper
+from app.settings_watcher import settings_watcher
+from app.health import HealthChecker, get_health_checker
+from app.core.hashing import password_hasher
+from app.core.cache import permission_cache
+from app.core import reference_tokens
 from app.crud.user import create_role, assign_role_to_user, create_user, get_role_by_name, get_user_by_username
 from app.schemas.user import UserCreate
 from sqlalchemy.orm import Session
 from app.database import get_session
+from app import sharding
 from contextlib import asynccontextmanager
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _reload_on_sighup() -> None:
+    try:
+        changed = reload_settings()
+        settings_watcher.publish()
+        logger.info(f"SIGHUP 重新加载配置完成，变更: {', '.join(sorted(changed)) or '无'}")
+    except SettingsReloadError as e:
+        logger.error(f"SIGHUP 重新加载配置被拒绝: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 启动时创建数据库表
@@ -32,7 +57,7 @@ async def lifespan(app: FastAPI):
                 name="admin", 
                 description="管理员角色", 
                 permissions={
-                    "permissions": ["user:manage", "role:manage"]
+                    "permissions": ["user:manage", "role:manage", "audit:read", "events:read", "token:introspect"]
                 }
             )
             logger.info("Created admin role")
@@ -52,6 +77,7 @@ async def lifespan(app: FastAPI):
         # 创建超级管理员
         admin_user = get_user_by_username(db, "admin")
         if not admin_user:
+            # 创建时即设置为超级管理员
             admin_user = create_user(
                 db, 
                 UserCreate(
@@ -60,12 +86,9 @@ async def lifespan(app: FastAPI):
                     password="adminpassword",
                     password_confirm="adminpassword",
                     is_active=True
-                )
+                ),
+                is_superuser=True
             )
-            # 设置为超级管理员
-            admin_user.is_superuser = True
-            db.add(admin_user)
-            db.commit()
             logger.info("Created superadmin user")
 
         # 为管理员分配管理员角色
@@ -74,11 +97,39 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Error during initialization: {e}")
     finally:
+        sharding.close_shard_sessions(db)
         db.close()
 
+    password_hasher.start()
+    audit_log.start()
+    activity_tracker.start()
+    counter_reconciler.start()
+    token_sweeper.start()
+    change_feed.start()
+    settings_watcher.start()
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+
+    # 收到 SIGHUP 时重新加载配置（Windows 等不支持的平台只能通过管理接口）
+    loop = asyncio.get_running_loop()
+    sighup = getattr(signal, "SIGHUP", None)
+    try:
+        loop.add_signal_handler(sighup, _reload_on_sighup)
+    except (TypeError, NotImplementedError, RuntimeError):
+        sighup = None
+
     yield
+    if sighup is not None:
+        loop.remove_signal_handler(sighup)
     # 应用关闭时清理资源
-    pass
+    await loop_monitor.stop()
+    await change_feed.stop()
+    audit_log.stop()
+    activity_tracker.stop()
+    counter_reconciler.stop()
+    token_sweeper.stop()
+    settings_watcher.stop()
+    password_hasher.shutdown()
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -95,12 +146,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 列表接口通过响应头返回总数
+    expose_headers=["X-Total-Count", "X-Active-Count"],
 )
 
+# 统计每个请求的数据库会话和连接使用量
+app.add_middleware(DBStatsMiddleware)
+
+# 记录请求所在任务，事件循环阻塞时报告对应路由
+app.add_middleware(LoopMonitorMiddleware)
+
+# 按 Accept-Encoding 压缩响应（最外层，其他中间件添加的响应头保持不变）
+app.add_middleware(CompressionMiddleware)
+
 # 注册路由
 app.include_router(auth.router, prefix=f"{settings.API_PREFIX}/auth", tags=["认证"])
 app.include_router(users.router, prefix=f"{settings.API_PREFIX}/users", tags=["用户"])
 app.include_router(roles.router, prefix=f"{settings.API_PREFIX}/roles", tags=["角色"])
+app.include_router(audit.router, prefix=f"{settings.API_PREFIX}/audit", tags=["审计"])
+app.include_router(events.router, prefix=f"{settings.API_PREFIX}/events", tags=["变更事件"])
+app.include_router(admin.router, prefix=f"{settings.API_PREFIX}/admin", tags=["管理"])
 
 @app.get("/")
 async def root():
@@ -109,3 +174,22 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/health/live")
+async def liveness():
+    """存活检查：进程能处理请求即返回 200"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness(checker: HealthChecker = Depends(get_health_checker)):
+    """就绪检查：数据库、连接池、事件循环或哈希线程池超过阈值时返回 503"""
+    result = await checker.readiness()
+    return JSONResponse(result, status_code=200 if result["status"] == "ready" else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 文本格式的运行指标"""
+    values = {**loop_monitor.metrics(), **audit_log.metrics(), **activity_tracker.metrics(),
+              **permission_cache.metrics(), **reference_tokens.metrics(), **change_feed.metrics(), "password_hash_queue_depth": password_hasher.queue_depth}
+    lines = [f"{name} {value}" for name, value in values.items()]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,170 @@
+"""轻量级版本化数据库迁移
+
+新建数据库时由 ``create_all`` 建出完整表结构，迁移只做幂等的补充；
+已有数据库则按版本号依次原地升级，不会删除任何数据。
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple, Union
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+MigrationStep = Union[str, Callable[[Connection], None]]
+
+
+def add_column(table: str, column: str, ddl: str) -> Callable[[Connection], None]:
+    """生成"列不存在时才添加"的迁移步骤"""
+    def _apply(conn: Connection) -> None:
+        columns = {c["name"] for c in inspect(conn).get_columns(table)}
+        if column not in columns:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return _apply
+
+
+def grant_role_permission(role_name: str, permission: str) -> Callable[[Connection], None]:
+    """生成"为已有角色补充权限"的迁移步骤，角色不存在（新数据库由启动流程创建）或已有该权限时跳过
+
+    同时递增直接或通过继承拥有该角色的用户的角色版本号，使权限缓存中的旧条目失效。
+    """
+    def _apply(conn: Connection) -> None:
+        row = conn.execute(text("SELECT id, permissions FROM roles WHERE name = :name"), {"name": role_name}).first()
+        if row is None:
+            return
+        rules = row.permissions
+        rules = dict(json.loads(rules) if isinstance(rules, str) else rules or {})
+        granted = list(rules.get("permissions", []))
+        if permission in granted:
+            return
+        rules["permissions"] = granted + [permission]
+        conn.execute(
+            text("UPDATE roles SET permissions = :permissions, updated_at = :now WHERE id = :id"),
+            {"permissions": json.dumps(rules), "now": datetime.now(timezone.utc), "id": row.id},
+        )
+        conn.execute(text(
+            "UPDATE users SET roles_version = roles_version + 1 WHERE id IN ("
+            "SELECT l.user_id FROM user_role_links l JOIN role_closure c ON c.descendant_id = l.role_id "
+            "WHERE c.ancestor_id = :id)"
+        ), {"id": row.id})
+    return _apply
+
+
+def create_user_search_index(conn: Connection) -> None:
+    """建立用户名/邮箱的 FTS5 三元组索引及同步触发器，并为已有用户建索引
+
+    仅 SQLite 支持；其他数据库跳过，搜索退化为 LIKE 扫描。
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+        "username, email, content='users', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+        "INSERT INTO users_fts (rowid, username, email) VALUES (new.id, new.username, new.email); END",
+        "CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+        "INSERT INTO users_fts (users_fts, rowid, username, email) VALUES ('delete', old.id, old.username, old.email); END",
+        "CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username, email ON users BEGIN "
+        "INSERT INTO users_fts (users_fts, rowid, username, email) VALUES ('delete', old.id, old.username, old.email); "
+        "INSERT INTO users_fts (rowid, username, email) VALUES (new.id, new.username, new.email); END",
+        "INSERT INTO users_fts (users_fts) VALUES ('rebuild')",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+# 迁移列表：(版本号, 描述, 步骤)，步骤为 SQL 字符串或接收连接的可调用对象
+MIGRATIONS: List[Tuple[int, str, List[MigrationStep]]] = [
+    (1, "user_role_links 按 role_id 反查索引", [
+        "CREATE INDEX IF NOT EXISTS ix_user_role_links_role_id_user_id ON user_role_links (role_id, user_id)",
+    ]),
+    (2, "users 按创建时间排序索引", [
+        "CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id)",
+    ]),
+    (3, "users.is_active 索引", [
+        "CREATE INDEX IF NOT EXISTS ix_users_is_active ON users (is_active)",
+    ]),
+    (4, "users.roles_version 角色版本号", [
+        add_column("users", "roles_version", "INTEGER NOT NULL DEFAULT 0"),
+    ]),
+    (5, "角色继承闭包表：为已有角色补充自身记录", [
+        "INSERT INTO role_closure (ancestor_id, descendant_id, path_count) "
+        "SELECT id, id, 1 FROM roles WHERE id NOT IN "
+        "(SELECT descendant_id FROM role_closure WHERE ancestor_id = descendant_id)",
+    ]),
+    (6, "users 最近登录和最近活动时间", [
+        add_column("users", "last_login_at", "DATETIME"),
+        add_column("users", "last_seen_at", "DATETIME"),
+    ]),
+    (7, "用户名/邮箱搜索索引", [
+        create_user_search_index,
+    ]),
+    (8, "列表总数计数器：按已有数据初始化", [
+        "DELETE FROM counters",
+        "INSERT INTO counters (name, value) SELECT 'users', COUNT(*) FROM users",
+        "INSERT INTO counters (name, value) SELECT 'users_active', COUNT(*) FROM users WHERE is_active",
+        "INSERT INTO counters (name, value) "
+        "SELECT 'role_members:' || role_id, COUNT(*) FROM user_role_links GROUP BY role_id",
+    ]),
+    (9, "users 按更新时间排序索引（增量同步）", [
+        "CREATE INDEX IF NOT EXISTS ix_users_updated_at_id ON users (updated_at, id)",
+    ]),
+    (10, "admin 角色补充 token:introspect 权限", [
+        grant_role_permission("admin", "token:introspect"),
+    ]),
+    (11, "admin 角色补充 audit:read 权限", [
+        grant_role_permission("admin", "audit:read"),
+    ]),
+    (12, "admin 角色补充 events:read 权限", [
+        grant_role_permission("admin", "events:read"),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR NOT NULL, "
+        "applied_at DATETIME NOT NULL)"
+    ))
+
+
+def get_schema_version(conn: Connection) -> int:
+    """获取数据库当前的迁移版本，未迁移过的数据库返回 0"""
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+def run_migrations(engine: Engine) -> int:
+    """将数据库升级到最新版本，返回升级后的版本号
+
+    每个版本在独立事务中执行，失败时已完成的版本保持不变。
+    """
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        current = get_schema_version(conn)
+
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info(f"执行数据库迁移 {version}: {description}")
+        with engine.begin() as conn:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(text(step))
+            conn.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.now(timezone.utc)},
+            )
+        current = version
+
+    return current
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, DateTime, Index, Integer, JSON, String
+from datetime import datetime, timezone
+
+from app.models.base import Base
+
+class AuditEvent(Base):
+    """审计事件，只追加写入，不提供修改和删除接口"""
+    __tablename__ = "audit_events"
+    __table_args__ = (
+        # 按事件类型筛选并按时间倒序分页
+        Index("ix_audit_events_event_id", "event", "id"),
+        Index("ix_audit_events_actor_id_id", "actor_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event = Column(String, nullable=False)
+    # 执行操作的用户，登录失败等场景下可能为空
+    actor_id = Column(Integer, nullable=True)
+    # 被操作的对象（用户或角色）ID
+    subject_id = Column(Integer, nullable=True)
+    ip = Column(String, nullable=True)
+    detail = Column(JSON, default={})
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
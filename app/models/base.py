@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Table, Integer
+from sqlalchemy import Column, DateTime, ForeignKey, Table, Integer, Index, String
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime, timezone
 
@@ -10,5 +10,38 @@ user_role_link = Table(
     Base.metadata,
     Column('user_id',Integer, ForeignKey('users.id'), primary_key=True),
     Column('role_id', Integer, ForeignKey('roles.id'), primary_key=True),
-    Column('assigned_at', DateTime, default=lambda: datetime.now(timezone.utc))
-)
\ No newline at end of file
+    Column('assigned_at', DateTime, default=lambda: datetime.now(timezone.utc)),
+    # 按角色反查用户（get_role_users、删除角色）
+    Index('ix_user_role_links_role_id_user_id', 'role_id', 'user_id')
+)
+
+# 角色继承关系表：子角色继承父角色的全部权限
+role_hierarchy = Table(
+    'role_hierarchy',
+    Base.metadata,
+    Column('parent_id', Integer, ForeignKey('roles.id'), primary_key=True),
+    Column('child_id', Integer, ForeignKey('roles.id'), primary_key=True),
+    Index('ix_role_hierarchy_child_id_parent_id', 'child_id', 'parent_id')
+)
+
+# 角色继承的传递闭包表，由 CRUD 在增删继承关系时增量维护
+# 每个角色都有一条指向自身的记录；path_count 为祖先到后代的路径数，
+# 多条路径（菱形继承）时删除其中一条边不会误删仍然可达的关系
+role_closure = Table(
+    'role_closure',
+    Base.metadata,
+    Column('ancestor_id', Integer, ForeignKey('roles.id'), primary_key=True),
+    Column('descendant_id', Integer, ForeignKey('roles.id'), primary_key=True),
+    Column('path_count', Integer, nullable=False, default=1),
+    # 按后代查祖先（用户的有效角色）
+    Index('ix_role_closure_descendant_id_ancestor_id', 'descendant_id', 'ancestor_id')
+)
+
+# 列表总数计数器，由 CRUD 在同一事务中增减，后台任务定期按实际数据重算
+# 名称：users、users_active、role_members:<角色ID>（直接分配的成员数）
+counters = Table(
+    'counters',
+    Base.metadata,
+    Column('name', String, primary_key=True),
+    Column('value', Integer, nullable=False, default=0)
+)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, DateTime, Index, Integer, JSON, String
+from datetime import datetime, timezone
+
+from app.models.base import Base
+
+class OutboxEvent(Base):
+    """用户/角色变更事件（发件箱），与变更在同一事务中写入
+
+    id 即事件序号，自增且不复用，变更事件流按序号断点续传；超过保留期的事件由后台任务删除。
+    启用分片时每个库各有一份：角色事件写入主库，用户及角色分配事件写入用户所在分片。
+    """
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        # 按保留期清理
+        Index("ix_outbox_events_created_at", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # user.created、role.updated、user.role_assigned 等
+    topic = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    data = Column(JSON, default={})
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
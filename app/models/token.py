@@ -0,0 +1,44 @@
+from sqlalchemy import Column, DateTime, Index, Integer, LargeBinary
+from datetime import datetime, timezone
+
+from app.models.base import Base
+
+class RefreshToken(Base):
+    """已签发的刷新令牌
+
+    主键为 jti 的 16 字节摘要，不保存令牌本身；同一次登录后轮换出的令牌属于同一个 family。
+    已使用的令牌保留到过期，用于检测重放，过期后由后台任务批量删除。
+    """
+    __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        # 后台清理按过期时间扫描
+        Index("ix_refresh_tokens_expires_at", "expires_at"),
+        Index("ix_refresh_tokens_family_id", "family_id"),
+        # 定长主键，SQLite 下无需额外的 rowid
+        {"sqlite_with_rowid": False},
+    )
+
+    jti_hash = Column(LargeBinary(16), primary_key=True)
+    family_id = Column(LargeBinary(16), nullable=False)
+    user_id = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    # 轮换时置为使用时间，再次出现即视为重放
+    used_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class AccessSession(Base):
+    """引用型访问令牌对应的会话
+
+    主键为令牌的 16 字节摘要，不保存令牌本身。撤销即删除记录，过期后由后台任务批量删除。
+    """
+    __tablename__ = "access_sessions"
+    __table_args__ = (
+        Index("ix_access_sessions_expires_at", "expires_at"),
+        {"sqlite_with_rowid": False},
+    )
+
+    token_hash = Column(LargeBinary(16), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
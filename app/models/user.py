@@ -1,9 +1,10 @@
-from sqlalchemy import Column, String, Boolean, JSON, DateTime, ForeignKey, Table,Integer
+from sqlalchemy import Column, String, Boolean, JSON, DateTime, ForeignKey, Table,Integer, Index
+from sqlalchemy import event
 from sqlalchemy.orm import relationship
 import uuid
 from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
-from app.models.base import Base, user_role_link
+from app.models.base import Base, user_role_link, role_hierarchy, role_closure
 
 class Role(Base):
     __tablename__ = "roles"
@@ -17,22 +18,67 @@ class Role(Base):
 
     # 关系属性
     users = relationship("User", secondary=user_role_link, back_populates="roles")
+    # 继承关系只能通过 CRUD 修改，以便同步维护闭包表
+    parents = relationship(
+        "Role",
+        secondary=role_hierarchy,
+        primaryjoin=lambda: Role.id == role_hierarchy.c.child_id,
+        secondaryjoin=lambda: Role.id == role_hierarchy.c.parent_id,
+        viewonly=True,
+    )
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # 支持按创建时间稳定排序的分页
+        Index("ix_users_created_at_id", "created_at", "id"),
+        # 增量同步按 (updated_at, id) 游标读取
+        Index("ix_users_updated_at_id", "updated_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
-    is_active = Column(Boolean, default=True)
+    is_active = Column(Boolean, default=True, index=True)
     is_superuser = Column(Boolean, default=False)
+    # 角色分配或所属角色内容变化时递增，用于 UserDetailRead 的 ETag
+    roles_version = Column(Integer, default=0, nullable=False)
+    # 由 app.activity 延迟批量写入，不更新 updated_at
+    last_login_at = Column(DateTime, nullable=True)
+    last_seen_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
     # 关系属性
     roles = relationship("Role", secondary=user_role_link, back_populates="users")
+    # 有效角色：直接分配的角色及其全部祖先角色，经闭包表一次连接查出
+    effective_roles = relationship(
+        "Role",
+        secondary=user_role_link.join(role_closure, user_role_link.c.role_id == role_closure.c.descendant_id),
+        primaryjoin=lambda: User.id == user_role_link.c.user_id,
+        secondaryjoin=lambda: Role.id == role_closure.c.ancestor_id,
+        viewonly=True,
+    )
+
+    @property
+    def effective_permissions(self) -> List[str]:
+        """有效角色中的授权规则，去掉被拒绝规则完全覆盖的部分（与权限检查使用同一份规则）"""
+        from app.core.permissions import get_user_permissions
+        return sorted(get_user_permissions(self))
+
+    @property
+    def denied_permissions(self) -> List[str]:
+        """有效角色中的拒绝规则，优先于 effective_permissions"""
+        from app.core.permissions import get_user_denies
+        return sorted(get_user_denies(self))
+
+
+@event.listens_for(Role, "after_insert")
+def _insert_role_closure_self(mapper, connection, target):
+    # 新角色在闭包表中指向自身，有效角色查询无需区分直接与继承
+    connection.execute(role_closure.insert().values(ancestor_id=target.id, descendant_id=target.id, path_count=1))
 
 
 # 为了兼容现有代码，添加 UserRoleLink 类
@@ -40,3 +86,19 @@ class UserRoleLink:
     """用户角色关联类，用于 CRUD 操作中的类型提示"""
     user_id: int
     role_id: int
+
+
+class UserTombstone(Base):
+    """已删除用户的记录，与删除在同一事务中写入，供增量同步返回删除项
+
+    超过 USER_TOMBSTONE_RETENTION_DAYS 的记录由后台任务删除。启用分片时写入用户所在分片。
+    """
+    __tablename__ = "user_tombstones"
+    __table_args__ = (
+        # 增量同步按 (deleted_at, user_id) 游标读取，也用于按保留期清理
+        Index("ix_user_tombstones_deleted_at_user_id", "deleted_at", "user_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,70 @@
+"""后台定期重算列表总数计数器
+
+计数器由 CRUD 在同一事务中增减，正常情况下始终准确；直接写库、批量导入或
+并发更新造成的偏差由该任务每隔 COUNTER_RECONCILE_INTERVAL_SECONDS 秒修正。
+"""
+import logging
+import threading
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app import sharding
+from app.config.settings import settings, subscribe
+from app.crud.user import reconcile_counters
+
+logger = logging.getLogger(__name__)
+
+
+class CounterReconciler:
+    """在后台线程中定期执行 reconcile_counters"""
+
+    def __init__(self, interval: float, session_factory: Optional[Callable[[], Session]] = None):
+        self.interval = interval
+        self.session_factory = session_factory
+        self.runs = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="counter-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> None:
+        factory = self.session_factory
+        if factory is None:
+            from app.database import SessionLocal as factory
+        db = factory()
+        try:
+            reconcile_counters(db)
+            self.runs += 1
+        except Exception as e:
+            logger.error(f"重算计数器失败: {e}")
+        finally:
+            sharding.close_shard_sessions(db)
+            db.close()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+
+counter_reconciler = CounterReconciler(settings.COUNTER_RECONCILE_INTERVAL_SECONDS)
+
+
+@subscribe
+def _apply_settings(old, new, changed) -> None:
+    counter_reconciler.interval = new.COUNTER_RECONCILE_INTERVAL_SECONDS
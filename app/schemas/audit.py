@@ -0,0 +1,15 @@
+from pydantic import BaseModel, ConfigDict
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+# 审计事件响应模式
+class AuditEventRead(BaseModel):
+    id: int
+    event: str
+    actor_id: Optional[int] = None
+    subject_id: Optional[int] = None
+    ip: Optional[str] = None
+    detail: Dict[str, Any] = {}
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,6 +1,6 @@
 from pydantic import EmailStr, field_validator
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List, Dict, Literal
 
 class Token(BaseModel):
     access_token: str
@@ -11,6 +11,10 @@ class TokenPayload(BaseModel):
     sub: Optional[str] = None
     exp: int
     type: str
+    # 刷新令牌的唯一标识
+    jti: Optional[str] = None
+    # 签发时间（引用型令牌为会话创建时间），早于用户创建时间的令牌无效
+    iat: Optional[float] = None
 
 class LoginRequest(BaseModel):
     username: str
@@ -19,6 +23,28 @@ class LoginRequest(BaseModel):
 # 刷新令牌请求
 class RefreshRequest(BaseModel):
     refresh_token: str
+    # 新访问令牌的格式，省略时使用 ACCESS_TOKEN_FORMAT
+    token_format: Optional[Literal["jwt", "reference"]] = None
+
+# 批量授权判断请求
+class AuthorizeRequest(BaseModel):
+    permissions: List[str] = Field(default=[], max_length=100)
+    roles: List[str] = Field(default=[], max_length=100)
+
+class AuthorizeResponse(BaseModel):
+    permissions: Dict[str, bool] = {}
+    roles: Dict[str, bool] = {}
+
+# 令牌内省响应（RFC 7662）
+class IntrospectionResponse(BaseModel):
+    active: bool
+    sub: Optional[str] = None
+    exp: Optional[int] = None
+    scope: Optional[str] = None
+    # 拒绝规则（空格分隔），优先于 scope 中的授权，网关须一并判断
+    deny: Optional[str] = None
+    roles: Optional[List[str]] = None
+    token_type: Optional[str] = None
 
 
 class PasswordReset(BaseModel):
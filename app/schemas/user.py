@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, field_validator, ConfigDict
+from pydantic import BaseModel, EmailStr, Field, field_validator, ConfigDict
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -79,8 +79,45 @@ class UserRead(BaseModel):
 # 用户详细响应模式（包含角色）
 class UserDetailRead(UserRead):
     roles: List[RoleRead] = []
+    effective_permissions: List[str] = []
+    denied_permissions: List[str] = []
+    last_login_at: Optional[datetime] = None
+    last_seen_at: Optional[datetime] = None
 
     model_config = ConfigDict(from_attributes=True)
+# 用户搜索结果分页，next_cursor 为空表示没有更多结果
+class UserSearchPage(BaseModel):
+    items: List[UserRead]
+    next_cursor: Optional[int] = None
+
+# 按 ID 批量获取用户时单次请求的 ID 数上限
+USER_BATCH_MAX_IDS = 500
+
+# 按 ID 批量获取用户的请求
+class UserBatchGet(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=USER_BATCH_MAX_IDS)
+    include_roles: bool = False
+
+# 批量获取结果：items 按请求顺序排列（重复 ID 只返回一次），missing 为不存在的 ID
+class UserBatchItem(UserRead):
+    roles: Optional[List[RoleRead]] = None
+
+class UserBatchRead(BaseModel):
+    items: List[UserBatchItem]
+    missing: List[int] = []
+
+# 用户增量同步：deleted 为真时 user 为空；next_cursor 供下次请求的 since 使用
+class UserChange(BaseModel):
+    id: int
+    deleted: bool = False
+    changed_at: datetime
+    user: Optional[UserRead] = None
+
+class UserChangesPage(BaseModel):
+    items: List[UserChange]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
 # 角色带用户信息的模型
 class RoleWithUsers(RoleRead):
     users: List[UserReadWithoutRoles] = []
@@ -0,0 +1,96 @@
+"""把配置重新加载广播到同一主机上的所有 worker
+
+``uvicorn --workers N`` 下每个 worker 各有一份配置，SIGHUP 或管理接口只会落到其中一个进程。
+重新加载成功后，该进程在共享的代数文件中写入新的代数；各 worker 的后台线程每隔
+SETTINGS_RELOAD_POLL_INTERVAL_MS 毫秒读取一次，发现代数变化时各自重新读取环境变量和 .env。
+代数文件在本地临时目录中，不同主机上的实例需要各自触发重新加载。
+"""
+import logging
+import os
+import threading
+import uuid
+from typing import Optional
+
+from app.config.settings import SettingsReloadError, reload_settings, settings, subscribe
+from app.core.cache import default_cache_path
+
+logger = logging.getLogger(__name__)
+
+
+class SettingsWatcher:
+    """后台线程轮询共享的配置代数文件，代数变化时重新加载配置"""
+
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self.reloads = 0
+        self._generation = self._read()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        # 启动时的配置已是最新，之前的广播不再处理
+        self._generation = self._read()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="settings-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def publish(self) -> None:
+        """本进程重新加载成功后调用，通知其他 worker 重新加载"""
+        generation = uuid.uuid4().hex
+        # 先写临时文件再替换，其他进程不会读到写了一半的内容
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(generation)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error(f"广播配置重新加载失败: {e}")
+            return
+        self._generation = generation
+
+    def poll(self) -> bool:
+        """代数变化时重新加载配置，返回是否重新加载"""
+        generation = self._read()
+        if generation == self._generation:
+            return False
+        self._generation = generation
+        try:
+            changed = reload_settings()
+        except SettingsReloadError as e:
+            logger.error(f"按其他 worker 的广播重新加载配置被拒绝: {e}")
+            return False
+        self.reloads += 1
+        logger.info(f"按其他 worker 的广播重新加载配置，变更: {', '.join(sorted(changed)) or '无'}")
+        return True
+
+    def _read(self) -> str:
+        try:
+            with open(self.path) as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+
+settings_watcher = SettingsWatcher(default_cache_path("settings"), settings.SETTINGS_RELOAD_POLL_INTERVAL_MS / 1000)
+
+
+@subscribe
+def _apply_settings(old, new, changed) -> None:
+    settings_watcher.interval = new.SETTINGS_RELOAD_POLL_INTERVAL_MS / 1000
@@ -0,0 +1,270 @@
+"""按用户 ID 哈希分片的用户存储（可选）
+
+设置 SHARD_DATABASE_URLS（逗号分隔）后启用：
+- users 与 user_role_links 按用户 ID 的稳定哈希分布到各分片库；
+- 主库中的 user_directory 表分配全局用户 ID，并提供用户名/邮箱到 ID 的查找；
+- roles、role_hierarchy、role_closure 仍以主库为准，变更后把涉及的行复制到各分片，
+  使分片内的用户角色关系可以直接连接查询。
+
+未配置时所有函数退化为直接使用传入的主库会话。
+"""
+import hashlib
+import heapq
+import itertools
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, delete, insert, or_, select, true, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config.settings import settings
+from app.models.base import Base, user_role_link, role_hierarchy, role_closure, counters
+from app.db_stats import track_pool, track_sessions
+
+logger = logging.getLogger(__name__)
+
+# 全局目录只存在于主库，不属于 Base.metadata
+directory_metadata = MetaData()
+
+user_directory = Table(
+    "user_directory",
+    directory_metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("username", String, unique=True, nullable=False),
+    Column("email", String, unique=True, nullable=False),
+    sqlite_autoincrement=True,
+)
+
+
+def _shard_tables():
+    import app.models.user  # noqa: F401  确保模型已注册
+    import app.models.outbox  # noqa: F401
+    tables = Base.metadata.tables
+    return [tables["roles"], tables["users"], user_role_link, role_hierarchy, role_closure, counters,
+            tables["outbox_events"], tables["user_tombstones"]]
+
+
+def _reference_tables():
+    # 按外键依赖顺序排列，删除时逆序
+    return [Base.metadata.tables["roles"], role_hierarchy, role_closure]
+
+
+class ShardRouter:
+    """持有各分片的引擎和会话工厂"""
+
+    def __init__(self, urls: List[str]):
+        self.engines: List[Engine] = [
+            create_engine(
+                url,
+                echo=settings.DEBUG,
+                connect_args={"check_same_thread": False} if url.startswith("sqlite") else {},
+            )
+            for url in urls
+        ]
+        for engine in self.engines:
+            track_pool(engine)
+        self.sessionmakers = [
+            sessionmaker(autocommit=False, autoflush=False, bind=engine) for engine in self.engines
+        ]
+        for factory in self.sessionmakers:
+            track_sessions(factory)
+
+    def shard_for(self, user_id: int) -> int:
+        """用户 ID 的稳定哈希，不依赖进程的哈希随机化"""
+        digest = hashlib.blake2b(str(user_id).encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % len(self.engines)
+
+    def dispose(self) -> None:
+        for engine in self.engines:
+            engine.dispose()
+
+
+_router: Optional[ShardRouter] = None
+
+
+def parse_shard_urls(value: str) -> List[str]:
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+
+def configure_sharding(urls: List[str]) -> Optional[ShardRouter]:
+    """按给定的分片库地址启用分片，传入空列表则关闭"""
+    global _router
+    if _router is not None:
+        _router.dispose()
+    _router = ShardRouter(urls) if urls else None
+    return _router
+
+
+def enabled() -> bool:
+    return _router is not None
+
+
+def get_router() -> ShardRouter:
+    if _router is None:
+        raise RuntimeError("未启用用户分片")
+    return _router
+
+
+def create_shard_tables(primary: Engine) -> None:
+    """在主库创建全局目录，在各分片创建表并执行迁移"""
+    from app.migrations import run_migrations
+
+    router = get_router()
+    directory_metadata.create_all(bind=primary)
+    for engine in router.engines:
+        Base.metadata.create_all(bind=engine, tables=_shard_tables())
+        run_migrations(engine)
+    with primary.connect() as conn:
+        replicate_reference_tables(conn)
+
+
+configure_sharding(parse_shard_urls(settings.SHARD_DATABASE_URLS))
+
+
+# 会话路由
+def shard_session(db: Session, index: int) -> Session:
+    """获取与主库会话同生命周期的分片会话"""
+    sessions: Dict[int, Session] = db.info.setdefault("shard_sessions", {})
+    if index not in sessions:
+        sessions[index] = get_router().sessionmakers[index]()
+    return sessions[index]
+
+
+def close_shard_sessions(db: Session) -> None:
+    for session in db.info.pop("shard_sessions", {}).values():
+        session.close()
+
+
+def session_for_user(db: Session, user_id: int) -> Session:
+    """用户数据所在的会话，未启用分片时即主库会话"""
+    if _router is None:
+        return db
+    return shard_session(db, _router.shard_for(user_id))
+
+
+def sessions_for_users(db: Session, user_ids: Iterable[int]) -> List[Tuple[Session, List[int]]]:
+    """按所在会话分组用户 ID，每组可用一次 IN 查询"""
+    user_ids = list(user_ids)
+    if _router is None:
+        return [(db, user_ids)] if user_ids else []
+    groups: Dict[int, List[int]] = {}
+    for user_id in user_ids:
+        groups.setdefault(_router.shard_for(user_id), []).append(user_id)
+    return [(shard_session(db, index), ids) for index, ids in groups.items()]
+
+
+def user_sessions(db: Session) -> List[Session]:
+    """保存用户数据的全部会话"""
+    if _router is None:
+        return [db]
+    return [shard_session(db, i) for i in range(len(_router.engines))]
+
+
+def gather(db: Session, fetch: Callable[[Session], List[Any]], key: Callable[[Any], Any],
+           skip: int = 0, limit: Optional[int] = None) -> List[Any]:
+    """在各分片执行 fetch 并按 key 归并排序后分页
+
+    fetch 返回的结果须已按 key 排序，且至少包含前 skip + limit 条。
+    """
+    merged = heapq.merge(*(fetch(session) for session in user_sessions(db)), key=key)
+    stop = None if limit is None else skip + limit
+    return list(itertools.islice(merged, skip, stop))
+
+
+# 全局目录
+def allocate_user_id(db: Session, username: str, email: str) -> int:
+    """在全局目录中登记用户并分配 ID，用户名或邮箱重复时抛出 IntegrityError"""
+    result = db.execute(insert(user_directory).values(username=username, email=email))
+    db.commit()
+    return result.inserted_primary_key[0]
+
+
+def lookup_user_id(db: Session, username: Optional[str] = None, email: Optional[str] = None) -> Optional[int]:
+    """按用户名或邮箱查找用户 ID"""
+    stmt = select(user_directory.c.id)
+    if username is not None:
+        stmt = stmt.where(user_directory.c.username == username)
+    if email is not None:
+        stmt = stmt.where(user_directory.c.email == email)
+    return db.execute(stmt).scalar_one_or_none()
+
+
+def update_directory(db: Session, user_id: int, username: Optional[str] = None, email: Optional[str] = None) -> None:
+    values = {k: v for k, v in {"username": username, "email": email}.items() if v is not None}
+    if values:
+        db.execute(update(user_directory).where(user_directory.c.id == user_id).values(**values))
+        db.commit()
+
+
+def remove_from_directory(db: Session, user_id: int) -> None:
+    db.execute(delete(user_directory).where(user_directory.c.id == user_id))
+    db.commit()
+
+
+# 角色数据复制
+def _delete_removed(conn: Connection, table: Table, rows: List[Dict[str, Any]], where) -> None:
+    """删除分片中 where 范围内、主库中已不存在的行"""
+    key = table.primary_key.columns
+    kept = {tuple(row[column.name] for column in key) for row in rows}
+    removed = [tuple(row) for row in conn.execute(select(*key).where(where)) if tuple(row) not in kept]
+    if removed:
+        conn.execute(table.delete().where(tuple_(*key).in_(removed)))
+
+
+def _upsert_rows(conn: Connection, table: Table, rows: List[Dict[str, Any]]) -> None:
+    """按主键写入主库中的当前行，已存在时更新其余列"""
+    if not rows:
+        return
+    stmt = (postgresql_insert if conn.dialect.name == "postgresql" else sqlite_insert)(table)
+    keys = [column.name for column in table.primary_key.columns]
+    values = {column.name: stmt.excluded[column.name] for column in table.columns if column.name not in keys}
+    if values:
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_=values)
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+    conn.execute(stmt, rows)
+
+
+def _copy_reference_rows(db: Union[Session, Connection], where: Callable[[Table], Any]) -> None:
+    """把主库中 where 范围内的角色相关行复制到各分片
+
+    不整体删除后重插：分片启用外键约束时，仍被 user_role_links 引用的角色不能删除。
+    先按依赖逆序删除主库中已不存在的行（同时避免角色名唯一约束冲突），再按依赖顺序写入。
+    """
+    tables = _reference_tables()
+    data = {table.name: [dict(row) for row in db.execute(select(table).where(where(table))).mappings()] for table in tables}
+    for engine in get_router().engines:
+        with engine.begin() as conn:
+            for table in reversed(tables):
+                _delete_removed(conn, table, data[table.name], where(table))
+            for table in tables:
+                _upsert_rows(conn, table, data[table.name])
+    # 已加载的角色对象需要重新读取
+    for session in db.info.get("shard_sessions", {}).values():
+        session.expire_all()
+
+
+def replicate_reference_tables(db: Union[Session, Connection]) -> None:
+    """将主库中的角色相关表整表复制到各分片，用于初始化分片；之后的角色变更由 replicate_roles 增量复制"""
+    _copy_reference_rows(db, lambda table: true())
+
+
+def _role_predicate(table: Table, role_ids: List[int]):
+    # 行中任一角色列属于 role_ids
+    columns = ["id"] if table.name == "roles" else [c.name for c in table.columns if c.name.endswith("_id")]
+    return or_(*(table.c[name].in_(role_ids) for name in columns))
+
+
+def replicate_roles(db: Session, role_ids: Iterable[int]) -> None:
+    """只把涉及 role_ids 的角色、继承边和闭包行从主库复制到各分片
+
+    各分片中涉及这些角色的行与主库中的当前行一致（主库中已删除的随之删除），
+    其余角色数据保持不变；调用方负责传入本次变更影响到的全部角色。
+    """
+    role_ids = sorted(set(role_ids))
+    if not role_ids:
+        return
+    _copy_reference_rows(db, lambda table: _role_predicate(table, role_ids))
@@ -0,0 +1,77 @@
+"""后台分批删除已过期的刷新令牌和引用型访问令牌会话"""
+import logging
+import threading
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings, subscribe
+from app.crud.token import sweep_expired_access_sessions, sweep_expired_refresh_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class TokenSweeper:
+    """每隔 interval 秒分批删除过期令牌，批与批之间让出写锁"""
+
+    def __init__(self, interval: float, batch_size: int, pause: float = 0.05,
+                 session_factory: Optional[Callable[[], Session]] = None):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.session_factory = session_factory
+        self.deleted = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def sweep(self) -> int:
+        """删除全部已过期的令牌，返回删除数"""
+        factory = self.session_factory
+        if factory is None:
+            from app.database import SessionLocal as factory
+        db = factory()
+        total = 0
+        try:
+            for sweep_batch in (sweep_expired_refresh_tokens, sweep_expired_access_sessions):
+                while not self._stop.is_set():
+                    deleted = sweep_batch(db, self.batch_size)
+                    total += deleted
+                    if deleted < self.batch_size:
+                        break
+                    self._stop.wait(self.pause)
+        except Exception as e:
+            logger.error(f"清理过期令牌失败: {e}")
+        finally:
+            db.close()
+        self.deleted += total
+        return total
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sweep()
+
+
+token_sweeper = TokenSweeper(settings.REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS, settings.REFRESH_TOKEN_SWEEP_BATCH_SIZE)
+
+
+@subscribe
+def _apply_settings(old, new, changed) -> None:
+    token_sweeper.interval = new.REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS
+    token_sweeper.batch_size = new.REFRESH_TOKEN_SWEEP_BATCH_SIZE
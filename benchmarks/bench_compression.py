@@ -0,0 +1,32 @@
+"""比较各压缩编码在真实列表响应上的 CPU 耗时与节省的字节数"""
+import orjson
+
+from app.compression import available_encodings, make_compressor
+from app.crud.user import get_user_rows, get_role_user_rows
+from benchmarks.common import make_client, timeit
+from benchmarks.dataset import generate
+
+def compress(encoding: str, body: bytes) -> bytes:
+    compressor = make_compressor(encoding)
+    return compressor.compress(body) + compressor.finish()
+
+def main() -> None:
+    client, session = make_client()
+    generate(session.get_bind(), users=20_000, roles=200, templates=1, log=lambda message: None)
+
+    payloads = {
+        "GET /api/users/?limit=100": orjson.dumps(get_user_rows(session, limit=100)),
+        "GET /api/users/?limit=1000": orjson.dumps(get_user_rows(session, limit=1000)),
+        "GET /api/roles/1/users": orjson.dumps(get_role_user_rows(session, 1)),
+    }
+    print(f"{'payload':<30} {'encoding':<8} {'bytes':>10} {'ratio':>7} {'us':>10} {'us/KB':>7}")
+    for name, body in payloads.items():
+        print(f"{name:<30} {'identity':<8} {len(body):>10}")
+        for encoding in available_encodings():
+            size = len(compress(encoding, body))
+            micros = timeit(lambda: compress(encoding, body), 20)
+            print(f"{'':<30} {encoding:<8} {size:>10} {size / len(body):>7.1%} {micros:>10.1f} "
+                  f"{micros / (len(body) / 1024):>7.1f}")
+
+if __name__ == "__main__":
+    main()
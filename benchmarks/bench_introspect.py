@@ -0,0 +1,24 @@
+"""比较网关校验令牌时 /users/me 与内省接口的开销"""
+from app.core.security import get_password_hash
+from app.models.user import User, Role
+from benchmarks.common import make_client, timeit, report
+
+def main(number: int = 500) -> None:
+    client, session = make_client()
+    roles = [Role(name=f"role{i}", permissions={"permissions": [f"res{i}:read", f"res{i}:write"]}) for i in range(10)]
+    user = User(username="bench", email="bench@example.com",
+                hashed_password=get_password_hash("benchpassword"), is_active=True, roles=roles)
+    session.add(user)
+    session.commit()
+
+    token = client.post("/api/auth/login", data={"username": "bench", "password": "benchpassword"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    etag = client.get("/api/auth/introspect", headers=headers).headers["ETag"]
+
+    report("GET /api/users/me", timeit(lambda: client.get("/api/users/me", headers=headers), number))
+    report("GET /api/auth/introspect", timeit(lambda: client.get("/api/auth/introspect", headers=headers), number))
+    report("GET /api/auth/introspect (304)", timeit(
+        lambda: client.get("/api/auth/introspect", headers={**headers, "If-None-Match": etag}), number))
+
+if __name__ == "__main__":
+    main()
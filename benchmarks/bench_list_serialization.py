@@ -0,0 +1,39 @@
+"""比较列表接口默认序列化路径与列投影 + orjson 快速路径"""
+from datetime import datetime, timezone
+from typing import List
+
+import orjson
+from pydantic import TypeAdapter
+
+from app.crud.user import get_users, get_user_rows
+from app.models.user import User
+from app.schemas.user import UserRead
+from benchmarks.common import make_client, timeit, report
+
+def main(sizes=(100, 1_000, 10_000)) -> None:
+    client, session = make_client()
+    now = datetime.now(timezone.utc)
+    session.execute(User.__table__.insert(), [
+        {"username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x",
+         "is_active": True, "is_superuser": False, "created_at": now, "updated_at": now}
+        for i in range(max(sizes))
+    ])
+    session.commit()
+
+    adapter = TypeAdapter(List[UserRead])
+
+    def orm_path(n: int) -> bytes:
+        # 与 response_model 相同：ORM 实体 -> 校验 -> 序列化
+        session.expunge_all()
+        return adapter.dump_json(adapter.validate_python(get_users(session, limit=n), from_attributes=True))
+
+    def fast_path(n: int) -> bytes:
+        return orjson.dumps(get_user_rows(session, limit=n))
+
+    for n in sizes:
+        number = max(3, 20_000 // n)
+        report(f"{n:>6} rows  ORM + response_model", timeit(lambda: orm_path(n), number))
+        report(f"{n:>6} rows  column projection + orjson", timeit(lambda: fast_path(n), number))
+
+if __name__ == "__main__":
+    main()
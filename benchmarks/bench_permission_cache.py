@@ -0,0 +1,53 @@
+"""比较用户有效角色的权限解析：不缓存（每次查询有效角色）、进程内 LRU、共享内存映射文件"""
+import os
+import tempfile
+
+from sqlalchemy.orm import Session
+
+from app.core import permissions
+from app.core.cache import MemoryCache, MmapCache
+from app.crud.user import add_role_parent, assign_role_to_user, create_role, create_user, get_user
+from app.schemas.user import UserCreate
+from benchmarks.common import make_client, report, timeit
+
+class _NoCache(MemoryCache):
+    def get(self, key, version):
+        return None
+
+    def set(self, key, version, value):
+        pass
+
+def _setup(session: Session, roles: int) -> int:
+    user = create_user(session, UserCreate(username="benchuser", email="bench@example.com",
+                                           password="benchpass", password_confirm="benchpass"))
+    parent = None
+    for i in range(roles):
+        role = create_role(session, f"role{i}", permissions={"permissions": [f"res{i}:read", f"res{i}:write"]})
+        if parent is not None:
+            add_role_parent(session, role.id, parent.id)
+        parent = role
+    # 只直接分配最末端的角色，其余通过继承获得
+    assign_role_to_user(session, user.id, parent.id)
+    return user.id
+
+def main(roles: int = 20, number: int = 5_000) -> None:
+    _, session = make_client()
+    user_id = _setup(session, roles)
+    path = os.path.join(tempfile.mkdtemp(), "permissions.cache")
+    backends = [("none", _NoCache(1)), ("memory", MemoryCache(1024)), ("mmap", MmapCache(path, 1024, 4096))]
+
+    for name, cache in backends:
+        permissions.permission_cache = cache
+
+        def check():
+            # 每个请求都会重新加载用户，有效角色关系需要重新查询
+            user = get_user(session, user_id)
+            session.expire(user)
+            return permissions.get_permission_checker(user).allows("res0:read")
+
+        assert check()
+        report(f"{roles} inherited roles  {name}", timeit(check, number))
+        print(f"    {cache.stats()}")
+
+if __name__ == "__main__":
+    main()
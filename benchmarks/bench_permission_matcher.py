@@ -0,0 +1,19 @@
+"""比较按列表线性查找权限与编译后的前缀树匹配"""
+from app.core.matcher import PermissionMatcher
+from benchmarks.common import timeit, report
+
+def main(sizes=(10, 1_000, 10_000), number: int = 20_000) -> None:
+    for n in sizes:
+        grants = [f"resource{i}:action{i % 7}" for i in range(n)]
+        # 最坏情况：要检查的权限位于列表末尾 / 不存在
+        hit, miss = grants[-1], "missing:action"
+        matcher = PermissionMatcher(grants, ["resource0:delete"])
+
+        report(f"{n:>6} grants  compile", timeit(lambda: PermissionMatcher(grants), max(3, 20_000 // n)))
+        report(f"{n:>6} grants  linear scan (hit)", timeit(lambda: hit in grants, number))
+        report(f"{n:>6} grants  linear scan (miss)", timeit(lambda: miss in grants, number))
+        report(f"{n:>6} grants  trie (hit)", timeit(lambda: matcher.allows(hit), number))
+        report(f"{n:>6} grants  trie (miss)", timeit(lambda: matcher.allows(miss), number))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""比较访问令牌的解析开销：JWT 验签解码、引用型令牌（缓存命中 / 查询会话表），以及请求头大小"""
+from datetime import timedelta
+
+from app.core import reference_tokens
+from app.core.cache import MemoryCache
+from app.core.permissions import decode_access_token
+from app.core.reference_tokens import create_reference_token, resolve_reference_token
+from app.core.security import create_access_token
+from app.crud.user import create_user
+from app.schemas.user import UserCreate
+from benchmarks.common import make_client, report, timeit
+
+class _NoCache(MemoryCache):
+    def get(self, key, version):
+        return None
+
+    def set(self, key, version, value):
+        pass
+
+def main(number: int = 20_000) -> None:
+    client, session = make_client()
+    user = create_user(session, UserCreate(username="bench", email="bench@example.com",
+                                           password="benchpassword", password_confirm="benchpassword"))
+    expires = timedelta(minutes=30)
+    jwt_token = create_access_token(subject=str(user.id), expires_delta=expires)
+    reference_tokens.session_cache = MemoryCache(1024)
+    reference_token = create_reference_token(session, user.id, expires)
+
+    print(f"Authorization header: jwt {len('Bearer ' + jwt_token)} bytes, "
+          f"reference {len('Bearer ' + reference_token)} bytes")
+    report("jwt decode", timeit(lambda: decode_access_token(jwt_token), number))
+    report("reference (cache hit)", timeit(lambda: resolve_reference_token(session, reference_token), number))
+    reference_tokens.session_cache = _NoCache(1)
+    report("reference (session table)", timeit(lambda: resolve_reference_token(session, reference_token), number))
+
+    # 端到端请求：两种令牌都需要加载用户
+    reference_tokens.session_cache = MemoryCache(1024)
+    for name, token in (("jwt", jwt_token), ("reference", reference_token)):
+        headers = {"Authorization": f"Bearer {token}"}
+        report(f"GET /api/users/me  {name}", timeit(lambda: client.get("/api/users/me", headers=headers), number // 20))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""在大数据量下测量用户搜索延迟
+
+默认用 benchmarks.dataset 生成 1,000,000 个用户的文件数据库，可通过参数调整：
+
+    python -m benchmarks.bench_user_search 200000
+"""
+import os
+import sys
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.crud.user import search_user_rows
+from benchmarks.common import timeit, report
+from benchmarks.dataset import generate
+
+# 每次搜索的目标延迟（微秒）
+TARGET_US = 50_000
+
+def main(total: int = 1_000_000) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "search.db")
+    engine = create_engine(f"sqlite:///{path}")
+    generate(engine, users=total, roles=1000, log=lambda message: None)
+
+    session = Session(engine)
+    cases = [
+        ("rare substring", dict(q="r0123456")),
+        ("rare prefix", dict(q="user012345", prefix=True)),
+        ("common substring, first page", dict(q="example.org")),
+        ("common substring + is_active=False", dict(q="example.org", is_active=False)),
+        ("common substring + most common role", dict(q="example.org", role_id=1)),
+        ("short query, no match (full scan)", dict(q="u9")),
+    ]
+    print(f"{total} users, target {TARGET_US / 1000:.0f} ms per search")
+    for name, kwargs in cases:
+        micros = timeit(lambda: search_user_rows(session, limit=50, **kwargs), 20)
+        report(f"{name}{'' if micros <= TARGET_US else '  (over target)'}", micros)
+    session.close()
+    engine.dispose()
+    os.remove(path)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
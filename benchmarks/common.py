@@ -0,0 +1,38 @@
+import logging
+import time
+from typing import Callable, Tuple
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.main import app
+from app.database import get_session
+from app.models.base import Base
+
+# 避免每个请求的访问日志干扰计时
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+def make_client() -> Tuple[TestClient, Session]:
+    """创建使用内存数据库的测试客户端"""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    app.dependency_overrides[get_session] = lambda: session
+    return TestClient(app), session
+
+def timeit(fn: Callable[[], object], number: int) -> float:
+    """返回每次调用的平均耗时（微秒）"""
+    fn()
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number * 1e6
+
+def report(name: str, micros: float) -> None:
+    print(f"{name:<48} {micros:>12.1f} us")
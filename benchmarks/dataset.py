@@ -0,0 +1,177 @@
+"""生成大规模测试数据库
+
+按随机种子生成可复现的用户、角色和角色分配，用于在接近生产的数据量下测量
+列表、搜索、权限检查等接口：
+
+    python -m benchmarks.dataset --url sqlite:///./scale.db --users 1000000 --roles 2000 --seed 42
+
+- 密码哈希只按 --hash-templates 个模板计算（bcrypt 默认强度，盐由种子决定），
+  用户 i 的密码为 password{i % 模板数}，可直接登录；
+- 每个用户分配的角色数服从几何分布，角色按 Zipf 分布被选中，少数角色拥有大部分成员；
+- 部分角色继承一个编号更小的角色，闭包表随之生成；
+- 数据通过批量 INSERT 写入空库后再执行迁移，由迁移建立搜索索引并初始化计数器。
+
+只写入单个数据库，不支持分片模式。
+"""
+import argparse
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.engine import Engine
+
+from app.core.security import pwd_context
+from app.migrations import run_migrations
+from app.models.base import Base, user_role_link, role_hierarchy, role_closure
+from app.models.user import User, Role
+
+CHUNK = 50_000
+SALT_ALPHABET = "./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+RESOURCES = ["user", "role", "profile", "report", "billing", "audit", "project", "invoice", "ticket", "file"]
+ACTIONS = ["read", "create", "update", "delete", "export", "manage"]
+DOMAINS = ["example.com", "example.org", "mail.example.com", "corp.example.net", "example.io"]
+
+
+def hash_templates(count: int, rng: random.Random) -> List[str]:
+    """计算 password0..password{count-1} 的 bcrypt 哈希，盐取自 rng 以保证可复现"""
+    handler = pwd_context.handler("bcrypt")
+    hashes = []
+    for i in range(count):
+        # bcrypt 盐为 22 个字符，最后一个字符只能取这四个值之一
+        salt = "".join(rng.choice(SALT_ALPHABET) for _ in range(21)) + rng.choice(".Oeu")
+        hashes.append(handler.using(salt=salt).hash(f"password{i}"))
+    return hashes
+
+
+def role_rows(count: int, inherit: float, rng: random.Random, now: datetime):
+    """生成角色、继承边和闭包；每个角色至多一个父角色，因此闭包路径数均为 1"""
+    roles, edges, closure = [], [], []
+    ancestors: Dict[int, List[int]] = {}
+    for role_id in range(1, count + 1):
+        grants = rng.sample([f"{r}:{a}" for r in RESOURCES for a in ACTIONS], rng.randint(1, 6))
+        if rng.random() < 0.1:
+            grants.append(f"{rng.choice(RESOURCES)}:*")
+        rules = {"permissions": grants}
+        if rng.random() < 0.05:
+            rules["deny"] = [f"{rng.choice(RESOURCES)}:delete"]
+        roles.append({"id": role_id, "name": f"role{role_id:05d}", "description": f"生成的角色 {role_id}",
+                      "permissions": rules, "created_at": now, "updated_at": now})
+
+        parent = rng.randint(1, role_id - 1) if role_id > 1 and rng.random() < inherit else None
+        ancestors[role_id] = [role_id] + (ancestors[parent] if parent else [])
+        if parent:
+            edges.append({"parent_id": parent, "child_id": role_id})
+        closure.extend({"ancestor_id": a, "descendant_id": role_id, "path_count": 1} for a in ancestors[role_id])
+    return roles, edges, closure
+
+
+def zipf_sampler(count: int, skew: float, rng: random.Random):
+    """按 Zipf 分布选取角色 ID，编号越小的角色越常被选中"""
+    cumulative = list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, count + 1)))
+    population = range(1, count + 1)
+    return lambda k: set(rng.choices(population, cum_weights=cumulative, k=k))
+
+
+def user_chunks(total: int, hashes: List[str], rng: random.Random, now: datetime) -> Iterator[List[dict]]:
+    for start in range(1, total + 1, CHUNK):
+        rows = []
+        for user_id in range(start, min(start + CHUNK, total + 1)):
+            created = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+            rows.append({
+                "id": user_id,
+                "username": f"user{user_id:07d}",
+                "email": f"user{user_id:07d}@{rng.choice(DOMAINS)}",
+                "hashed_password": hashes[user_id % len(hashes)],
+                "is_active": rng.random() < 0.95,
+                "is_superuser": user_id == 1,
+                "roles_version": 0,
+                "created_at": created,
+                "updated_at": created,
+            })
+        yield rows
+
+
+def _fast_sqlite(engine: Engine) -> None:
+    # 仅用于一次性导入：关闭日志和同步，导入中断时数据库需要重新生成
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=OFF")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.close()
+
+
+def generate(engine: Engine, users: int = 1_000_000, roles: int = 1000, seed: int = 42,
+             mean_roles: float = 2.0, skew: float = 1.1, inherit: float = 0.3,
+             templates: int = 8, log=print) -> Dict[str, int]:
+    """向空数据库写入测试数据，返回各表写入的行数"""
+    rng = random.Random(seed)
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    Base.metadata.create_all(engine)
+    with engine.connect() as conn:
+        if conn.execute(select(func.count()).select_from(User.__table__)).scalar():
+            raise ValueError("目标数据库中已有用户，请使用空数据库")
+
+    started = time.perf_counter()
+    hashes = hash_templates(templates, rng)
+    log(f"计算 {templates} 个密码哈希模板: {time.perf_counter() - started:.1f}s")
+
+    role_data, edges, closure = role_rows(roles, inherit, rng, now)
+    with engine.begin() as conn:
+        conn.execute(Role.__table__.insert(), role_data)
+        if edges:
+            conn.execute(role_hierarchy.insert(), edges)
+        conn.execute(role_closure.insert(), closure)
+
+    pick_roles = zipf_sampler(roles, skew, rng)
+    # 几何分布：P(k) = p(1-p)^k，均值 (1-p)/p = mean_roles
+    p = 1 / (1 + mean_roles)
+    links = 0
+    for chunk in user_chunks(users, hashes, rng, now):
+        link_rows = []
+        for row in chunk:
+            k = 0
+            while rng.random() > p:
+                k += 1
+            link_rows.extend({"user_id": row["id"], "role_id": r, "assigned_at": row["created_at"]}
+                             for r in pick_roles(min(k, roles)))
+        with engine.begin() as conn:
+            conn.execute(User.__table__.insert(), chunk)
+            if link_rows:
+                conn.execute(user_role_link.insert(), link_rows)
+        links += len(link_rows)
+        log(f"已写入 {chunk[-1]['id']} 个用户: {time.perf_counter() - started:.1f}s")
+
+    # 迁移为已有数据建立搜索索引、初始化计数器
+    run_migrations(engine)
+    log(f"完成: {time.perf_counter() - started:.1f}s")
+    return {"users": users, "roles": roles, "role_hierarchy": len(edges),
+            "role_closure": len(closure), "user_role_links": links}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="生成大规模测试数据库")
+    parser.add_argument("--url", default="sqlite:///./scale.db", help="目标数据库地址（须为空库）")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--roles", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mean-roles", type=float, default=2.0, help="每个用户的平均角色数")
+    parser.add_argument("--skew", type=float, default=1.1, help="角色成员分布的 Zipf 指数")
+    parser.add_argument("--inherit", type=float, default=0.3, help="继承父角色的角色比例")
+    parser.add_argument("--hash-templates", type=int, default=8, help="预先计算的密码哈希数")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url)
+    if args.url.startswith("sqlite"):
+        _fast_sqlite(engine)
+    counts = generate(engine, users=args.users, roles=args.roles, seed=args.seed, mean_roles=args.mean_roles,
+                      skew=args.skew, inherit=args.inherit, templates=args.hash_templates)
+    for table, count in counts.items():
+        print(f"{table:<20} {count:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@
 import os
 import sys
 
-def setup_database():
+def setup_database(reset: bool = False):
     # 先清理任何 alembic 相关的文件
     if os.path.exists('alembic'):
         import shutil
@@ -12,13 +12,13 @@ def setup_database():
     if os.path.exists('alembic.ini'):
         os.remove('alembic.ini')
 
-    # 如果存在旧的数据库文件，则删除
-    if os.path.exists('sql_app.db'):
+    # 仅在显式要求时删除旧的数据库文件，默认原地升级
+    if reset and os.path.exists('sql_app.db'):
         os.remove('sql_app.db')
 
-    # 导入数据库模块并创建表
+    # 导入数据库模块并创建表、执行迁移
     try:
-        print("正在创建数据库和表结构...")
+        print("正在创建数据库并执行迁移...")
         from app.database import create_db_and_tables
         create_db_and_tables()
         print("数据库和表结构创建成功!")
@@ -29,7 +29,7 @@ def setup_database():
     return True
 
 if __name__ == "__main__":
-    if setup_database():
+    if setup_database(reset="--reset" in sys.argv[1:]):
         print("\n设置完成! 现在可以运行应用:")
         print("python main.py")
     else:
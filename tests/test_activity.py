@@ -0,0 +1,52 @@
+import pytest
+
+from app.activity import ActivityTracker, activity_tracker
+from app.models.user import User
+
+@pytest.fixture(name="tracker")
+def tracker_fixture(session):
+    return ActivityTracker(interval=60, engine=session.get_bind())
+
+def test_flush_writes_login_and_seen(session, test_user, tracker):
+    # 测试登录和活动时间在刷新时批量写入，且不修改 updated_at
+    updated_at = test_user.updated_at
+    tracker.login(test_user.id)
+    assert tracker.pending == 1
+    assert tracker.flush() == 1
+    assert tracker.pending == 0
+
+    session.expire_all()
+    user = session.get(User, test_user.id)
+    assert user.last_login_at is not None
+    assert user.last_seen_at == user.last_login_at
+    assert user.updated_at == updated_at
+
+def test_seen_is_coalesced_within_interval(session, test_user, test_admin, tracker):
+    # 测试同一用户在一个间隔内只记录一次活动
+    tracker.seen(test_user.id)
+    tracker.flush()
+    tracker.seen(test_user.id)
+    tracker.seen(test_admin.id)
+    assert tracker.pending == 1
+
+    tracker.flush()
+    session.expire_all()
+    assert session.get(User, test_admin.id).last_seen_at is not None
+    assert session.get(User, test_user.id).last_login_at is None
+
+def test_stop_flushes_pending(session, test_user, tracker):
+    # 测试停止时写入尚未刷新的活动时间
+    tracker.start()
+    tracker.seen(test_user.id)
+    tracker.stop()
+    session.expire_all()
+    assert session.get(User, test_user.id).last_seen_at is not None
+
+def test_login_and_requests_are_tracked(client, test_user):
+    # 测试登录和认证请求只记录在内存中
+    response = client.post("/api/auth/login", data={"username": "testuser", "password": "testpassword"})
+    token = response.json()["access_token"]
+    assert activity_tracker._pending[test_user.id]["login"] is not None
+
+    client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert test_user.id in activity_tracker._pending
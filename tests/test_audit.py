@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.audit import AuditLog, audit_log
+from app.models.audit import AuditEvent
+
+@pytest.fixture(name="audit")
+def audit_fixture(session):
+    return AuditLog(engine=session.get_bind(), max_queue=10, batch_size=4, flush_interval=0.05)
+
+def test_events_are_written_in_batches(session, audit):
+    # 测试事件先入队，刷新时批量写入
+    for i in range(6):
+        assert audit.record("login", actor_id=i, ip="127.0.0.1")
+    assert session.execute(select(AuditEvent)).first() is None
+
+    assert audit.flush() == 6
+    events = session.execute(select(AuditEvent).order_by(AuditEvent.id)).scalars().all()
+    assert [e.actor_id for e in events] == list(range(6))
+    assert audit.written == 6
+    assert audit.queue_depth == 0
+
+def test_background_flusher_and_stop_drain(session, audit):
+    # 测试后台线程写入，停止时写入剩余事件
+    audit.start()
+    for i in range(3):
+        audit.record("register", subject_id=i)
+    audit.stop()
+    assert not audit.running
+    assert audit.written == 3
+    assert len(session.execute(select(AuditEvent)).all()) == 3
+
+def test_drop_policy_counts_overflow(session):
+    # 测试队列满时丢弃并计数
+    audit = AuditLog(engine=session.get_bind(), max_queue=2)
+    assert audit.record("login")
+    assert audit.record("login")
+    assert not audit.record("login")
+    assert audit.dropped == 1
+
+def test_block_policy_times_out(session):
+    # 测试 block 策略在等待超时后丢弃
+    audit = AuditLog(engine=session.get_bind(), max_queue=1, overflow_policy="block", block_timeout=0.01)
+    assert audit.record("login")
+    assert not audit.record("login")
+    assert audit.dropped == 1
+
+def test_async_block_policy_keeps_loop_running(session):
+    # 测试异步记录在队列满时于线程池中等待，事件循环在等待期间继续运行
+    audit = AuditLog(engine=session.get_bind(), max_queue=1, overflow_policy="block", block_timeout=0.2)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(1)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        task = asyncio.create_task(ticker())
+        assert await audit.arecord("login")
+        assert not await audit.arecord("login")
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert len(ticks) >= 5
+    assert (audit.enqueued, audit.dropped) == (1, 1)
+
+def test_invalid_overflow_policy():
+    with pytest.raises(ValueError):
+        AuditLog(overflow_policy="spill")
+
+def test_auth_events_are_recorded(client, test_user):
+    # 测试登录与登录失败都会记录审计事件
+    before = audit_log.enqueued
+    client.post("/api/auth/login", data={"username": "testuser", "password": "wrong"})
+    client.post("/api/auth/login", data={"username": "testuser", "password": "testpassword"})
+    assert audit_log.enqueued == before + 2
+
+def test_read_audit_events(client, session, test_user, admin_token, audit):
+    # 测试按事件类型分页查询审计日志
+    audit.record("login", actor_id=test_user.id)
+    audit.record("role_grant", actor_id=1, subject_id=test_user.id, role_id=3)
+    audit.record("login", actor_id=test_user.id)
+    audit.flush()
+
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.get("/api/audit/", params={"event": "login"}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 2
+    assert data[0]["id"] > data[1]["id"]
+
+    response = client.get("/api/audit/", params={"subject_id": test_user.id}, headers=headers)
+    assert response.json()[0]["detail"] == {"role_id": 3}
+
+def test_read_audit_events_requires_permission(client, user_token):
+    # 测试普通用户无法查询审计日志
+    response = client.get("/api/audit/", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
@@ -1,7 +1,18 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
 
-from app.models.user import User
+from app.crud.outbox import outbox_events
+from app.crud.user import _duplicate_user_message, get_counters, register_user
+from app.models.base import Base
+from app.models.user import User, Role
+from app.schemas.user import UserCreate
+from app.config.settings import settings
 
 def test_register_user(client: TestClient):
     # 测试注册新用户
@@ -48,6 +59,81 @@ def test_register_duplicate_email(client: TestClient, test_user: User):
     assert response.status_code == 400
     assert "邮箱已被注册" in response.json()["detail"]
 
+def test_register_is_single_insert(client: TestClient, session: Session):
+    # 测试注册不预先查询用户名和邮箱、提交后不重新读取，用户只写入一条 INSERT ... RETURNING
+    statements = []
+    engine = session.get_bind()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.post("/api/auth/register", json={
+            "username": "single", "email": "single@example.com",
+            "password": "newpassword", "password_confirm": "newpassword",
+        })
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 201
+    assert response.json()["username"] == "single"
+    assert not any(s.lstrip().upper().startswith("SELECT") for s in statements)
+    inserts = [s for s in statements if s.startswith("INSERT INTO users ")]
+    assert len(inserts) == 1 and "RETURNING" in inserts[0]
+    assert get_counters(session, ["users"]) == {"users": 1}
+
+class _PostgresError(Exception):
+    # 模拟 psycopg 的异常：约束名在 diag.constraint_name 中
+    def __init__(self, message, constraint_name):
+        super().__init__(message)
+        self.diag = type("Diag", (), {"constraint_name": constraint_name})()
+
+@pytest.mark.parametrize("orig, message", [
+    (Exception("UNIQUE constraint failed: users.username"), "用户名已被使用"),
+    (Exception("UNIQUE constraint failed: user_directory.email"), "邮箱已被注册"),
+    (_PostgresError('duplicate key value violates unique constraint "ix_users_email" (username)', "ix_users_email"),
+     "邮箱已被注册"),
+    # 其他约束即使消息中出现列名也不当作重复注册
+    (Exception("NOT NULL constraint failed: users.username"), None),
+    (_PostgresError("violates check constraint on email", "ck_users_email_format"), None),
+])
+def test_duplicate_message_matches_constraint_name(orig, message):
+    assert _duplicate_user_message(IntegrityError("INSERT", {}, orig)) == message
+
+@pytest.mark.parametrize("field, message", [("username", "用户名已被使用"), ("email", "邮箱已被注册")])
+def test_concurrent_duplicate_registration(tmp_path, field, message):
+    # 测试同一用户名/邮箱并发注册时只有一个成功，其余得到对应的提示，计数器和事件不重复
+    engine = create_engine(f"sqlite:///{tmp_path}/register.db", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    workers = 8
+    barrier = threading.Barrier(workers)
+
+    def attempt(i):
+        values = {"username": f"racer{i}", "email": f"racer{i}@example.com"}
+        values[field] = "racer@example.com" if field == "email" else "racer"
+        db = factory()
+        try:
+            barrier.wait()
+            return register_user(db, UserCreate(**values, password="password123", password_confirm="password123"),
+                                 "hashed")
+        except ValueError as e:
+            return str(e)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(workers) as pool:
+        results = list(pool.map(attempt, range(workers)))
+
+    assert len([r for r in results if isinstance(r, dict)]) == 1
+    assert [r for r in results if not isinstance(r, dict)] == [message] * (workers - 1)
+    with factory() as db:
+        assert db.execute(select(func.count()).select_from(User)).scalar() == 1
+        assert get_counters(db, ["users", "users_active"]) == {"users": 1, "users_active": 1}
+        assert db.execute(select(func.count()).select_from(outbox_events)).scalar() == 1
+    engine.dispose()
+
 def test_login_success(client: TestClient, test_user: User):
     # 测试登录成功
     response = client.post(
@@ -101,3 +187,82 @@ def test_refresh_token(client: TestClient, test_user: User):
     assert "access_token" in data
     assert "refresh_token" in data
     assert data["token_type"] == "bearer"
+
+def test_authorize_batch(client: TestClient, session: Session, test_user: User, test_role: Role, user_token: str):
+    # 为用户分配测试角色
+    test_user.roles.append(test_role)
+    session.commit()
+
+    # 测试一次请求判断多个权限和角色
+    response = client.post(
+        "/api/auth/authorize",
+        headers={"Authorization": f"Bearer {user_token}"},
+        json={
+            "permissions": ["test:permission", "user:manage"],
+            "roles": ["testrole", "admin"]
+        }
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["permissions"] == {"test:permission": True, "user:manage": False}
+    assert data["roles"] == {"testrole": True, "admin": False}
+
+def test_authorize_superuser(client: TestClient, admin_token: str):
+    # 测试超级管理员拥有所有权限
+    response = client.post(
+        "/api/auth/authorize",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"permissions": ["anything:at-all"]}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"permissions": {"anything:at-all": True}, "roles": {}}
+
+def test_authorize_requires_login(client: TestClient):
+    # 测试未登录时拒绝请求
+    response = client.post("/api/auth/authorize", json={"permissions": ["user:manage"]})
+    assert response.status_code == 401
+
+def test_introspect_active_token(client: TestClient, session: Session, test_user: User, test_role: Role,
+                                 user_token: str, admin_token: str):
+    test_user.roles.append(test_role)
+    session.commit()
+
+    # 测试内省有效令牌（调用方以管理员身份认证）
+    response = client.post("/api/auth/introspect", data={"token": user_token},
+                           headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["active"] is True
+    assert data["sub"] == str(test_user.id)
+    assert data["scope"] == "test:permission"
+    assert data["roles"] == ["testrole"]
+    assert "ETag" in response.headers
+    max_age = int(response.headers["Cache-Control"].split("=")[1])
+    assert 0 < max_age <= settings.INTROSPECTION_MAX_AGE_SECONDS
+
+def test_introspect_not_modified(client: TestClient, user_token: str):
+    # 测试 If-None-Match 命中时返回 304
+    headers = {"Authorization": f"Bearer {user_token}"}
+    response = client.get("/api/auth/introspect", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get("/api/auth/introspect", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+def test_introspect_requires_client_authentication(client: TestClient, user_token: str):
+    # 测试表单内省要求调用方认证且拥有 token:introspect 权限
+    response = client.post("/api/auth/introspect", data={"token": user_token})
+    assert response.status_code == 401
+    response = client.post("/api/auth/introspect", data={"token": user_token},
+                           headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+
+def test_introspect_invalid_token(client: TestClient, admin_token: str):
+    # 测试无效令牌返回 active=false 且不缓存
+    response = client.post("/api/auth/introspect", data={"token": "not-a-token"},
+                           headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    assert response.json() == {"active": False}
+    assert response.headers["Cache-Control"] == "no-store"
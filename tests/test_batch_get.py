@@ -0,0 +1,87 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.crud.user import assign_role_to_user, create_user, get_user_loader
+from app.models.user import Role, User
+from app.schemas.user import UserCreate
+
+@pytest.fixture(name="users")
+def users_fixture(session: Session):
+    return [
+        create_user(session, UserCreate(username=f"member{i}", email=f"member{i}@example.com",
+                                        password="password123", password_confirm="password123"))
+        for i in range(4)
+    ]
+
+@pytest.fixture(name="statements")
+def statements_fixture(session: Session):
+    # 记录执行的 SELECT 语句
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            executed.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+def test_get_by_ids_preserves_order(client: TestClient, admin_token: str, users):
+    # 测试按请求顺序返回，重复 ID 只返回一次，列出不存在的 ID
+    ids = [users[2].id, 9999, users[0].id, users[2].id]
+    response = client.get("/api/users/", params={"ids": ",".join(map(str, ids))},
+                          headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [u["username"] for u in data["items"]] == ["member2", "member0"]
+    assert data["missing"] == [9999]
+    assert "roles" not in data["items"][0]
+
+def test_batch_get_with_roles(client: TestClient, session: Session, admin_token: str, users, test_role: Role):
+    # 测试批量获取附带直接分配的角色
+    assign_role_to_user(session, users[1].id, test_role.id)
+    response = client.post("/api/users/batch-get", json={"ids": [users[1].id, users[3].id], "include_roles": True},
+                           headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert [r["name"] for r in items[0]["roles"]] == ["testrole"]
+    assert items[1]["roles"] == []
+    assert response.json()["missing"] == []
+
+def test_batch_get_uses_single_query(client: TestClient, admin_token: str, users, statements):
+    # 测试用户和角色各只查询一次，与请求的 ID 数无关
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.post("/api/users/batch-get", json={"ids": [u.id for u in users]}, headers=headers)
+    statements.clear()
+    client.post("/api/users/batch-get", json={"ids": [u.id for u in users], "include_roles": True}, headers=headers)
+    batch = [s for s in statements if "IN (" in s]
+    assert len([s for s in batch if "user_role_links" not in s]) == 1
+    assert len([s for s in batch if "user_role_links" in s]) == 1
+
+def test_batch_get_validation(client: TestClient, admin_token: str, user_token: str):
+    # 测试参数校验与权限
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    assert client.get("/api/users/", params={"ids": "1,x"}, headers=headers).status_code == 422
+    assert client.post("/api/users/batch-get", json={"ids": []}, headers=headers).status_code == 422
+    assert client.post("/api/users/batch-get", json={"ids": list(range(501))}, headers=headers).status_code == 422
+    response = client.post("/api/users/batch-get", json={"ids": [1]},
+                           headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+
+def test_user_loader_batches_primed_ids(session: Session, users, statements):
+    # 测试加载器把登记的 ID 合并为一次查询，重复读取不再查询
+    ids = [u.id for u in users]
+    statements.clear()
+    loader = get_user_loader(session)
+    assert get_user_loader(session) is loader
+    loader.prime(ids)
+    result = loader.get_many([ids[3], 12345, ids[1]])
+    assert [u.username if u else None for u in result] == ["member3", None, "member1"]
+    assert len(statements) == 1
+
+    assert loader.get(ids[0]) is users[0]
+    assert loader.get(12345) is None
+    assert len(statements) == 1
@@ -0,0 +1,123 @@
+import multiprocessing
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.core import permissions
+from app.core.cache import MemoryCache, MmapCache, default_cache_path
+from app.crud.user import assign_role_to_user, create_role, update_role
+from app.models.user import User
+
+@pytest.fixture(name="shared_path")
+def shared_path_fixture(tmp_path):
+    return str(tmp_path / "permissions.cache")
+
+def _write_from_worker(path):
+    cache = MmapCache(path, slots=64, slot_size=256)
+    cache.set("principal:1", 3, {"roles": ["editor"]})
+    cache.close()
+
+def test_memory_cache_versions_and_lru():
+    # 测试版本号不一致视为过期，旧版本不覆盖新版本，超出容量淘汰最久未用的条目
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", 1, "a1")
+    assert cache.get("a", 1) == "a1"
+    assert cache.get("a", 2) is None
+    cache.set("a", 2, "a2")
+    cache.set("a", 1, "stale")
+    assert cache.get("a", 2) == "a2"
+
+    cache.set("b", 1, "b1")
+    cache.get("a", 2)
+    cache.set("c", 1, "c1")
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 2) == "a2"
+
+    cache.resize(1)
+    assert cache.stats() == {"hits": 4, "misses": 1, "stale": 1, "sets": 4, "evictions": 2, "entries": 1}
+
+def test_mmap_cache_shared_between_mappings(shared_path):
+    # 测试两个映射（相当于两个 worker）读写同一份数据
+    writer = MmapCache(shared_path, slots=64, slot_size=256)
+    reader = MmapCache(shared_path, slots=64, slot_size=256)
+    writer.set("principal:1", 1, {"roles": ["admin"], "permissions": ["user:*"]})
+    assert reader.get("principal:1", 1) == {"roles": ["admin"], "permissions": ["user:*"]}
+    assert reader.get("principal:1", 2) is None
+    assert reader.get("principal:2", 1) is None
+
+    # 版本号递增后写入新值，旧版本的写入被忽略
+    reader.set("principal:1", 2, {"roles": []})
+    writer.set("principal:1", 1, {"roles": ["admin"]})
+    assert writer.get("principal:1", 2) == {"roles": []}
+
+    writer.delete("principal:1")
+    assert reader.get("principal:1", 2) is None
+    assert reader.stats() == {"hits": 1, "misses": 2, "stale": 1, "sets": 1, "evictions": 0, "oversize": 0}
+    writer.close()
+    reader.close()
+
+def test_mmap_cache_shared_between_processes(shared_path):
+    # 测试另一个进程写入的条目在当前进程可见
+    reader = MmapCache(shared_path, slots=64, slot_size=256)
+    process = multiprocessing.get_context("spawn").Process(target=_write_from_worker, args=(shared_path,))
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+    assert reader.get("principal:1", 3) == {"roles": ["editor"]}
+    reader.close()
+
+def test_mmap_cache_collisions_and_oversize(shared_path):
+    # 测试单个槽位冲突时覆盖旧条目，超过槽位容量的值不缓存
+    cache = MmapCache(shared_path, slots=1, slot_size=64)
+    cache.set("a", 1, [1])
+    cache.set("b", 1, [2])
+    assert cache.get("a", 1) is None
+    assert cache.get("b", 1) == [2]
+    cache.set("c", 1, "x" * 100)
+    assert cache.get("b", 1) == [2]
+    assert cache.evictions == 1
+    assert cache.oversize == 1
+
+    cache.clear()
+    assert cache.get("b", 1) is None
+    cache.close()
+
+    # 槽位参数变化时拒绝打开，不截短可能仍被其他 worker 映射的文件
+    with pytest.raises(ValueError):
+        MmapCache(shared_path, slots=8, slot_size=64)
+    assert os.path.getsize(shared_path) == MmapCache.DATA_OFFSET + 64
+
+def test_mmap_cache_rejects_shared_file(shared_path):
+    # 测试其他用户可访问的缓存文件被拒绝
+    MmapCache(shared_path, slots=8, slot_size=64).close()
+    os.chmod(shared_path, 0o644)
+    with pytest.raises(PermissionError):
+        MmapCache(shared_path, slots=8, slot_size=64)
+
+def test_default_cache_path_private_and_per_layout():
+    # 测试默认文件位于当前用户专用的目录中，布局不同的缓存使用不同文件
+    path = default_cache_path("permissions", 64, 256)
+    directory = os.stat(os.path.dirname(path))
+    assert directory.st_uid == os.geteuid()
+    assert directory.st_mode & 0o077 == 0
+    assert path != default_cache_path("permissions", 128, 256)
+
+def test_principal_cached_until_roles_change(client: TestClient, session: Session, test_user: User,
+                                             user_token: str, monkeypatch):
+    # 测试权限检查命中缓存，角色变化后版本号递增使缓存失效
+    cache = MemoryCache(max_entries=16)
+    monkeypatch.setattr(permissions, "permission_cache", cache)
+    headers = {"Authorization": f"Bearer {user_token}"}
+    role = create_role(session, "useradmin", permissions={"permissions": ["user:read"]})
+    assign_role_to_user(session, test_user.id, role.id)
+
+    assert client.get("/api/users/", headers=headers).status_code == 403
+    # 第二次检查直接使用已编译的规则，不再读取主体缓存
+    assert client.get("/api/users/", headers=headers).status_code == 403
+    assert (cache.misses, cache.hits) == (1, 0)
+
+    update_role(session, role.id, permissions={"permissions": ["user:*"]})
+    assert client.get("/api/users/", headers=headers).status_code == 200
+    assert cache.stale == 1
@@ -0,0 +1,172 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.change_feed import ChangeFeed, change_feed
+from app.crud.outbox import outbox_events
+from app.crud.user import (
+    assign_role_to_user, create_role, create_user, delete_role, delete_user, remove_role_from_user,
+    update_role, update_user,
+)
+from app.models.base import Base
+from app.schemas.user import UserCreate, UserUpdate
+
+def new_user(db: Session, name: str):
+    return create_user(db, UserCreate(username=name, email=f"{name}@example.com",
+                                      password="password123", password_confirm="password123"))
+
+def topics(db: Session):
+    return db.execute(select(outbox_events.c.topic).order_by(outbox_events.c.id)).scalars().all()
+
+def parse_sse(text: str):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        if "event" in fields:
+            events.append(fields)
+    return events
+
+@pytest.fixture(name="feed_session")
+def feed_session_fixture(session: Session, monkeypatch):
+    # 事件流补读使用独立会话，指向测试数据库
+    monkeypatch.setattr(change_feed, "session_factory", sessionmaker(bind=session.get_bind()))
+
+@pytest.fixture(name="feed_engine")
+def feed_engine_fixture(tmp_path):
+    # 独立的文件数据库：轮询线程与测试各自使用连接池中的连接
+    engine = create_engine(f"sqlite:///{tmp_path}/feed.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+def test_mutations_write_events_in_same_transaction(session: Session):
+    # 测试每种变更都在同一事务中写入事件，失败回滚时不留事件
+    alice = new_user(session, "alice")
+    update_user(session, alice.id, UserUpdate(email="alice2@example.com"))
+    role = create_role(session, "editor")
+    update_role(session, role.id, description="编辑")
+    assign_role_to_user(session, alice.id, role.id)
+    remove_role_from_user(session, alice.id, role.id)
+    delete_role(session, role.id)
+    delete_user(session, alice.id)
+
+    assert topics(session) == [
+        "user.created", "user.updated", "role.created", "role.updated",
+        "user.role_assigned", "user.role_removed", "role.deleted", "user.deleted",
+    ]
+    updated = session.execute(select(outbox_events).where(outbox_events.c.topic == "user.updated")).mappings().one()
+    assert updated["entity_id"] == alice.id
+    assert updated["data"]["email"] == "alice2@example.com"
+    assert "hashed_password" not in updated["data"]
+
+    new_user(session, "bob")
+    with pytest.raises(IntegrityError):
+        new_user(session, "bob")
+    session.rollback()
+    assert topics(session).count("user.created") == 2
+
+def test_stream_replays_and_resumes(client: TestClient, session: Session, admin_token: str, feed_session):
+    # 测试从游标补发事件，并用 Last-Event-ID 断点续传
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    new_user(session, "bob")
+    new_user(session, "carol")
+
+    response = client.get("/api/events/stream", params={"since": "0", "follow": "false"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    assert [e["event"] for e in events] == ["user.created", "user.created"]
+    assert '"username":"bob"' in events[0]["data"]
+
+    new_user(session, "dave")
+    response = client.get("/api/events/stream", params={"follow": "false"},
+                          headers={**headers, "Last-Event-ID": events[-1]["id"]})
+    resumed = parse_sse(response.text)
+    assert len(resumed) == 1
+    assert '"username":"dave"' in resumed[0]["data"]
+    assert int(resumed[0]["id"]) > int(events[-1]["id"])
+
+def test_stream_rejects_bad_cursor_and_unauthorized(client: TestClient, admin_token: str, user_token: str, feed_session):
+    # 测试游标格式错误返回 400，无 events:read 权限返回 403
+    response = client.get("/api/events/stream", params={"since": "1.2", "follow": "false"},
+                          headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 400
+    response = client.get("/api/events/stream", params={"follow": "false"},
+                          headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+
+def test_stream_rejects_pruned_cursor(client: TestClient, session: Session, admin_token: str, feed_session):
+    # 测试游标之后的事件已被清理时返回 410，而不是跳过缺失的事件
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for name in ("erin", "frank", "grace"):
+        new_user(session, name)
+    first = session.execute(select(func.min(outbox_events.c.id))).scalar()
+    session.execute(delete(outbox_events).where(outbox_events.c.id <= first + 1))
+    session.commit()
+
+    response = client.get("/api/events/stream", params={"since": str(first - 1), "follow": "false"}, headers=headers)
+    assert response.status_code == 410
+    response = client.get("/api/events/stream", params={"follow": "false"},
+                          headers={**headers, "Last-Event-ID": str(first)})
+    assert response.status_code == 410
+
+    # 紧邻最小保留序号的游标仍可续传
+    response = client.get("/api/events/stream", params={"since": str(first + 1), "follow": "false"}, headers=headers)
+    assert [e["event"] for e in parse_sse(response.text)] == ["user.created"]
+
+def test_stream_rejects_cursor_after_all_events_pruned(client: TestClient, session: Session, admin_token: str,
+                                                        feed_session):
+    # 测试事件全部被清理后，按已分配过的最大序号判断旧游标已过期；从当前位置订阅的游标仍有效
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i in range(5):
+        new_user(session, f"pruned{i}")
+    first, last = session.execute(select(func.min(outbox_events.c.id), func.max(outbox_events.c.id))).one()
+    session.execute(delete(outbox_events))
+    session.commit()
+
+    response = client.get("/api/events/stream", params={"since": str(first), "follow": "false"}, headers=headers)
+    assert response.status_code == 410
+    response = client.get("/api/events/stream", params={"since": str(last), "follow": "false"}, headers=headers)
+    assert response.status_code == 200
+    assert change_feed.latest() == [last]
+
+def test_live_delivery_with_overflow_fallback(feed_engine):
+    # 测试轮询任务分发新事件；缓冲区溢出的订阅者改为从数据库补读，不丢事件
+    factory = sessionmaker(bind=feed_engine)
+    feed = ChangeFeed(poll_interval=0.05, batch_size=100, buffer_size=2, retention=3600, session_factory=factory)
+    db = factory()
+
+    async def collect(sub, count):
+        received = []
+        async for changes in feed.stream(sub, keepalive=0.05):
+            received.extend(change["data"]["username"] for _, change in changes)
+            if len(received) >= count:
+                return received
+
+    async def scenario():
+        feed.start()
+        await asyncio.sleep(0.1)
+        sub = feed.subscribe(feed.latest())
+        for i in range(5):
+            new_user(db, f"live{i}")
+        await asyncio.sleep(0.2)
+        assert sub.overflowed
+        received = await asyncio.wait_for(collect(sub, 5), 5)
+        new_user(db, "after")
+        received += await asyncio.wait_for(collect(sub, 1), 5)
+        # 补读可能先于轮询任务读到最后一个事件，等待轮询任务分发完
+        await asyncio.sleep(0.2)
+        feed.unsubscribe(sub)
+        await feed.stop()
+        return received
+
+    received = asyncio.run(scenario())
+    db.close()
+    assert received == [f"live{i}" for i in range(5)] + ["after"]
+    assert feed.overflows == 1
+    assert feed.metrics()["change_feed_published_total"] == 6
+    assert not feed.running
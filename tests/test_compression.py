@@ -0,0 +1,93 @@
+import gzip
+import zlib
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, negotiate, no_compression
+from app.models.user import User
+
+PAYLOAD = b'{"items":[' + b",".join(b'{"id":%d,"username":"user%d"}' % (i, i) for i in range(200)) + b"]}"
+
+@pytest.fixture(name="compress_client")
+def compress_client_fixture():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500, encodings=["gzip"])
+
+    @app.get("/big")
+    async def big():
+        return Response(PAYLOAD, media_type="application/json", headers={"ETag": '"abc"'})
+
+    @app.get("/small")
+    async def small():
+        return Response(b'{"ok":true}', media_type="application/json")
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(5):
+                yield PAYLOAD
+        return StreamingResponse(chunks(), media_type="application/json")
+
+    @app.get("/raw")
+    @no_compression
+    async def raw():
+        return Response(PAYLOAD, media_type="application/json")
+
+    @app.get("/binary")
+    async def binary():
+        return Response(PAYLOAD, media_type="application/octet-stream")
+
+    return TestClient(app)
+
+def get_raw(client, path, encoding="gzip"):
+    # 关闭自动解压，检查实际传输的字节
+    with client.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+def test_negotiate():
+    # 测试按 q 值和服务端偏好选择编码
+    encodings = ["zstd", "br", "gzip"]
+    assert negotiate("gzip, br", encodings) == "br"
+    assert negotiate("gzip;q=1.0, br;q=0.5", encodings) == "gzip"
+    assert negotiate("*;q=0.1, zstd;q=0", encodings) == "br"
+    assert negotiate("identity", encodings) is None
+    assert negotiate("br", ["gzip"]) is None
+
+def test_large_response_is_compressed(compress_client):
+    # 测试超过阈值的响应被压缩，并带有正确的响应头
+    response, raw = get_raw(compress_client, "/big")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(raw) < len(PAYLOAD)
+    assert response.headers["etag"] == 'W/"abc"'
+    assert gzip.decompress(raw) == PAYLOAD
+
+def test_small_or_unaccepted_or_opted_out_responses_are_not_compressed(compress_client):
+    # 测试小响应、不接受压缩的客户端、标记不压缩的路由和非文本类型保持原样
+    for path, encoding in [("/small", "gzip"), ("/big", "identity"), ("/raw", "gzip"), ("/binary", "gzip")]:
+        response, raw = get_raw(compress_client, path, encoding)
+        assert "content-encoding" not in response.headers
+        assert raw in (PAYLOAD, b'{"ok":true}')
+
+def test_streaming_response_is_compressed_incrementally(compress_client):
+    # 测试分块响应逐块压缩，且每块都能立即解压
+    with compress_client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = [decoder.decompress(chunk) for chunk in response.iter_raw()]
+    assert b"".join(chunks) == PAYLOAD * 5
+    assert chunks[0] != b""
+
+def test_app_lists_are_compressed(client, session, admin_token):
+    # 测试应用的列表接口按需压缩，客户端自动解压
+    session.add_all([User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x") for i in range(50)])
+    session.commit()
+    response = client.get("/api/users/", headers={"Authorization": f"Bearer {admin_token}",
+                                                  "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 51
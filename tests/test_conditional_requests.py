@@ -0,0 +1,84 @@
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.activity import ActivityTracker
+from app.crud.user import assign_role_to_user, remove_role_from_user, update_role
+from app.models.user import User, Role
+
+def get_with_etag(client: TestClient, url: str, token: str, etag: str = None):
+    headers = {"Authorization": f"Bearer {token}"}
+    if etag:
+        headers["If-None-Match"] = etag
+    return client.get(url, headers=headers)
+
+def test_read_me_not_modified(client: TestClient, user_token: str):
+    # 测试 /me 返回 ETag，命中时返回 304
+    response = get_with_etag(client, "/api/users/me", user_token)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    response = get_with_etag(client, "/api/users/me", user_token, etag)
+    assert response.status_code == 304
+    assert response.content == b""
+
+def test_read_me_etag_changes_with_roles(client: TestClient, session: Session, user_token: str,
+                                         test_user: User, test_role: Role):
+    etag = get_with_etag(client, "/api/users/me", user_token).headers["ETag"]
+
+    # 测试角色分配后 ETag 变化
+    assert assign_role_to_user(session, test_user.id, test_role.id)
+    response = get_with_etag(client, "/api/users/me", user_token, etag)
+    assert response.status_code == 200
+    assert [role["name"] for role in response.json()["roles"]] == ["testrole"]
+    etag = response.headers["ETag"]
+
+    # 测试所属角色内容变化后 ETag 变化
+    update_role(session, test_role.id, description="changed")
+    response = get_with_etag(client, "/api/users/me", user_token, etag)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    # 测试移除角色后 ETag 变化
+    assert remove_role_from_user(session, test_user.id, test_role.id)
+    response = get_with_etag(client, "/api/users/me", user_token, etag)
+    assert response.status_code == 200
+    assert response.json()["roles"] == []
+
+def test_read_user_not_modified(client: TestClient, admin_token: str, test_user: User):
+    # 测试 /users/{id} 的条件请求
+    url = f"/api/users/{test_user.id}"
+    etag = get_with_etag(client, url, admin_token).headers["ETag"]
+    assert get_with_etag(client, url, admin_token, etag).status_code == 304
+    assert get_with_etag(client, "/api/users/9999", admin_token, etag).status_code == 404
+
+def test_user_etag_changes_with_activity(client: TestClient, session: Session, admin_token: str,
+                                         user_token: str, test_user: User):
+    # 测试活动时间写回后（不修改 updated_at）ETag 失效，客户端能拿到新的活动时间
+    urls = ["/api/users/me", f"/api/users/{test_user.id}"]
+    tokens = [user_token, admin_token]
+    etags = [get_with_etag(client, url, token).headers["ETag"] for url, token in zip(urls, tokens)]
+
+    tracker = ActivityTracker(interval=60, engine=session.get_bind())
+    tracker.login(test_user.id)
+    tracker.flush()
+    session.expire_all()
+
+    for url, token, etag in zip(urls, tokens, etags):
+        response = get_with_etag(client, url, token, etag)
+        assert response.status_code == 200
+        assert response.json()["last_login_at"] is not None
+
+def test_read_roles_not_modified(client: TestClient, session: Session, admin_token: str, test_role: Role):
+    # 测试角色列表和单个角色的条件请求
+    etag = get_with_etag(client, "/api/roles/", admin_token).headers["ETag"]
+    assert get_with_etag(client, "/api/roles/", admin_token, etag).status_code == 304
+
+    role_url = f"/api/roles/{test_role.id}"
+    role_etag = get_with_etag(client, role_url, admin_token).headers["ETag"]
+    assert get_with_etag(client, role_url, admin_token, role_etag).status_code == 304
+
+    # 测试角色更新后两个 ETag 都失效
+    update_role(session, test_role.id, description="changed")
+    assert get_with_etag(client, "/api/roles/", admin_token, etag).status_code == 200
+    assert get_with_etag(client, role_url, admin_token, role_etag).status_code == 200
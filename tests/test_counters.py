@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.crud.user import (
+    create_user, update_user, delete_user, assign_role_to_user, remove_role_from_user,
+    get_counters, reconcile_counters, role_members_counter, _adjust_counter,
+)
+from app.models.base import Base
+from app.migrations import run_migrations
+from app.models.user import User
+from app.reconciler import CounterReconciler
+from app.schemas.user import UserCreate, UserUpdate
+
+def new_user(session, name, is_active=True):
+    return create_user(session, UserCreate(username=name, email=f"{name}@example.com", password="password123",
+                                           password_confirm="password123", is_active=is_active))
+
+def test_counters_follow_mutations(session, test_role):
+    # 测试计数器随增删改和角色分配在同一事务中更新
+    members = role_members_counter(test_role.id)
+    alice = new_user(session, "alice")
+    bob = new_user(session, "bob", is_active=False)
+    assert get_counters(session, ["users", "users_active"]) == {"users": 2, "users_active": 1}
+
+    update_user(session, bob.id, UserUpdate(is_active=True))
+    update_user(session, bob.id, UserUpdate(email="bob2@example.com"))
+    assert get_counters(session, ["users_active"])["users_active"] == 2
+
+    assign_role_to_user(session, alice.id, test_role.id)
+    assign_role_to_user(session, alice.id, test_role.id)
+    assign_role_to_user(session, bob.id, test_role.id)
+    remove_role_from_user(session, bob.id, test_role.id)
+    assert get_counters(session, [members])[members] == 1
+
+    delete_user(session, alice.id)
+    assert get_counters(session, ["users", "users_active", members]) == {"users": 1, "users_active": 1, members: 0}
+
+def test_concurrent_first_increment(tmp_path):
+    # 测试多个事务并发首次写入同一计数器时都成功，且不丢失增量
+    engine = create_engine(f"sqlite:///{tmp_path}/counters.db", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    workers = 8
+    barrier = threading.Barrier(workers)
+
+    def bump(_):
+        with factory() as db:
+            barrier.wait()
+            _adjust_counter(db, "racing", 1)
+            db.commit()
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(bump, range(workers)))
+    with factory() as db:
+        assert get_counters(db, ["racing"]) == {"racing": workers}
+    engine.dispose()
+
+def test_reconcile_fixes_drift(session, test_user, test_admin, test_role):
+    # 测试重算计数器修正直接写库造成的偏差
+    assert get_counters(session, ["users"])["users"] == 0
+    assign_role_to_user(session, test_user.id, test_role.id)
+    test_admin.is_active = False
+    session.commit()
+
+    reconcile_counters(session)
+    members = role_members_counter(test_role.id)
+    assert get_counters(session, ["users", "users_active", members]) == {"users": 2, "users_active": 1, members: 1}
+
+def test_background_reconciler(session, test_user):
+    # 测试后台任务使用独立会话重算
+    reconciler = CounterReconciler(interval=600, session_factory=lambda: session)
+    reconciler.run_once()
+    assert reconciler.runs == 1
+    assert get_counters(session, ["users"])["users"] == 1
+
+def test_migration_initializes_counters(session, test_user, test_admin):
+    # 测试迁移按已有数据初始化计数器
+    run_migrations(session.get_bind())
+    assert get_counters(session, ["users", "users_active"]) == {"users": 2, "users_active": 2}
+
+def test_list_responses_include_totals(client, session, admin_token, test_user, test_role):
+    # 测试列表接口通过响应头返回总数
+    assign_role_to_user(session, test_user.id, test_role.id)
+    reconcile_counters(session)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    response = client.get("/api/users/", params={"limit": 1}, headers=headers)
+    assert len(response.json()) == 1
+    assert response.headers["X-Total-Count"] == "2"
+    assert response.headers["X-Active-Count"] == "2"
+
+    response = client.get("/api/roles/", headers=headers)
+    assert response.headers["X-Total-Count"] == "1"
+
+    response = client.get(f"/api/roles/{test_role.id}/users", headers=headers)
+    assert response.headers["X-Total-Count"] == "1"
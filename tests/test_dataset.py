@@ -0,0 +1,48 @@
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.core.permissions import get_permission_checker
+from app.core.security import verify_password
+from app.crud.user import get_counters, get_user, search_user_rows
+from app.models.base import user_role_link
+from app.models.user import User
+from benchmarks.dataset import generate
+
+def make_engine():
+    return create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+def snapshot(engine):
+    with engine.connect() as conn:
+        users = conn.execute(select(User.__table__).order_by(User.id)).all()
+        links = conn.execute(select(user_role_link.c.user_id, user_role_link.c.role_id)
+                             .order_by(user_role_link.c.user_id, user_role_link.c.role_id)).all()
+    return users, links
+
+def test_generation_is_reproducible_and_usable():
+    # 测试同一种子生成相同数据，且生成的数据可直接被应用使用
+    first, second = make_engine(), make_engine()
+    counts = generate(first, users=300, roles=30, seed=7, templates=2, log=lambda message: None)
+    generate(second, users=300, roles=30, seed=7, templates=2, log=lambda message: None)
+    assert snapshot(first) == snapshot(second)
+    assert counts["users"] == 300
+
+    session = Session(first)
+    user = get_user(session, 3)
+    assert verify_password("password1", user.hashed_password)
+    # 闭包表完整：有效角色包含继承的角色
+    assert len(user.effective_roles) >= len(user.roles)
+    get_permission_checker(user).allows("user:read")
+
+    # 迁移已建立搜索索引并初始化计数器
+    assert [row["username"] for row in search_user_rows(session, "user0000042")] == ["user0000042"]
+    assert get_counters(session, ["users"])["users"] == 300
+
+def test_role_membership_is_skewed():
+    # 测试角色成员分布集中在少数角色
+    engine = make_engine()
+    generate(engine, users=2000, roles=50, seed=1, templates=1, log=lambda message: None)
+    with engine.connect() as conn:
+        sizes = conn.execute(select(func.count()).select_from(user_role_link)
+                             .group_by(user_role_link.c.role_id).order_by(func.count().desc())).scalars().all()
+    assert sizes[0] > 10 * sizes[-1]
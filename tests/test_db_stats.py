@@ -0,0 +1,84 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.config.settings import settings
+from app.core.security import get_password_hash
+from app.database import get_session
+from app.db_stats import DBRequestStats, _request_stats, track_pool, track_sessions
+from app.main import app
+from app.models.base import Base
+from app.models.user import User
+
+@pytest.fixture(name="stats_client")
+def stats_client_fixture():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    track_pool(engine)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    track_sessions(factory)
+
+    def get_test_session():
+        session = factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_session] = get_test_session
+    yield TestClient(app), factory
+    app.dependency_overrides.clear()
+
+def test_sessions_counted_on_first_use():
+    # 测试会话首次访问数据库时计数一次，创建后未使用的会话不计入
+    factory = sessionmaker(bind=create_engine("sqlite:///:memory:"))
+    track_sessions(factory)
+    stats = DBRequestStats()
+    token = _request_stats.set(stats)
+    try:
+        factory().close()
+        assert stats.sessions == 0
+        with factory() as session:
+            session.execute(text("SELECT 1"))
+            session.commit()
+            session.execute(text("SELECT 1"))
+        assert stats.sessions == 1
+    finally:
+        _request_stats.reset(token)
+
+def test_stats_headers_off_by_default(stats_client):
+    client, _ = stats_client
+    assert "x-db-sessions" not in client.get("/health").headers
+
+def test_request_stats_headers(stats_client, monkeypatch):
+    monkeypatch.setattr(settings, "DB_STATS_HEADERS", True)
+    client, factory = stats_client
+    with factory() as db:
+        db.add(User(username="statsuser", email="stats@example.com",
+                    hashed_password=get_password_hash("password"), is_active=True))
+        db.commit()
+
+    # 测试不访问数据库的请求不计入会话
+    response = client.get("/health")
+    assert response.headers["x-db-sessions"] == "0"
+    assert response.headers["x-db-checkouts"] == "0"
+
+    # 测试重复声明的会话依赖只创建一个会话
+    token = client.post(
+        "/api/auth/login", data={"username": "statsuser", "password": "password"}
+    ).json()["access_token"]
+    response = client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.headers["x-db-sessions"] == "1"
+    assert response.headers["x-db-checkouts"] == "1"
+
+    # 测试未通过认证的请求不访问数据库
+    response = client.get("/api/users/", headers={"Authorization": "Bearer invalid"})
+    assert response.status_code == 401
+    assert response.headers["x-db-sessions"] == "0"
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.config.settings import settings
+from app.core.hashing import PasswordHasher, password_hasher
+from app.core.security import get_password_hash
+from app.health import HealthChecker, get_health_checker, pool_stats
+from app.main import app
+
+@pytest.fixture(name="file_engine")
+def file_engine_fixture(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'health.db'}", pool_size=2, max_overflow=0)
+    yield engine
+    engine.dispose()
+
+def test_ready_when_healthy(file_engine):
+    # 测试各项指标正常时就绪
+    result = asyncio.run(HealthChecker([file_engine]).readiness())
+    assert result["status"] == "ready"
+    assert result["failures"] == []
+    assert result["databases"][0]["pool"]["size"] == 2
+    assert result["hash_queue_depth"] == 0
+
+def test_not_ready_when_pool_exhausted(file_engine, monkeypatch):
+    # 测试连接池耗尽时探测超时并报告不就绪
+    monkeypatch.setattr(settings, "READINESS_DB_TIMEOUT_MS", 100)
+    held = [file_engine.connect() for _ in range(2)]
+    try:
+        assert pool_stats(file_engine)["utilization"] == 1.0
+        result = asyncio.run(HealthChecker([file_engine]).readiness())
+    finally:
+        for conn in held:
+            conn.close()
+    assert result["status"] == "not_ready"
+    assert any("timeout" in f for f in result["failures"])
+    assert any("连接池使用率" in f for f in result["failures"])
+
+def test_not_ready_when_hash_queue_is_deep(file_engine, monkeypatch):
+    # 测试密码哈希排队超过阈值时不就绪
+    monkeypatch.setattr(settings, "READINESS_MAX_HASH_QUEUE", 1)
+    hasher = PasswordHasher(workers=1)
+
+    async def scenario():
+        tasks = [asyncio.create_task(hasher.hash("password")) for _ in range(4)]
+        await asyncio.sleep(0.05)
+        result = await HealthChecker([file_engine], hasher=hasher).readiness()
+        await asyncio.gather(*tasks)
+        return result
+
+    result = asyncio.run(scenario())
+    hasher.shutdown()
+    assert result["hash_queue_depth"] == 3
+    assert result["status"] == "not_ready"
+
+def test_hasher_round_trip():
+    # 测试线程池中的哈希与校验
+    async def scenario():
+        hashed = await password_hasher.hash("secret123")
+        return await password_hasher.verify("secret123", hashed), await password_hasher.verify("wrong", hashed)
+
+    assert asyncio.run(scenario()) == (True, False)
+    assert password_hasher.in_flight == 0
+
+def test_hasher_restarts_after_shutdown():
+    # 测试应用关闭后同一进程中再次启动时，哈希线程池仍可使用
+    hasher = PasswordHasher(1)
+    hasher.shutdown()
+    hasher.start()
+    assert asyncio.run(hasher.verify("secret123", get_password_hash("secret123")))
+
+    hasher.shutdown()
+    assert asyncio.run(hasher.hash("secret123"))
+    hasher.shutdown()
+
+def test_health_endpoints(client, session, monkeypatch):
+    # 测试存活与就绪接口
+    assert client.get("/health/live").json() == {"status": "alive"}
+
+    app.dependency_overrides[get_health_checker] = lambda: HealthChecker([session.get_bind()])
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+    monkeypatch.setattr(settings, "READINESS_MAX_DB_LATENCY_MS", -1)
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "not_ready"
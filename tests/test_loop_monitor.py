@@ -0,0 +1,53 @@
+import asyncio
+import logging
+import time
+
+from app.loop_monitor import LoopMonitor
+
+def blocking_handler():
+    time.sleep(0.3)
+
+def test_blocking_call_is_reported_with_stack_and_route(caplog):
+    # 测试阻塞超过阈值时记录调用栈和路由
+    monitor = LoopMonitor(interval=0.01, threshold=0.1)
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        task = monitor.track({"type": "http", "method": "GET", "path": "/api/slow"})
+        blocking_handler()
+        monitor.untrack(task)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    with caplog.at_level(logging.WARNING, logger="app.loop_monitor"):
+        asyncio.run(scenario())
+
+    assert monitor.blocked_count == 1
+    assert monitor.max_lag >= 0.2
+    message = caplog.records[0].getMessage()
+    assert "GET /api/slow" in message
+    assert "blocking_handler" in message
+
+def test_idle_loop_reports_nothing(caplog):
+    # 测试事件循环空闲时没有阻塞报告
+    monitor = LoopMonitor(interval=0.01, threshold=0.1)
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.2)
+        await monitor.stop()
+
+    with caplog.at_level(logging.WARNING, logger="app.loop_monitor"):
+        asyncio.run(scenario())
+
+    assert monitor.blocked_count == 0
+    assert not caplog.records
+    assert not monitor.running
+
+def test_metrics_endpoint(client):
+    # 测试指标端点导出事件循环延迟
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "event_loop_lag_seconds" in response.text
+    assert "event_loop_blocked_total" in response.text
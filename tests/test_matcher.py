@@ -0,0 +1,53 @@
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.core.matcher import PermissionMatcher
+from app.core.permissions import get_permission_checker
+from app.crud.user import assign_role_to_user, create_role, update_role
+from app.models.user import User
+
+def test_exact_and_wildcard_matching():
+    matcher = PermissionMatcher(["profile:read", "user:*", "report:*:read"])
+    assert matcher.allows("profile:read")
+    assert not matcher.allows("profile:update")
+    # 末尾的 * 匹配剩余的一个或多个段
+    assert matcher.allows("user:manage")
+    assert matcher.allows("user:profile:read")
+    assert not matcher.allows("user")
+    # 中间的 * 只匹配一个段
+    assert matcher.allows("report:2024:read")
+    assert not matcher.allows("report:2024:q1:read")
+
+def test_global_wildcard():
+    matcher = PermissionMatcher(["*"])
+    assert matcher.allows("anything")
+    assert matcher.allows("role:delete")
+
+def test_deny_takes_precedence():
+    matcher = PermissionMatcher(["role:*"], ["role:delete"])
+    assert matcher.allows("role:manage")
+    assert not matcher.allows("role:delete")
+
+def test_compiled_checker_invalidated_on_update(session: Session, test_user: User):
+    role = create_role(session, "editor", permissions={"permissions": ["doc:read"]})
+    assign_role_to_user(session, test_user.id, role.id)
+    session.refresh(test_user)
+    assert get_permission_checker(test_user) is get_permission_checker(test_user)
+    assert not get_permission_checker(test_user).allows("doc:write")
+
+    # 测试角色更新后按新的角色版本号重新编译
+    update_role(session, role.id, permissions={"permissions": ["doc:*"]})
+    session.refresh(test_user)
+    assert get_permission_checker(test_user).allows("doc:write")
+
+def test_wildcard_grant_and_deny_in_routes(client: TestClient, session: Session, test_user: User, user_token: str):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    role = create_role(session, "useradmin", permissions={"permissions": ["user:*"]})
+    assign_role_to_user(session, test_user.id, role.id)
+
+    # 测试通配符授权通过 user:manage 检查
+    assert client.get("/api/users/", headers=headers).status_code == 200
+
+    # 测试显式拒绝覆盖通配符授权
+    update_role(session, role.id, permissions={"permissions": ["user:*"], "deny": ["user:manage"]})
+    assert client.get("/api/users/", headers=headers).status_code == 403
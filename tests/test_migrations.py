@@ -0,0 +1,118 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.pool import StaticPool
+
+from app.crud.user import get_users
+from app.migrations import LATEST_VERSION, get_schema_version, run_migrations
+from app.models.base import Base, user_role_link
+from app.models.user import User
+
+NEW_INDEXES = ["ix_user_role_links_role_id_user_id", "ix_users_created_at_id", "ix_users_is_active"]
+
+# 迁移前（基线版本）的表结构
+LEGACY_SCHEMA = [
+    """CREATE TABLE roles (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, name VARCHAR, description VARCHAR,
+        permissions JSON, created_at DATETIME, updated_at DATETIME)""",
+    "CREATE UNIQUE INDEX ix_roles_name ON roles (name)",
+    """CREATE TABLE users (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, username VARCHAR, email VARCHAR,
+        hashed_password VARCHAR, is_active BOOLEAN, is_superuser BOOLEAN,
+        created_at DATETIME, updated_at DATETIME)""",
+    "CREATE UNIQUE INDEX ix_users_username ON users (username)",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    """CREATE TABLE user_role_links (
+        user_id INTEGER NOT NULL REFERENCES users (id), role_id INTEGER NOT NULL REFERENCES roles (id),
+        assigned_at DATETIME, PRIMARY KEY (user_id, role_id))""",
+]
+
+@pytest.fixture(name="legacy_engine")
+def legacy_engine_fixture():
+    # 模拟迁移前的旧数据库：基线表结构，已有数据
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    with engine.begin() as conn:
+        for ddl in LEGACY_SCHEMA:
+            conn.execute(text(ddl))
+        conn.execute(text(
+            "INSERT INTO users (username, email, hashed_password, is_active, is_superuser, created_at, updated_at) "
+            "VALUES ('olduser', 'old@example.com', 'x', 1, 0, '2024-01-01', '2024-01-01')"
+        ))
+        conn.execute(text(
+            "INSERT INTO roles (name, permissions, created_at, updated_at) "
+            "VALUES ('oldrole', '{}', '2024-01-01', '2024-01-01')"
+        ))
+    # 与应用启动时一致：先补建新表，再执行迁移
+    Base.metadata.create_all(engine)
+    return engine
+
+def query_plan(conn, stmt) -> str:
+    sql = str(stmt.compile(conn.engine, compile_kwargs={"literal_binds": True}))
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return " ".join(row[-1] for row in rows)
+
+def test_upgrade_in_place_keeps_data(legacy_engine):
+    # 测试旧数据库原地升级
+    assert run_migrations(legacy_engine) == LATEST_VERSION
+
+    with legacy_engine.connect() as conn:
+        assert get_schema_version(conn) == LATEST_VERSION
+        usernames = conn.execute(text("SELECT username FROM users")).scalars().all()
+        roles_version = conn.execute(text("SELECT roles_version FROM users")).scalar()
+        closure = conn.execute(text("SELECT ancestor_id, descendant_id FROM role_closure")).all()
+        indexes = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars().all()
+    assert usernames == ["olduser"]
+    assert roles_version == 0
+    assert closure == [(1, 1)]
+    for name in NEW_INDEXES:
+        assert name in indexes
+
+# 迁移中为已有 admin 角色补充的权限
+GRANTED_ADMIN_PERMISSIONS = ["token:introspect", "audit:read", "events:read"]
+
+def test_existing_admin_role_gets_new_permissions(legacy_engine):
+    # 测试已有数据库的 admin 角色补充新权限，拥有该角色的用户角色版本号递增
+    with legacy_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO roles (name, permissions, created_at, updated_at) "
+            "VALUES ('admin', '{\"permissions\": [\"user:manage\"]}', '2024-01-01', '2024-01-01')"
+        ))
+        conn.execute(text("INSERT INTO user_role_links (user_id, role_id) VALUES (1, 2)"))
+    run_migrations(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        permissions = conn.execute(text("SELECT permissions FROM roles WHERE name = 'admin'")).scalar()
+        roles_version = conn.execute(text("SELECT roles_version FROM users")).scalar()
+    assert json.loads(permissions)["permissions"] == ["user:manage"] + GRANTED_ADMIN_PERMISSIONS
+    assert roles_version == len(GRANTED_ADMIN_PERMISSIONS)
+
+def test_migrations_are_idempotent(legacy_engine):
+    # 测试重复执行迁移不会报错或重复记录
+    run_migrations(legacy_engine)
+    assert run_migrations(legacy_engine) == LATEST_VERSION
+    with legacy_engine.connect() as conn:
+        count = conn.execute(text("SELECT COUNT(*) FROM schema_version")).scalar()
+    assert count == LATEST_VERSION
+
+def test_hot_path_queries_use_indexes(legacy_engine):
+    # 测试热点查询的执行计划使用新增索引
+    run_migrations(legacy_engine)
+    with legacy_engine.connect() as conn:
+        role_users = select(user_role_link.c.user_id).where(user_role_link.c.role_id == 1)
+        assert "ix_user_role_links_role_id_user_id" in query_plan(conn, role_users)
+
+        listing = select(User).order_by(User.created_at, User.id).offset(0).limit(100)
+        assert "ix_users_created_at_id" in query_plan(conn, listing)
+
+        active = select(User.id).where(User.is_active == True)
+        assert "ix_users_is_active" in query_plan(conn, active)
+
+def test_get_users_ordered_by_creation(session, test_user, test_admin):
+    # 测试用户列表按创建时间排序
+    users = get_users(session)
+    assert [u.username for u in users] == ["testuser", "testadmin"]
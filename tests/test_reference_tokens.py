@@ -0,0 +1,143 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app.config.settings import settings
+from app.core import reference_tokens
+from app.core.cache import MemoryCache, MmapCache
+from app.core.reference_tokens import create_reference_token, resolve_reference_token, revoke_reference_token
+from app.crud.token import hash_jti
+from app.crud.user import create_user, delete_user
+from app.models.token import AccessSession
+from app.schemas.user import UserCreate
+from app.token_sweeper import TokenSweeper
+
+def login(client, **data):
+    response = client.post("/api/auth/login", data={"username": "testuser", "password": "testpassword", **data})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+def test_reference_token_login_and_revoke(client, session, test_user):
+    # 测试按客户端选择签发引用型令牌，撤销后立即失效
+    tokens = login(client, token_format="reference")
+    token = tokens["access_token"]
+    assert token.startswith("sess_") and len(token) < 64
+    assert session.get(AccessSession, hash_jti(token)).user_id == test_user.id
+
+    assert client.get("/api/users/me", headers=bearer(token)).json()["id"] == test_user.id
+    introspection = client.get("/api/auth/introspect", headers=bearer(token)).json()
+    assert introspection["active"] and introspection["sub"] == str(test_user.id)
+
+    assert client.post("/api/auth/revoke", data={"token": token}).status_code == 200
+    assert client.get("/api/users/me", headers=bearer(token)).status_code == 401
+    assert client.get("/api/auth/introspect", headers=bearer(token)).json() == {"active": False}
+    # 未知令牌同样返回 200
+    assert client.post("/api/auth/revoke", data={"token": "sess_unknown"}).status_code == 200
+
+def test_both_formats_accepted(client, test_user, monkeypatch):
+    # 测试两种格式同时有效；默认格式可配置，刷新时也可指定格式
+    jwt_token = login(client)["access_token"]
+    assert jwt_token.count(".") == 2
+    monkeypatch.setattr(settings, "ACCESS_TOKEN_FORMAT", "reference")
+    tokens = login(client)
+    assert tokens["access_token"].startswith("sess_")
+
+    for token in (jwt_token, tokens["access_token"]):
+        assert client.get("/api/users/me", headers=bearer(token)).status_code == 200
+
+    response = client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"], "token_format": "jwt"})
+    assert response.json()["access_token"].count(".") == 2
+
+    response = client.post("/api/auth/login", data={"username": "testuser", "password": "testpassword",
+                                                     "token_format": "opaque"})
+    assert response.status_code == 400
+
+def test_resolve_from_table_on_cache_miss(session, test_user, monkeypatch):
+    # 测试缓存未命中时查询会话表并回填缓存，过期会话无效
+    cache = MemoryCache(max_entries=16)
+    monkeypatch.setattr(reference_tokens, "session_cache", cache)
+    token = create_reference_token(session, test_user.id)
+    cache.clear()
+
+    payload = resolve_reference_token(session, token)
+    assert payload.sub == str(test_user.id) and payload.type == "access"
+    assert resolve_reference_token(session, token).sub == str(test_user.id)
+    assert (cache.misses, cache.hits) == (1, 1)
+
+    expired = create_reference_token(session, test_user.id, timedelta(seconds=-1))
+    assert resolve_reference_token(session, expired) is None
+    cache.clear()
+    assert resolve_reference_token(session, expired) is None
+    assert resolve_reference_token(session, "sess_missing") is None
+
+def test_revocation_reaches_other_workers(session, test_user, monkeypatch):
+    # 测试 memory 后端下另一个 worker 撤销后，本进程的缓存条目在 TTL 后重新核对会话表而失效
+    worker, other = MemoryCache(max_entries=16), MemoryCache(max_entries=16)
+    monkeypatch.setattr(settings, "ACCESS_SESSION_CACHE_TTL_MS", 50)
+    monkeypatch.setattr(reference_tokens, "session_cache", worker)
+    token = create_reference_token(session, test_user.id)
+    assert resolve_reference_token(session, token) is not None
+
+    monkeypatch.setattr(reference_tokens, "session_cache", other)
+    assert revoke_reference_token(session, token)
+    monkeypatch.setattr(reference_tokens, "session_cache", worker)
+    time.sleep(0.06)
+    assert resolve_reference_token(session, token) is None
+    assert worker.get(f"session:{hash_jti(token).hex()}", 0) is None
+
+    # TTL 为 0 时每次都核对，撤销立即生效
+    monkeypatch.setattr(settings, "ACCESS_SESSION_CACHE_TTL_MS", 0)
+    token = create_reference_token(session, test_user.id)
+    monkeypatch.setattr(reference_tokens, "session_cache", other)
+    revoke_reference_token(session, token)
+    monkeypatch.setattr(reference_tokens, "session_cache", worker)
+    assert resolve_reference_token(session, token) is None
+
+def test_revocation_racing_cache_fill(session, test_user, monkeypatch, tmp_path):
+    # 测试撤销落在读取会话表与写入共享缓存之间时，已撤销的会话不会被写回缓存
+    cache = MmapCache(str(tmp_path / "sessions.cache"), 64, reference_tokens.SESSION_CACHE_SLOT_SIZE)
+    monkeypatch.setattr(reference_tokens, "session_cache", cache)
+    token = create_reference_token(session, test_user.id)
+    cache.clear()
+
+    fill = cache.set
+
+    def revoke_then_set(key, version, value):
+        revoke_reference_token(session, token)
+        fill(key, version, value)
+
+    monkeypatch.setattr(cache, "set", revoke_then_set)
+    assert resolve_reference_token(session, token) is None
+    monkeypatch.setattr(cache, "set", fill)
+    assert cache.get(f"session:{hash_jti(token).hex()}", 0) is None
+    assert resolve_reference_token(session, token) is None
+    cache.close()
+
+def test_token_rejected_after_user_id_reused(client, session, test_user):
+    # 测试用户删除后 ID 被新用户复用时，旧会话不能冒用新用户
+    token = login(client, token_format="reference")["access_token"]
+    delete_user(session, test_user.id)
+    user = create_user(session, UserCreate(username="newcomer", email="newcomer@example.com",
+                                           password="password123", password_confirm="password123"))
+    assert user.id == test_user.id
+    assert client.get("/api/users/me", headers=bearer(token)).status_code == 401
+
+def test_revoke_refresh_token_family(client, test_user):
+    # 测试撤销刷新令牌后无法再刷新
+    refresh_token = login(client)["refresh_token"]
+    assert client.post("/api/auth/revoke", data={"token": refresh_token}).status_code == 200
+    assert client.post("/api/auth/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+def test_sweeper_deletes_expired_sessions(session, test_user):
+    # 测试后台任务删除过期会话
+    create_reference_token(session, test_user.id, timedelta(seconds=-1))
+    create_reference_token(session, test_user.id)
+    sweeper = TokenSweeper(interval=300, batch_size=10, pause=0, session_factory=lambda: session)
+    assert sweeper.sweep() == 1
+    remaining = session.execute(select(AccessSession.expires_at)).scalars().all()
+    assert len(remaining) == 1
+    assert remaining[0].replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+from jose import jwt
+from sqlalchemy import func, select
+
+from app.config.settings import settings
+from app.core.security import create_refresh_token
+from app.crud.token import create_refresh_token_record, hash_jti, sweep_expired_refresh_tokens
+from app.models.token import RefreshToken
+from app.token_sweeper import TokenSweeper
+
+def login(client):
+    response = client.post("/api/auth/login", data={"username": "testuser", "password": "testpassword"})
+    return response.json()["refresh_token"]
+
+def refresh(client, token):
+    return client.post("/api/auth/refresh", json={"refresh_token": token})
+
+def token_count(session):
+    return session.execute(select(func.count()).select_from(RefreshToken)).scalar()
+
+def test_login_stores_hashed_jti(client, session, test_user):
+    # 测试登录时只保存 jti 的定长摘要
+    token = login(client)
+    jti = jwt.get_unverified_claims(token)["jti"]
+    record = session.get(RefreshToken, hash_jti(jti))
+    assert record.user_id == test_user.id
+    assert len(record.jti_hash) == 16
+    assert record.used_at is None
+
+def test_rotation_and_reuse_detection(client, session, test_user):
+    # 测试轮换后旧令牌再次使用会撤销整个 family
+    first = login(client)
+    response = refresh(client, first)
+    assert response.status_code == 200
+    second = response.json()["refresh_token"]
+
+    assert refresh(client, first).status_code == 401
+    # 重放后同一 family 中尚未使用的新令牌也失效
+    assert refresh(client, second).status_code == 401
+    assert token_count(session) == 0
+
+def test_families_are_independent(client, session, test_user):
+    # 测试一次登录的令牌被重放不影响另一次登录
+    first = login(client)
+    other = login(client)
+    refresh(client, first)
+    refresh(client, first)
+    assert refresh(client, other).status_code == 200
+
+def test_unregistered_token_is_rejected(client, test_user):
+    # 测试未在服务端登记的刷新令牌（包括不带 jti 的旧令牌）无法使用
+    legacy = create_refresh_token(subject=str(test_user.id))
+    assert refresh(client, legacy).status_code == 401
+    forged = create_refresh_token(subject=str(test_user.id), jti="unknown")
+    assert refresh(client, forged).status_code == 401
+
+def test_sweep_deletes_expired_in_batches(session, test_user):
+    # 测试按批删除过期令牌，未过期的保留
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    future = datetime.now(timezone.utc) + timedelta(days=1)
+    for i in range(5):
+        create_refresh_token_record(session, f"expired{i}", test_user.id, past)
+    create_refresh_token_record(session, "valid", test_user.id, future)
+
+    assert sweep_expired_refresh_tokens(session, batch_size=2) == 2
+    sweeper = TokenSweeper(interval=300, batch_size=2, pause=0, session_factory=lambda: session)
+    assert sweeper.sweep() == 3
+    assert token_count(session) == 1
@@ -0,0 +1,105 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.crud.user import (
+    create_role, delete_role, assign_role_to_user, add_role_parent, remove_role_parent, get_role_ancestor_ids,
+)
+from app.models.base import role_closure
+from app.models.user import User
+
+@pytest.fixture(name="role_chain")
+def role_chain_fixture(session: Session):
+    # base <- manager <- director
+    base = create_role(session, "base", permissions={"permissions": ["profile:read"]})
+    manager = create_role(session, "manager", permissions={"permissions": ["report:read"]})
+    director = create_role(session, "director", permissions={"permissions": ["budget:approve"]})
+    assert add_role_parent(session, manager.id, base.id)
+    assert add_role_parent(session, director.id, manager.id)
+    return base, manager, director
+
+def closure(session: Session):
+    rows = session.execute(select(role_closure.c.ancestor_id, role_closure.c.descendant_id, role_closure.c.path_count))
+    return {(a, d): count for a, d, count in rows}
+
+def test_effective_permissions_inherited(client: TestClient, session: Session, role_chain, test_user: User, user_token: str):
+    base, manager, director = role_chain
+    assign_role_to_user(session, test_user.id, director.id)
+
+    # 测试用户详情包含继承得到的权限
+    response = client.get("/api/users/me", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 200
+    assert response.json()["effective_permissions"] == ["budget:approve", "profile:read", "report:read"]
+
+    # 测试权限判断使用继承得到的权限和角色
+    response = client.post(
+        "/api/auth/authorize",
+        headers={"Authorization": f"Bearer {user_token}"},
+        json={"permissions": ["profile:read"], "roles": ["base"]}
+    )
+    assert response.json() == {"permissions": {"profile:read": True}, "roles": {"base": True}}
+
+def test_effective_permissions_apply_deny(client: TestClient, session: Session, role_chain, test_user: User,
+                                          user_token: str, admin_token: str):
+    base, manager, director = role_chain
+    auditor = create_role(session, "auditor", permissions={"permissions": ["user:*"], "deny": ["user:delete", "report:read"]})
+    assert add_role_parent(session, auditor.id, manager.id)
+    assign_role_to_user(session, test_user.id, auditor.id)
+
+    # 测试有效权限去掉被拒绝的授权，部分拒绝的通配符授权与拒绝规则一并返回
+    response = client.get("/api/users/me", headers={"Authorization": f"Bearer {user_token}"})
+    data = response.json()
+    assert data["effective_permissions"] == ["profile:read", "user:*"]
+    assert data["denied_permissions"] == ["report:read", "user:delete"]
+
+    # 测试内省的 scope 与权限检查一致
+    response = client.post("/api/auth/introspect", data={"token": user_token},
+                           headers={"Authorization": f"Bearer {admin_token}"})
+    data = response.json()
+    assert data["scope"] == "profile:read user:*"
+    assert data["deny"] == "report:read user:delete"
+
+def test_cycle_rejected(client: TestClient, session: Session, role_chain, admin_token: str):
+    base, manager, director = role_chain
+    with pytest.raises(ValueError):
+        add_role_parent(session, base.id, director.id)
+    with pytest.raises(ValueError):
+        add_role_parent(session, base.id, base.id)
+
+    # 测试接口返回 400
+    response = client.post(
+        f"/api/roles/{base.id}/parents/{director.id}",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 400
+    assert get_role_ancestor_ids(session, base.id) == []
+
+def test_diamond_edge_removal(session: Session):
+    # top <- left, top <- right, left/right <- bottom
+    top = create_role(session, "top")
+    left = create_role(session, "left")
+    right = create_role(session, "right")
+    bottom = create_role(session, "bottom")
+    for child, parent in [(left, top), (right, top), (bottom, left), (bottom, right)]:
+        add_role_parent(session, child.id, parent.id)
+    assert closure(session)[(top.id, bottom.id)] == 2
+
+    # 测试删除一条路径后仍可经另一条路径继承
+    assert remove_role_parent(session, bottom.id, left.id)
+    assert closure(session)[(top.id, bottom.id)] == 1
+    assert sorted(get_role_ancestor_ids(session, bottom.id)) == sorted([top.id, right.id])
+
+    assert remove_role_parent(session, bottom.id, right.id)
+    assert (top.id, bottom.id) not in closure(session)
+    assert not remove_role_parent(session, bottom.id, right.id)
+
+def test_delete_role_updates_closure(session: Session, role_chain):
+    base, manager, director = role_chain
+
+    # 测试删除中间角色后闭包表不再包含它，且不残留经过它的路径
+    assert delete_role(session, manager.id)
+    pairs = closure(session)
+    assert all(manager.id not in pair for pair in pairs)
+    assert (base.id, director.id) not in pairs
+    assert get_role_ancestor_ids(session, director.id) == []
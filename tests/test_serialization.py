@@ -0,0 +1,33 @@
+from typing import List
+
+import orjson
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from app.crud.user import get_users, get_user_rows, get_roles, get_role_rows
+from app.models.user import User, Role
+from app.schemas.user import UserRead, RoleRead
+
+def test_user_rows_match_user_read(session: Session, test_user: User, test_admin: User):
+    # 测试列投影的序列化结果与 UserRead 一致
+    expected = TypeAdapter(List[UserRead]).dump_python(get_users(session), mode="json")
+    assert orjson.loads(orjson.dumps(get_user_rows(session))) == expected
+
+def test_role_rows_match_role_read(session: Session, test_role: Role):
+    # 测试列投影的序列化结果与 RoleRead 一致
+    expected = TypeAdapter(List[RoleRead]).dump_python(get_roles(session), mode="json")
+    assert orjson.loads(orjson.dumps(get_role_rows(session))) == expected
+
+def test_read_role_users(client: TestClient, session: Session, admin_token: str, test_user: User, test_role: Role):
+    test_user.roles.append(test_role)
+    session.commit()
+
+    # 测试获取角色下的用户列表
+    response = client.get(
+        f"/api/roles/{test_role.id}/users",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert [user["username"] for user in response.json()] == ["testuser"]
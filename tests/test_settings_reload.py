@@ -0,0 +1,172 @@
+import importlib
+from pathlib import Path
+
+import pytest
+
+from app.audit import audit_log
+from app.compression import CompressionMiddleware
+from app.config.settings import SettingsReloadError, reload_settings, settings, subscribe
+from app.core import matcher
+from app.core.hashing import password_hasher
+from app.settings_watcher import SettingsWatcher
+from app.token_sweeper import token_sweeper
+
+# app.config 包的 settings 属性是配置对象，模块本身需按名称导入
+config = importlib.import_module("app.config.settings")
+
+@pytest.fixture(autouse=True)
+def restore_settings():
+    # 测试结束后恢复原配置，并让各子系统重新应用
+    original = config._current
+    listeners = list(config._listeners)
+    yield
+    replaced = config._current
+    config._current = original
+    config._listeners[:] = listeners
+    changed = {name for name in type(original).model_fields
+               if getattr(original, name) != getattr(replaced, name)}
+    for listener in listeners:
+        listener(replaced, original, changed)
+
+def test_reload_applies_changes_live(monkeypatch):
+    # 测试重新加载后配置和子系统立即生效
+    monkeypatch.setenv("AUDIT_BATCH_SIZE", "7")
+    monkeypatch.setenv("REFRESH_TOKEN_SWEEP_BATCH_SIZE", "11")
+    monkeypatch.setenv("COMPRESSION_MINIMUM_SIZE", "64")
+
+    changed = reload_settings()
+
+    assert {"AUDIT_BATCH_SIZE", "REFRESH_TOKEN_SWEEP_BATCH_SIZE", "COMPRESSION_MINIMUM_SIZE"} <= changed
+    assert settings.AUDIT_BATCH_SIZE == 7
+    assert audit_log.batch_size == 7
+    assert token_sweeper.batch_size == 11
+    assert CompressionMiddleware(None).minimum_size == 64
+    assert CompressionMiddleware(None, minimum_size=10).minimum_size == 10
+
+def test_key_removed_from_dotenv_reverts_to_default(tmp_path, monkeypatch):
+    # 测试从 .env 删除配置后重新加载，配置恢复为默认值
+    # 保留原 .env 中的其他配置，只增删这一项
+    base = Path(".env").read_text() if Path(".env").exists() else ""
+    base = "".join(line for line in base.splitlines(keepends=True)
+                   if not line.startswith("ACCESS_TOKEN_EXPIRE_MINUTES="))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("ACCESS_TOKEN_EXPIRE_MINUTES", raising=False)
+    default = type(config._current).model_fields["ACCESS_TOKEN_EXPIRE_MINUTES"].default
+    (tmp_path / ".env").write_text(base + "\nACCESS_TOKEN_EXPIRE_MINUTES=5\n")
+    assert "ACCESS_TOKEN_EXPIRE_MINUTES" in reload_settings()
+    assert settings.ACCESS_TOKEN_EXPIRE_MINUTES == 5
+
+    (tmp_path / ".env").write_text(base)
+    assert reload_settings() == {"ACCESS_TOKEN_EXPIRE_MINUTES"}
+    assert settings.ACCESS_TOKEN_EXPIRE_MINUTES == default
+
+def test_reload_without_changes_notifies_nobody(monkeypatch):
+    # 测试配置未变化时不通知订阅者
+    calls = []
+    subscribe(lambda old, new, changed: calls.append(changed))
+    assert reload_settings() == set()
+    assert calls == []
+
+def test_subscribers_receive_old_and_new_snapshot(monkeypatch):
+    # 测试订阅者拿到新旧快照和变更项，单个订阅者出错不影响其他订阅者
+    calls = []
+
+    def broken(old, new, changed):
+        raise RuntimeError("boom")
+
+    subscribe(broken)
+    subscribe(lambda old, new, changed: calls.append((old.ACTIVITY_FLUSH_INTERVAL_SECONDS,
+                                                      new.ACTIVITY_FLUSH_INTERVAL_SECONDS, changed)))
+    old_interval = settings.ACTIVITY_FLUSH_INTERVAL_SECONDS
+    monkeypatch.setenv("ACTIVITY_FLUSH_INTERVAL_SECONDS", "5")
+
+    reload_settings()
+    assert calls == [(old_interval, 5, {"ACTIVITY_FLUSH_INTERVAL_SECONDS"})]
+
+@pytest.mark.parametrize("name, value", [
+    ("DATABASE_URL", "sqlite:///./other.db"),
+    ("SECRET_KEY", "another-secret"),
+])
+def test_restart_only_change_is_rejected(monkeypatch, name, value):
+    # 测试修改需要重启的配置时整体拒绝，其他变更也不生效
+    before = config.current_settings()
+    monkeypatch.setenv(name, value)
+    monkeypatch.setenv("AUDIT_BATCH_SIZE", "9")
+
+    with pytest.raises(SettingsReloadError, match=name):
+        reload_settings()
+    assert config.current_settings() is before
+    assert audit_log.batch_size != 9
+
+@pytest.mark.parametrize("name", ["PERMISSION_CACHE_SIZE", "ACCESS_SESSION_CACHE_SIZE"])
+def test_mmap_cache_size_change_is_rejected(monkeypatch, name):
+    # 测试 mmap 后端下修改缓存槽位数时整体拒绝，而不是报告成功却未生效
+    monkeypatch.setattr(settings, "PERMISSION_CACHE_BACKEND", "mmap")
+    monkeypatch.setenv("PERMISSION_CACHE_BACKEND", "mmap")
+    before = config.current_settings()
+    monkeypatch.setenv(name, "20")
+    with pytest.raises(SettingsReloadError, match=name):
+        reload_settings()
+    assert config.current_settings() is before
+
+@pytest.mark.parametrize("name, value", [
+    ("AUDIT_OVERFLOW_POLICY", "discard"),
+    ("AUDIT_BATCH_SIZE", "0"),
+    ("PASSWORD_HASH_WORKERS", "many"),
+])
+def test_invalid_values_are_rejected(monkeypatch, name, value):
+    # 测试校验失败时保留当前配置
+    before = config.current_settings()
+    monkeypatch.setenv(name, value)
+    with pytest.raises(SettingsReloadError):
+        reload_settings()
+    assert config.current_settings() is before
+
+def test_resizable_pools_and_caches(monkeypatch):
+    # 测试哈希线程池、审计队列和规则缓存随配置调整大小
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "2")
+    monkeypatch.setenv("AUDIT_QUEUE_SIZE", "3")
+    monkeypatch.setenv("MATCHER_CACHE_SIZE", "1")
+    matcher._compiled.update({"a": (1, None), "b": (1, None)})
+
+    reload_settings()
+
+    assert password_hasher.workers == 2
+    assert password_hasher._executor._max_workers == 2
+    assert audit_log._queue.maxsize == 3
+    assert list(matcher._compiled) == ["b"]
+    matcher.clear_compiled()
+
+def test_reload_endpoint_requires_superuser(client, monkeypatch, admin_token, user_token):
+    # 测试管理接口：仅超级管理员可用，返回变更项，拒绝时返回 400
+    response = client.post("/api/admin/settings/reload", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    monkeypatch.setenv("AUDIT_FLUSH_INTERVAL_MS", "50")
+    response = client.post("/api/admin/settings/reload", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"changed": ["AUDIT_FLUSH_INTERVAL_MS"]}
+    assert audit_log.flush_interval == 0.05
+
+    monkeypatch.setenv("API_PREFIX", "/v2")
+    response = client.post("/api/admin/settings/reload", headers=headers)
+    assert response.status_code == 400
+    assert "API_PREFIX" in response.json()["detail"]
+
+def test_reload_broadcast_to_other_workers(tmp_path, monkeypatch):
+    # 测试一个 worker 重新加载后广播，共享代数文件的其他 worker 轮询时各自重新加载
+    path = str(tmp_path / "settings.generation")
+    worker, other = SettingsWatcher(path, 1), SettingsWatcher(path, 1)
+    assert not other.poll()
+
+    monkeypatch.setenv("AUDIT_BATCH_SIZE", "9")
+    reload_settings()
+    worker.publish()
+    assert not worker.poll()
+
+    # 模拟另一个进程：配置仍是旧值，轮询到新代数后重新加载
+    config._current = type(config._current)(**{**config._current.model_dump(), "AUDIT_BATCH_SIZE": 500})
+    assert other.poll()
+    assert settings.AUDIT_BATCH_SIZE == 9
+    assert not other.poll()
@@ -0,0 +1,243 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import sharding
+from app.crud.user import (
+    create_user, get_user, get_user_by_username, get_user_by_email, get_users, get_user_rows,
+    update_user, delete_user, create_role, delete_role, assign_role_to_user, get_role_users,
+    get_user_rows_by_ids, get_user_changes, register_user, update_role, add_role_parent, role_members_counter,
+)
+from app.crud import user as user_crud
+from app.database import get_session
+from app.main import app
+from app.models.base import Base, counters, role_closure, user_role_link
+from app.models.user import Role, User
+from app.schemas.user import UserCreate, UserUpdate
+
+SHARDS = 3
+
+@pytest.fixture(name="sharded_session")
+def sharded_session_fixture(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/primary.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    sharding.configure_sharding([f"sqlite:///{tmp_path}/shard{i}.db" for i in range(SHARDS)])
+    sharding.create_shard_tables(engine)
+    session = Session(engine)
+    yield session
+    sharding.close_shard_sessions(session)
+    session.close()
+    sharding.configure_sharding([])
+    engine.dispose()
+
+def new_user(db: Session, name: str, **kwargs) -> User:
+    return create_user(db, UserCreate(
+        username=name, email=f"{name}@example.com", password="password", password_confirm="password"
+    ), **kwargs)
+
+def shard_user_counts():
+    counts = []
+    for engine in sharding.get_router().engines:
+        with engine.connect() as conn:
+            counts.append(conn.execute(select(func.count()).select_from(User.__table__)).scalar())
+    return counts
+
+def test_users_routed_to_shards(sharded_session: Session):
+    users = [new_user(sharded_session, f"user{i}") for i in range(8)]
+
+    # 测试用户分布到多个分片且只存在于所在分片
+    counts = shard_user_counts()
+    assert sum(counts) == 8
+    assert sum(1 for c in counts if c) > 1
+    with sharded_session.bind.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(User.__table__)).scalar() == 0
+
+    # 测试按 ID、用户名和邮箱直接定位
+    target = users[5]
+    assert get_user(sharded_session, target.id).username == "user5"
+    assert get_user_by_username(sharded_session, "user5").id == target.id
+    assert get_user_by_email(sharded_session, "user5@example.com").id == target.id
+    assert get_user_by_username(sharded_session, "nobody") is None
+
+def test_listing_is_merged_across_shards(sharded_session: Session):
+    for i in range(6):
+        new_user(sharded_session, f"user{i}")
+
+    # 测试分页结果与单库排序一致
+    everything = [u.username for u in get_users(sharded_session, limit=100)]
+    assert everything == [f"user{i}" for i in range(6)]
+    page = [row["username"] for row in get_user_rows(sharded_session, skip=2, limit=3)]
+    assert page == everything[2:5]
+
+def test_duplicate_username_rejected(sharded_session: Session):
+    new_user(sharded_session, "dup")
+    with pytest.raises(IntegrityError):
+        new_user(sharded_session, "dup")
+    sharded_session.rollback()
+    assert sum(shard_user_counts()) == 1
+
+def test_update_and_delete_maintain_directory(sharded_session: Session):
+    user = new_user(sharded_session, "before")
+    update_user(sharded_session, user.id, UserUpdate(username="after"))
+    assert get_user_by_username(sharded_session, "before") is None
+    assert get_user_by_username(sharded_session, "after").id == user.id
+
+    assert delete_user(sharded_session, user.id)
+    assert get_user_by_username(sharded_session, "after") is None
+    assert sum(shard_user_counts()) == 0
+
+def test_update_rejects_duplicate_and_restores_directory(sharded_session: Session, monkeypatch):
+    user = new_user(sharded_session, "keep")
+    new_user(sharded_session, "taken")
+
+    # 测试改成其他分片上已有的用户名时返回提示，目录和分片保持原值，会话仍可使用
+    with pytest.raises(ValueError, match="用户名已被使用"):
+        update_user(sharded_session, user.id, UserUpdate(username="taken"))
+    assert get_user_by_username(sharded_session, "keep").id == user.id
+    assert get_user_by_username(sharded_session, "taken").id != user.id
+
+    # 测试目录更新后分片提交失败时恢复目录
+    def fail(*args, **kwargs):
+        raise RuntimeError("shard down")
+
+    monkeypatch.setattr(user_crud, "emit_change", fail)
+    with pytest.raises(RuntimeError):
+        update_user(sharded_session, user.id, UserUpdate(username="renamed", email="renamed@example.com"))
+    monkeypatch.undo()
+    assert sharding.lookup_user_id(sharded_session, username="renamed") is None
+    assert sharding.lookup_user_id(sharded_session, email="keep@example.com") == user.id
+    assert get_user(sharded_session, user.id).username == "keep"
+
+def test_role_changes_replicate_only_affected_rows(sharded_session: Session):
+    reader = create_role(sharded_session, "reader", permissions={"permissions": ["doc:read"]})
+    writer = create_role(sharded_session, "writer", permissions={"permissions": ["doc:write"]})
+    editor = create_role(sharded_session, "editor")
+    # 在各分片中标记 writer，整表覆盖会清除标记
+    for engine in sharding.get_router().engines:
+        with engine.begin() as conn:
+            conn.execute(Role.__table__.update().where(Role.id == writer.id).values(description="shard-only"))
+
+    update_role(sharded_session, reader.id, description="updated")
+    add_role_parent(sharded_session, editor.id, reader.id)
+
+    with sharded_session.bind.connect() as conn:
+        primary_closure = sorted(conn.execute(select(role_closure)).all())
+    for engine in sharding.get_router().engines:
+        with engine.connect() as conn:
+            descriptions = dict(conn.execute(select(Role.id, Role.description)).all())
+            assert descriptions[reader.id] == "updated"
+            assert descriptions[writer.id] == "shard-only"
+            assert sorted(conn.execute(select(role_closure)).all()) == primary_closure
+
+    # 测试删除带后代的角色时，后代的闭包行在各分片中一并更新
+    assert delete_role(sharded_session, reader.id)
+    with sharded_session.bind.connect() as conn:
+        primary_closure = sorted(conn.execute(select(role_closure)).all())
+    assert (reader.id, editor.id, 1) not in primary_closure
+    for engine in sharding.get_router().engines:
+        with engine.connect() as conn:
+            assert sorted(conn.execute(select(role_closure)).all()) == primary_closure
+            assert reader.id not in conn.execute(select(Role.id)).scalars().all()
+
+def test_roles_replicated_to_shards(sharded_session: Session):
+    role = create_role(sharded_session, "reader", permissions={"permissions": ["doc:read"]})
+    users = [new_user(sharded_session, f"user{i}") for i in range(6)]
+    for user in users[:4]:
+        assert assign_role_to_user(sharded_session, user.id, role.id)
+
+    # 测试分片内的用户可以连接到复制过来的角色数据
+    assert get_user(sharded_session, users[0].id).effective_permissions == ["doc:read"]
+    assert [u.username for u in get_role_users(sharded_session, role.id)] == ["user0", "user1", "user2", "user3"]
+
+    # 测试删除角色时清理各分片中的关联和成员数计数器
+    assert delete_role(sharded_session, role.id)
+    for engine in sharding.get_router().engines:
+        with engine.connect() as conn:
+            assert conn.execute(select(func.count()).select_from(user_role_link)).scalar() == 0
+            assert conn.execute(select(counters).where(counters.c.name == role_members_counter(role.id))).first() is None
+
+def test_replication_with_foreign_keys_enforced(sharded_session: Session):
+    for engine in sharding.get_router().engines:
+        event.listen(engine, "connect", lambda conn, record: conn.execute("PRAGMA foreign_keys=ON"))
+        engine.dispose()
+    parent = create_role(sharded_session, "parent", permissions={"permissions": ["doc:read"]})
+    role = create_role(sharded_session, "reader")
+    user = new_user(sharded_session, "user0")
+    assert assign_role_to_user(sharded_session, user.id, role.id)
+
+    # 测试仍被用户引用的角色在更新、继承变化和整表复制时不会被删除后重插
+    update_role(sharded_session, role.id, description="updated")
+    add_role_parent(sharded_session, role.id, parent.id)
+    sharding.replicate_reference_tables(sharded_session)
+    assert get_user(sharded_session, user.id).effective_permissions == ["doc:read"]
+
+    # 测试主库中已删除的角色仍会从各分片删除
+    assert delete_role(sharded_session, parent.id)
+    for engine in sharding.get_router().engines:
+        with engine.connect() as conn:
+            assert conn.execute(select(Role.id)).scalars().all() == [role.id]
+            assert conn.execute(select(role_closure)).all() == [(role.id, role.id, 1)]
+
+def test_api_with_sharding(sharded_session: Session):
+    new_user(sharded_session, "admin", is_superuser=True)
+    new_user(sharded_session, "member")
+    app.dependency_overrides[get_session] = lambda: sharded_session
+    try:
+        client = TestClient(app)
+        token = client.post(
+            "/api/auth/login", data={"username": "admin", "password": "password"}
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        # 测试登录、当前用户和列表接口在分片模式下可用
+        assert client.get("/api/users/me", headers=headers).json()["username"] == "admin"
+        usernames = [u["username"] for u in client.get("/api/users/", headers=headers).json()]
+        assert usernames == ["admin", "member"]
+    finally:
+        app.dependency_overrides.clear()
+
+def test_batch_lookup_across_shards(sharded_session: Session):
+    # 测试批量获取按分片分组查询，结果含各分片的角色
+    users = [new_user(sharded_session, f"user{i}") for i in range(6)]
+    role = create_role(sharded_session, "reader")
+    assign_role_to_user(sharded_session, users[4].id, role.id)
+
+    ids = [users[4].id, 999, users[0].id, users[2].id]
+    rows = get_user_rows_by_ids(sharded_session, ids, with_roles=True)
+    assert set(rows) == {users[4].id, users[0].id, users[2].id}
+    assert [r["name"] for r in rows[users[4].id]["roles"]] == ["reader"]
+    assert rows[users[0].id]["roles"] == []
+
+def test_user_changes_across_shards(sharded_session: Session):
+    # 测试增量同步合并各分片的修改和删除记录，按变更时间排序
+    users = [new_user(sharded_session, f"user{i}") for i in range(4)]
+    update_user(sharded_session, users[0].id, UserUpdate(email="first@example.com"))
+    delete_user(sharded_session, users[1].id)
+
+    until = datetime.now(timezone.utc) + timedelta(seconds=1)
+    changes = get_user_changes(sharded_session, None, until, 10)
+    assert [(c["id"], c["deleted"]) for c in changes] == [
+        (users[2].id, False), (users[3].id, False), (users[0].id, False), (users[1].id, True),
+    ]
+    assert len(get_user_changes(sharded_session, None, until, 2)) == 2
+
+def test_register_user_across_shards(sharded_session: Session):
+    # 测试注册由全局目录保证跨分片唯一，写入所在分片并返回用户字段
+    def register(name: str, email: str):
+        return register_user(sharded_session, UserCreate(
+            username=name, email=email, password="password", password_confirm="password"), "hashed")
+
+    rows = [register(f"user{i}", f"user{i}@example.com") for i in range(SHARDS + 1)]
+    assert [row["username"] for row in rows] == [f"user{i}" for i in range(SHARDS + 1)]
+    assert get_user(sharded_session, rows[-1]["id"]).email == f"user{SHARDS}@example.com"
+    assert sum(shard_user_counts()) == SHARDS + 1
+
+    with pytest.raises(ValueError, match="用户名已被使用"):
+        register("user0", "other@example.com")
+    with pytest.raises(ValueError, match="邮箱已被注册"):
+        register("other", "user1@example.com")
+    assert sharding.lookup_user_id(sharded_session, username="other") is None
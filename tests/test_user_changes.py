@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.change_feed import ChangeFeed
+from app.config.settings import settings
+from app.crud.user import (
+    create_user, delete_user, format_change_cursor, get_user_changes, parse_change_cursor, update_user,
+)
+from app.models.user import User, UserTombstone
+from app.schemas.user import UserCreate, UserUpdate
+
+def new_user(db: Session, name: str) -> User:
+    return create_user(db, UserCreate(username=name, email=f"{name}@example.com",
+                                      password="password123", password_confirm="password123"))
+
+@pytest.fixture(autouse=True)
+def no_safety_lag(monkeypatch):
+    monkeypatch.setattr(settings, "USER_CHANGES_SAFETY_LAG_MS", 0)
+
+def sync(client: TestClient, token: str, since=None, limit=500):
+    params = {"limit": limit}
+    if since is not None:
+        params["since"] = since
+    response = client.get("/api/users/changes", params=params, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_full_sync_then_deltas(client: TestClient, session: Session, admin_token: str):
+    # 测试从头分页同步全部用户，之后只返回新建、修改和删除的用户
+    for i in range(5):
+        new_user(session, f"user{i}")
+
+    seen, cursor = [], None
+    while True:
+        page = sync(client, admin_token, cursor, limit=2)
+        seen += [item["user"]["username"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+    assert seen[-5:] == [f"user{i}" for i in range(5)]
+    assert len(seen) == len(set(seen))
+
+    # 已追上时返回空页，游标推进到同步截止时间
+    page = sync(client, admin_token, cursor)
+    assert (page["items"], page["has_more"]) == ([], False)
+    assert parse_change_cursor(page["next_cursor"]) >= parse_change_cursor(cursor)
+    cursor = page["next_cursor"]
+
+    user1 = session.execute(select(User).where(User.username == "user1")).scalar_one()
+    user3 = session.execute(select(User).where(User.username == "user3")).scalar_one()
+    update_user(session, user1.id, UserUpdate(email="renamed@example.com"))
+    delete_user(session, user3.id)
+    new_user(session, "user5")
+
+    page = sync(client, admin_token, cursor)
+    changes = [(item["id"], item["deleted"]) for item in page["items"]]
+    assert changes[:2] == [(user1.id, False), (user3.id, True)]
+    assert page["items"][0]["user"]["email"] == "renamed@example.com"
+    assert page["items"][1]["user"] is None
+    assert page["items"][2]["user"]["username"] == "user5"
+    assert not page["has_more"]
+
+def test_changes_stay_behind_safety_lag(session: Session):
+    # 测试只返回早于 until 的变更，游标在时间相同的变更间按 ID 推进
+    users = [new_user(session, f"lag{i}") for i in range(3)]
+    assert get_user_changes(session, None, datetime.now(timezone.utc) - timedelta(hours=1), 10) == []
+
+    changes = get_user_changes(session, None, datetime.now(timezone.utc) + timedelta(seconds=1), 10)
+    ids = [change["id"] for change in changes]
+    assert ids[-3:] == [user.id for user in users]
+
+    cursor = (changes[-2]["changed_at"], changes[-2]["id"])
+    assert parse_change_cursor(format_change_cursor(cursor)) == cursor
+    rest = get_user_changes(session, cursor, datetime.now(timezone.utc) + timedelta(seconds=1), 10)
+    assert [change["id"] for change in rest] == [users[-1].id]
+
+def test_rejects_bad_or_expired_cursor(client: TestClient, admin_token: str, user_token: str):
+    # 测试游标格式错误返回 400，早于删除记录保留期返回 410，无管理权限返回 403
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.get("/api/users/changes", params={"since": "not-a-cursor"}, headers=headers)
+    assert response.status_code == 400
+
+    expired = datetime.now(timezone.utc) - timedelta(days=settings.USER_TOMBSTONE_RETENTION_DAYS + 1)
+    response = client.get("/api/users/changes", params={"since": format_change_cursor((expired, 1))}, headers=headers)
+    assert response.status_code == 410
+
+    response = client.get("/api/users/changes", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+
+def test_quiet_directory_cursor_stays_valid(client: TestClient, session: Session, admin_token: str):
+    # 测试目录超过保留期没有任何变更时，持续同步的客户端游标不会过期
+    new_user(session, "quiet")
+    old = datetime.now(timezone.utc) - timedelta(days=settings.USER_TOMBSTONE_RETENTION_DAYS + 1)
+    session.execute(update(User).values(updated_at=old.replace(tzinfo=None)))
+    session.commit()
+
+    page = sync(client, admin_token)
+    assert page["items"] and not page["has_more"]
+    page = sync(client, admin_token, page["next_cursor"])
+    assert page["items"] == []
+    assert sync(client, admin_token, page["next_cursor"])["items"] == []
+
+def test_prune_removes_expired_tombstones(session: Session):
+    # 测试后台清理只删除超过保留期的删除记录
+    for name in ("old", "recent"):
+        delete_user(session, new_user(session, name).id)
+    old = session.execute(select(UserTombstone).order_by(UserTombstone.id)).scalars().first()
+    old.deleted_at = datetime.now(timezone.utc) - timedelta(days=2)
+    session.commit()
+
+    feed = ChangeFeed(poll_interval=1, batch_size=100, buffer_size=10, retention=3600,
+                      session_factory=sessionmaker(bind=session.get_bind()), tombstone_retention=86400)
+    feed.prune()
+    session.expire_all()
+    assert len(session.execute(select(UserTombstone)).scalars().all()) == 1
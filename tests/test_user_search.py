@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy import text
+
+from app.crud.user import search_user_rows, update_user, delete_user
+from app.migrations import run_migrations
+from app.models.user import User, Role
+from app.models.base import user_role_link
+from app.schemas.user import UserUpdate
+
+@pytest.fixture(name="search_session")
+def search_session_fixture(session, test_admin):
+    # 执行迁移以建立三元组索引，之后插入的用户由触发器同步
+    run_migrations(session.get_bind())
+    for name in ["alice", "alicia", "bob", "malice", "carol_x"]:
+        session.add(User(username=name, email=f"{name}@example.com", hashed_password="x",
+                         is_active=name != "alicia"))
+    session.commit()
+    return session
+
+def usernames(rows):
+    return [row["username"] for row in rows]
+
+def test_substring_and_prefix(search_session):
+    # 测试子串与前缀匹配
+    assert usernames(search_user_rows(search_session, "lic")) == ["alice", "alicia", "malice"]
+    assert usernames(search_user_rows(search_session, "ali", prefix=True)) == ["alice", "alicia"]
+    # 少于 3 个字符时不走索引，结果一致
+    assert usernames(search_user_rows(search_session, "al", prefix=True)) == ["alice", "alicia"]
+    # LIKE 通配符按字面匹配
+    assert usernames(search_user_rows(search_session, "l_x")) == ["carol_x"]
+
+def test_filters_and_cursor(search_session):
+    # 测试筛选条件与游标分页
+    assert usernames(search_user_rows(search_session, "lic", is_active=False)) == ["alicia"]
+    first = search_user_rows(search_session, "example.com", limit=2)
+    rest = search_user_rows(search_session, "example.com", cursor=first[-1]["id"], limit=10)
+    assert len(first) == 2
+    assert usernames(first + rest) == ["testadmin", "alice", "alicia", "bob", "malice", "carol_x"]
+
+def test_role_filter_uses_inheritance(search_session):
+    # 测试按角色筛选包括继承该角色的用户
+    role = Role(name="support", permissions={})
+    search_session.add(role)
+    search_session.commit()
+    bob = search_session.query(User).filter_by(username="bob").one()
+    search_session.execute(user_role_link.insert().values(user_id=bob.id, role_id=role.id))
+    search_session.commit()
+    assert usernames(search_user_rows(search_session, "example", role_id=role.id)) == ["bob"]
+
+def test_index_follows_updates_and_deletes(search_session):
+    # 测试更新和删除用户后索引同步
+    bob = search_session.query(User).filter_by(username="bob").one()
+    update_user(search_session, bob.id, UserUpdate(username="robert"))
+    assert usernames(search_user_rows(search_session, "robert")) == ["robert"]
+    assert search_user_rows(search_session, "bob@", prefix=True) != []
+
+    delete_user(search_session, bob.id)
+    assert search_user_rows(search_session, "robert") == []
+
+def test_search_uses_trigram_index(search_session):
+    # 测试三元组索引确实参与查询
+    conn = search_session.connection()
+    plan = conn.execute(text(
+        "EXPLAIN QUERY PLAN SELECT users.id FROM users JOIN users_fts ON users_fts.rowid = users.id "
+        "WHERE users_fts MATCH '\"lic\"' ORDER BY users_fts.rowid LIMIT 10"
+    )).all()
+    assert "VIRTUAL TABLE INDEX" in " ".join(row[-1] for row in plan)
+
+def test_search_endpoint(client, search_session, admin_token):
+    # 测试搜索接口及 next_cursor
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.get("/api/users/search", params={"q": "lic", "limit": 2}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [u["username"] for u in data["items"]] == ["alice", "alicia"]
+
+    response = client.get("/api/users/search", params={"q": "lic", "limit": 2, "cursor": data["next_cursor"]},
+                          headers=headers)
+    data = response.json()
+    assert [u["username"] for u in data["items"]] == ["malice"]
+    assert data["next_cursor"] is None
+
+def test_search_endpoint_requires_permission(client, user_token):
+    response = client.get("/api/users/search", params={"q": "lic"},
+                          headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403